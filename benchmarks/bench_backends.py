@@ -0,0 +1,78 @@
+# bench_backends.py - A/B latency: two-stage Keras path vs fused single graph
+"""
+Usage:
+    python -m benchmarks.bench_backends --batch-sizes 1 4 16 --runs 30 --output bench_backends.json
+"""
+import argparse
+import json
+import time
+import numpy as np
+from src.config import IMAGE_SIZE
+from src.predict import load_models
+from src.inference.keras_backend import KerasBackend
+from src.inference.fused_backend import FusedBackend
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+def time_backend(backend, images, runs):
+    """Per-call latency in milliseconds over `runs` calls"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        backend.predict_batch(images)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Keras two-stage and fused inference latency")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    vgg19, model = load_models()
+    backends = {
+        "keras": KerasBackend(),
+        "fused": FusedBackend(vgg19, model, max_batch_size=max(args.batch_sizes))
+    }
+    for backend in backends.values():
+        backend.warm_up()
+
+    width, height = IMAGE_SIZE
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in args.batch_sizes:
+        images = rng.integers(0, 256, size=(batch_size, height, width, 3), dtype=np.uint8)
+
+        _, keras_preds = backends["keras"].predict_batch(images)
+        _, fused_preds = backends["fused"].predict_batch(images)
+        max_diff = float(np.max(np.abs(keras_preds - fused_preds)))
+
+        for name, backend in backends.items():
+            samples = time_backend(backend, images, args.runs)
+            mean_ms = float(np.mean(samples))
+            row = {
+                "backend": name,
+                "batch_size": batch_size,
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "mean_ms": mean_ms,
+                "images_per_sec": batch_size * 1000.0 / mean_ms,
+                "max_prob_diff_vs_other": max_diff
+            }
+            results.append(row)
+            print(f"{name:>6} batch={batch_size:<3} p50={row['p50_ms']:8.2f}ms "
+                  f"p95={row['p95_ms']:8.2f}ms  {row['images_per_sec']:8.1f} img/s")
+        print(f"       batch={batch_size:<3} max |Δprob| keras vs fused = {max_diff:.2e}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench_decode.py - Decode latency and peak RSS against input resolution
+"""
+Usage:
+    python -m benchmarks.bench_decode --megapixels 1 12 24 48 --runs 10 --output bench_decode.json
+
+Each (resolution, format, mode) case runs in a fresh process so its peak
+RSS is not polluted by earlier, larger cases.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+import cv2
+import numpy as np
+
+
+def synthetic_photo(megapixels: float, seed: int = 0) -> np.ndarray:
+    """Smooth gradients plus noise: compresses roughly like a field photo"""
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, size=img.shape, dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def peak_rss_kb(reset: bool = False) -> int:
+    """Peak RSS of this process; on Linux the high-water mark can be reset"""
+    try:
+        if reset:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_case(file_bytes: bytes, fast: bool, runs: int, queue):
+    # Import inside the child so FAST_DECODE_ENABLED can be flipped per case
+    import src.predict as predict
+    predict.FAST_DECODE_ENABLED = fast
+
+    baseline_kb = peak_rss_kb(reset=True)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        predict.decode_image(file_bytes)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    peak_kb = peak_rss_kb()
+    queue.put({
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "peak_rss_mb": peak_kb / 1024.0,
+        "rss_growth_mb": (peak_kb - baseline_kb) / 1024.0
+    })
+
+
+def run_case(file_bytes: bytes, fast: bool, runs: int):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(file_bytes, fast, runs, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs reduced-scale image decoding")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 12, 24, 48])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for megapixels in args.megapixels:
+        img = synthetic_photo(megapixels)
+        for fmt in ("jpg", "png"):
+            _, encoded = cv2.imencode(f".{fmt}", img)
+            file_bytes = encoded.tobytes()
+            for fast in (False, True):
+                row = {
+                    "megapixels": megapixels,
+                    "format": fmt,
+                    "mode": "reduced" if fast else "full",
+                    "bytes": len(file_bytes),
+                    **run_case(file_bytes, fast, args.runs)
+                }
+                results.append(row)
+                print(f"{megapixels:5.1f} MP {fmt:>3} {row['mode']:>7}: p50={row['p50_ms']:8.2f}ms "
+                      f"p95={row['p95_ms']:8.2f}ms  RSS growth={row['rss_growth_mb']:7.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# bench_e2e.py - Offline end-to-end benchmark of the Flask app with local stand-ins
+"""
+Usage:
+    python -m benchmarks.bench_e2e --output results/e2e.json
+    python -m benchmarks.bench_e2e --predictor stub --megapixels 0.3 2 12 --concurrency 1 4 16
+    python -m benchmarks.bench_e2e --server asgi --db-delay-ms 20 --concurrency 50 300
+    python -m benchmarks.compare_runs results/base.json results/e2e.json
+
+No MongoDB, geocoder or model weights are needed: the repository and the
+location service are in-memory stand-ins, and the CNN is replaced by a tiny
+deterministic model (``--predictor tiny-model`` keeps the real decode +
+BatchScheduler path, ``--predictor stub`` bypasses batching).
+``--db-delay-ms`` and ``--geocode-delay-ms`` simulate I/O latency.
+``--server flask`` serves src.app from a threaded werkzeug server,
+``--server asgi`` serves src.asgi_app from uvicorn. Scenarios:
+
+  sequential  one request at a time, per image resolution
+  load        N concurrent HTTP clients against the in-process server
+  batch       POST /predict/batch with a whole survey per request
+
+Each scenario reports throughput, client-side latency percentiles and the
+per-stage histograms from src.metrics.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import requests
+
+# Keep job spools and blobs out of the working tree (read when src.config is imported)
+_SCRATCH = tempfile.mkdtemp(prefix="harvest-bench-")
+os.environ.setdefault("JOB_SPOOL_DIR", os.path.join(_SCRATCH, "jobs"))
+os.environ.setdefault("BLOB_STORE_DIR", os.path.join(_SCRATCH, "blobs"))
+os.environ.setdefault("FEATURE_STORE_DIR", "")
+
+from src.dependency_container import container, PredictorAdapter
+from src.inference.batch_scheduler import BatchScheduler
+from src.inference.model_loader import ModelLoader
+from src.metrics import metrics
+from src.config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from .bench_decode import synthetic_photo
+from .stand_ins import TinyBackend, StubPredictor, InMemoryRepository, AsyncInMemoryRepository, StubLocationService
+
+FORM = {"rsbsaNumber": "BENCH-0001", "fullName": "Bench Farmer", "barangay": "Benchmark",
+        "crop": "rice", "area": "1.5", "contact": "0000"}
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+        "max_ms": float(values.max())
+    }
+
+
+def make_images(megapixels, count, seed=0):
+    """JPEG bytes of distinct synthetic photos (distinct so no cache can help)"""
+    images = []
+    for i in range(count):
+        ok, buffer = cv2.imencode(".jpg", synthetic_photo(megapixels, seed + i), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        images.append(buffer.tobytes())
+    return images
+
+
+def wire(args):
+    """Register the stand-ins before the app is imported (it starts the model loader)"""
+    location = StubLocationService(args.geocode_delay_ms)
+    backend = TinyBackend(delay_ms=args.model_delay_ms)
+    repository = InMemoryRepository(location, args.db_delay_ms)
+    container.register("location_service", location)
+    container.register("repository", repository)
+    container.register("async_repository", AsyncInMemoryRepository(repository))
+    container.register("prediction_cache", None)
+    container.register("model_loader", ModelLoader(lambda: backend))
+    if args.predictor == "stub":
+        container.register("predictor", StubPredictor(backend))
+    else:
+        loader = container.get_model_loader()
+        scheduler = BatchScheduler(loader.predict_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+        container.register("batch_scheduler", scheduler)
+        container.register("predictor", PredictorAdapter(scheduler, loader))
+    if args.server == "asgi":
+        from src.asgi_app import app
+    else:
+        from src.app import app
+    container.get_model_loader().start()
+    container.get_model_loader().wait()
+    return app
+
+
+def post_files(base_url):
+    """POST the bench form with (field, filename, bytes) files; returns (status, json)"""
+    session = requests.Session()
+
+    def post(path, files):
+        response = session.post(f"{base_url}{path}", data=FORM,
+                                files=[(field, (name, data, "image/jpeg")) for field, name, data in files])
+        return response.status_code, response.json()
+    return post
+
+
+def run_sequential(post, images, megapixels):
+    samples = []
+    metrics.reset()
+    started = time.perf_counter()
+    for i, file_bytes in enumerate(images):
+        t0 = time.perf_counter()
+        status, body = post("/predict", [("file", f"seq{i}.jpg", file_bytes)])
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        assert status == 200, body
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": "sequential",
+        "megapixels": megapixels,
+        "requests": len(images),
+        "requests_per_second": len(images) / elapsed,
+        "latency": percentiles(samples),
+        "stages": metrics.stage_summary()
+    }
+
+
+def serve(app, server_kind):
+    """Start an in-process server; returns (stop, base_url)"""
+    if server_kind == "flask":
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.shutdown, f"http://127.0.0.1:{server.server_port}"
+
+    import uvicorn
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return stop, f"http://127.0.0.1:{port}"
+
+
+def run_load(base_url, images, megapixels, concurrency, requests_per_client):
+    samples, errors, rejected = [], [0], [0]
+    lock = threading.Lock()
+
+    def client(index):
+        session = requests.Session()
+        for i in range(requests_per_client):
+            file_bytes = images[(index * requests_per_client + i) % len(images)]
+            t0 = time.perf_counter()
+            response = session.post(f"{base_url}/predict", data=FORM,
+                                    files={"file": (f"load{index}_{i}.jpg", file_bytes, "image/jpeg")})
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                samples.append(elapsed_ms)
+                if response.status_code != 200:
+                    errors[0] += 1
+                    rejected[0] += response.status_code == 503
+
+    metrics.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    total = concurrency * requests_per_client
+    batching = container.get_batch_scheduler().stats() if container.created("batch_scheduler") else None
+    return {
+        "scenario": "load",
+        "megapixels": megapixels,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors[0],
+        "rejected": rejected[0],
+        "requests_per_second": total / elapsed,
+        "latency": percentiles(samples),
+        "avg_batch_size": batching["avg_batch_size"] if batching else None,
+        "stages": metrics.stage_summary()
+    }
+
+
+def run_batch(post, images, megapixels, batches):
+    samples = []
+    metrics.reset()
+    started = time.perf_counter()
+    for b in range(batches):
+        files = [("files", f"survey{b}_{i}.jpg", file_bytes) for i, file_bytes in enumerate(images)]
+        t0 = time.perf_counter()
+        status, body = post("/predict/batch", files)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        assert status == 200, body
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": "batch",
+        "megapixels": megapixels,
+        "files_per_request": len(images),
+        "requests": batches,
+        "images_per_second": batches * len(images) / elapsed,
+        "latency": percentiles(samples),
+        "stages": metrics.stage_summary()
+    }
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with local stand-ins")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--predictor", choices=["tiny-model", "stub"], default="tiny-model")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[0.3, 2.0, 12.0])
+    parser.add_argument("--requests", type=int, default=50, help="Sequential requests per resolution")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument("--survey-size", type=int, default=30, help="Files per /predict/batch request")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--model-delay-ms", type=float, default=0.0, help="Simulated forward-pass cost per batch")
+    parser.add_argument("--geocode-delay-ms", type=float, default=0.0, help="Simulated geocoder latency")
+    parser.add_argument("--db-delay-ms", type=float, default=0.0, help="Simulated database write latency")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    app = wire(args)
+    stop, base_url = serve(app, args.server)
+    post = post_files(base_url)
+    results = []
+    try:
+        for megapixels in args.megapixels:
+            images = make_images(megapixels, max(args.requests, args.survey_size))
+            results.append(run_sequential(post, images[:args.requests], megapixels))
+            for concurrency in args.concurrency:
+                results.append(run_load(base_url, images, megapixels, concurrency, args.requests_per_client))
+            results.append(run_batch(post, images[:args.survey_size], megapixels, args.batches))
+            for row in results[-(len(args.concurrency) + 2):]:
+                rate = row.get("requests_per_second") or row.get("images_per_second")
+                label = row["scenario"] + (f" x{row['concurrency']}" if "concurrency" in row else "")
+                print(f"{megapixels:>5} MP  {label:<12} {rate:8.1f}/s  p50 {row['latency']['p50_ms']:7.1f} ms"
+                      f"  p99 {row['latency']['p99_ms']:7.1f} ms")
+    finally:
+        stop()
+
+    report = {"environment": environment(args), "results": results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_worker_pool.py - Throughput scaling of the inference worker pool
+"""
+Usage:
+    python -m benchmarks.bench_worker_pool --backend tflite --workers 0 1 2 4 --batch-size 8 --seconds 20
+
+"0 workers" is the in-process backend (one process using every core); N > 0
+spawns N pinned workers and keeps N batches in flight, as the web app does.
+"""
+import argparse
+import json
+import threading
+import time
+import numpy as np
+from src.config import IMAGE_SIZE
+from src.inference.worker_pool import InferenceWorkerPool, available_cores
+
+
+def build(kind, workers, batch_size):
+    if workers == 0:
+        from src.inference.backends import create_backend
+        return create_backend(kind, batch_size)
+    # Measuring fused/keras scaling means accepting a copy of the weights per worker
+    return InferenceWorkerPool(workers, kind, batch_size, private_weights=True)
+
+
+def drive(backend, images, clients, seconds):
+    """Run `clients` callers back to back for `seconds`; returns images processed"""
+    done = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def client(i):
+        while time.monotonic() < deadline:
+            backend.predict_batch(images)
+            done[i] += len(images)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure img/s as inference workers are added")
+    parser.add_argument("--backend", default="tflite", choices=["fused", "keras", "tflite"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    width, height = IMAGE_SIZE
+    images = np.random.default_rng(0).integers(
+        0, 256, size=(args.batch_size, height, width, 3)
+    ).astype(np.float32)
+
+    cores = available_cores()
+    results = []
+    baseline = None
+    for workers in args.workers:
+        backend = build(args.backend, workers, args.batch_size)
+        started = time.perf_counter()
+        backend.warm_up()
+        startup = time.perf_counter() - started
+
+        processed = drive(backend, images, max(1, workers), args.seconds)
+        throughput = processed / args.seconds
+        baseline = baseline or throughput
+        row = {
+            "backend": args.backend,
+            "workers": workers,
+            "cores": len(cores),
+            "startup_seconds": round(startup, 2),
+            "images_per_second": round(throughput, 2),
+            "speedup": round(throughput / baseline, 2)
+        }
+        results.append(row)
+        print(f"{workers:>2} workers: {throughput:8.2f} img/s  (x{row['speedup']:.2f}, startup {startup:.1f}s)")
+        if hasattr(backend, "close"):
+            backend.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# compare_runs.py - Flag performance regressions between two bench_e2e result files
+"""
+Usage:
+    python -m benchmarks.compare_runs base.json candidate.json --threshold 10
+
+Scenarios are matched on (scenario, megapixels, concurrency). A scenario
+regresses when its throughput drops, or its p50/p99 latency rises, by more
+than ``--threshold`` percent. The exit status is 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def key(row):
+    return row["scenario"], row.get("megapixels"), row.get("concurrency")
+
+
+def throughput(row):
+    return row.get("requests_per_second") or row.get("images_per_second") or 0.0
+
+
+def compare(base, candidate, threshold):
+    base_rows = {key(row): row for row in base["results"]}
+    regressions, lines = [], []
+    for row in candidate["results"]:
+        before = base_rows.get(key(row))
+        if before is None:
+            continue
+        checks = [("throughput", throughput(before), throughput(row), -1)]
+        for metric in ("p50_ms", "p99_ms"):
+            checks.append((metric, before["latency"].get(metric, 0.0), row["latency"].get(metric, 0.0), 1))
+        for metric, old, new, direction in checks:
+            if not old:
+                continue
+            change = (new - old) / old * 100.0
+            regressed = change * direction > threshold
+            label = "/".join(str(part) for part in key(row) if part is not None)
+            lines.append(f"{'REGRESSED' if regressed else 'ok':>9}  {label:<24} {metric:<10} "
+                         f"{old:10.2f} -> {new:10.2f}  ({change:+.1f}%)")
+            if regressed:
+                regressions.append((key(row), metric, change))
+    return regressions, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions, lines = compare(base, candidate, args.threshold)
+    print(f"base {base['environment'].get('commit')}  vs  candidate {candidate['environment'].get('commit')}")
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# parity_decode.py - Pixel and prediction parity: reduced-scale JPEG decode vs full decode + resize
+"""
+Usage:
+    python -m benchmarks.parity_decode --sample-dir uploads/approved --per-class 50 --output parity_decode.json
+    python -m benchmarks.parity_decode --megapixels 2 12 24 --pixels-only
+
+With --sample-dir, every JPEG found (one sub-folder per CLASS_NAMES entry)
+is decoded both ways and, unless --pixels-only, scored by the configured
+backend; with --megapixels, synthetic photos are used instead. Only
+JPEGs whose reduced decode actually differs from the full one are
+counted (small images and PNGs always take the full path).
+"""
+import argparse
+import json
+import cv2
+import numpy as np
+from src.config import APPROVED_FOLDER, CLASS_NAMES, IMAGE_SIZE, INFERENCE_BACKEND
+from benchmarks.bench_decode import synthetic_photo
+from benchmarks.parity_quantized import labeled_sample
+
+
+def decode_both(file_bytes: bytes):
+    """(full, reduced) images at IMAGE_SIZE, or None when both modes decode the same way"""
+    import src.predict as predict
+    buffer = np.frombuffer(file_bytes, dtype=np.uint8)
+    predict.FAST_DECODE_ENABLED = True
+    flag = predict.decode_flag(file_bytes)
+    if flag == cv2.IMREAD_COLOR:
+        return None
+    full = cv2.resize(cv2.imdecode(buffer, cv2.IMREAD_COLOR), IMAGE_SIZE)
+    reduced = cv2.resize(cv2.imdecode(buffer, flag), IMAGE_SIZE)
+    return full, reduced
+
+
+def pixel_report(pairs) -> dict:
+    diffs = [np.abs(full.astype(np.int16) - reduced.astype(np.int16)) for full, reduced in pairs]
+    psnr = [cv2.PSNR(full, reduced) for full, reduced in pairs]
+    return {
+        "mean_abs_diff": float(np.mean([d.mean() for d in diffs])),
+        "p99_abs_diff": float(np.percentile(np.concatenate([d.ravel() for d in diffs]), 99)),
+        "max_abs_diff": int(max(d.max() for d in diffs)),
+        "min_psnr_db": float(min(psnr)),
+        "mean_psnr_db": float(np.mean(psnr))
+    }
+
+
+def prediction_report(pairs, labels, batch_size: int) -> dict:
+    from src.inference.backends import create_backend
+    backend = create_backend(INFERENCE_BACKEND, max_batch_size=batch_size)
+    backend.warm_up()
+
+    def scores(images):
+        images = np.stack(images).astype(np.float32)
+        return np.concatenate([backend.predict_batch(images[i:i + batch_size])[1]
+                               for i in range(0, len(images), batch_size)])
+
+    full = scores([pair[0] for pair in pairs])
+    reduced = scores([pair[1] for pair in pairs])
+    report = {
+        "top1_agreement": float((full.argmax(axis=1) == reduced.argmax(axis=1)).mean()),
+        "max_prob_diff": float(np.abs(full - reduced).max()),
+        "mean_prob_diff": float(np.abs(full - reduced).mean())
+    }
+    if labels is not None:
+        report["full_accuracy"] = float((full.argmax(axis=1) == labels).mean())
+        report["reduced_accuracy"] = float((reduced.argmax(axis=1) == labels).mean())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reduced-scale JPEG decoding with a full decode")
+    parser.add_argument("--sample-dir", default=APPROVED_FOLDER)
+    parser.add_argument("--per-class", type=int, default=50)
+    parser.add_argument("--megapixels", type=float, nargs="+",
+                        help="Use synthetic photos of these sizes instead of --sample-dir")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the synthetic photos")
+    parser.add_argument("--pixels-only", action="store_true", help="Skip the model (no weights needed)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    if args.megapixels:
+        sources = [cv2.imencode(".jpg", synthetic_photo(mp, seed=i), [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1]
+                   .tobytes() for i, mp in enumerate(args.megapixels)]
+        labels = None
+    else:
+        paths, labels = labeled_sample(args.sample_dir, args.per_class)
+        if not paths:
+            raise SystemExit(f"No labeled images under {args.sample_dir}/<{'|'.join(CLASS_NAMES)}>")
+        sources = []
+        for path in paths:
+            with open(path, "rb") as f:
+                sources.append(f.read())
+
+    decoded = [decode_both(file_bytes) for file_bytes in sources]
+    kept = [i for i, pair in enumerate(decoded) if pair is not None]
+    if not kept:
+        raise SystemExit("No image is large enough for a reduced decode")
+    pairs = [decoded[i] for i in kept]
+
+    report = {"samples": len(sources), "reduced_decodes": len(pairs), "pixels": pixel_report(pairs)}
+    if not args.pixels_only:
+        report["predictions"] = prediction_report(pairs, None if labels is None else labels[kept], args.batch_size)
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# parity_quantized.py - Accuracy parity, throughput and memory: float model vs quantized TFLite
+"""
+Usage:
+    python -m benchmarks.parity_quantized --sample-dir uploads/approved --per-class 50 --output parity.json
+
+`--sample-dir` must hold one sub-folder per entry of CLASS_NAMES (the
+layout approvals are linked into). Each backend runs in its own process
+so the reported peak RSS is that backend's alone.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+from src.config import CLASS_NAMES, APPROVED_FOLDER, ALLOWED_EXTENSIONS, QUANTIZED_MODEL_PATH
+from benchmarks.bench_decode import peak_rss_kb
+
+
+def labeled_sample(sample_dir: str, per_class: int):
+    paths, labels = [], []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(sample_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        names = sorted(
+            name for name in os.listdir(class_dir)
+            if name.rsplit(".", 1)[-1].lower() in ALLOWED_EXTENSIONS
+        )[:per_class]
+        paths += [os.path.join(class_dir, name) for name in names]
+        labels += [label] * len(names)
+    return paths, np.array(labels)
+
+
+def _run_backend(kind: str, tflite_path: str, paths, batch_size: int, queue):
+    from src.predict import load_image, load_models
+    peak_rss_kb(reset=True)
+    if kind == "float":
+        from src.inference.fused_backend import FusedBackend
+        vgg19, model = load_models()
+        backend = FusedBackend(vgg19, model, max_batch_size=batch_size)
+        model_mb = sum(int(np.prod(w.shape)) * 4 for w in backend.model.weights) / 1e6
+    else:
+        from src.inference.quantized_backend import QuantizedBackend
+        backend = QuantizedBackend(tflite_path, max_batch_size=batch_size)
+        model_mb = os.path.getsize(tflite_path) / 1e6
+    backend.warm_up()
+
+    images = np.stack([load_image(path) for path in paths])
+    preds = []
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        _, batch_preds = backend.predict_batch(images[start:start + batch_size])
+        preds.append(batch_preds)
+    elapsed = time.perf_counter() - started
+    queue.put({
+        "preds": np.concatenate(preds).tolist(),
+        "images_per_sec": len(images) / elapsed,
+        "peak_rss_mb": peak_rss_kb() / 1024.0,
+        "model_mb": model_mb
+    })
+
+
+def run_backend(kind: str, tflite_path: str, paths, batch_size: int):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_backend, args=(kind, tflite_path, paths, batch_size, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    result["preds"] = np.array(result["preds"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the float model with its quantized export")
+    parser.add_argument("--sample-dir", default=APPROVED_FOLDER)
+    parser.add_argument("--per-class", type=int, default=50)
+    parser.add_argument("--tflite", default=QUANTIZED_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    paths, labels = labeled_sample(args.sample_dir, args.per_class)
+    if not paths:
+        raise SystemExit(f"No labeled images under {args.sample_dir}/<{'|'.join(CLASS_NAMES)}>")
+
+    reference = run_backend("float", args.tflite, paths, args.batch_size)
+    quantized = run_backend("quantized", args.tflite, paths, args.batch_size)
+    ref_top1 = reference["preds"].argmax(axis=1)
+    q_top1 = quantized["preds"].argmax(axis=1)
+
+    report = {
+        "samples": len(paths),
+        "per_class_samples": {name: int((labels == i).sum()) for i, name in enumerate(CLASS_NAMES)},
+        "top1_agreement": float((ref_top1 == q_top1).mean()),
+        "float_accuracy": float((ref_top1 == labels).mean()),
+        "quantized_accuracy": float((q_top1 == labels).mean()),
+        "per_class_agreement": {
+            name: float((ref_top1[labels == i] == q_top1[labels == i]).mean())
+            for i, name in enumerate(CLASS_NAMES) if (labels == i).any()
+        },
+        "max_prob_diff": float(np.abs(reference["preds"] - quantized["preds"]).max()),
+        "mean_prob_diff": float(np.abs(reference["preds"] - quantized["preds"]).mean()),
+        "float": {
+            "images_per_sec": reference["images_per_sec"],
+            "peak_rss_mb": reference["peak_rss_mb"],
+            "model_mb": reference["model_mb"]
+        },
+        "quantized": {
+            "images_per_sec": quantized["images_per_sec"],
+            "peak_rss_mb": quantized["peak_rss_mb"],
+            "model_mb": quantized["model_mb"]
+        }
+    }
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
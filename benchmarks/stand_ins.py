@@ -0,0 +1,219 @@
+# stand_ins.py - Offline replacements for the model, MongoDB and the geocoders
+import asyncio
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from bson import ObjectId
+from src.config import IMAGE_SIZE, CLASS_NAMES
+from src.interfaces import IInferenceBackend, IPredictor, IPredictionRepository, ILocationService
+from src.predict import decode_image, build_result
+from src.repositories.mongo_repository import plan_review
+
+STUB_LOCATION = {"latitude": 14.6, "longitude": 121.0, "city": "Benchmark City", "country": "PH"}
+
+
+class TinyBackend(IInferenceBackend):
+    """Deterministic stand-in for VGG19 + head: 8x8 average pool and a fixed linear layer.
+
+    ``delay_ms`` adds a fixed per-batch cost to model a real forward pass.
+    """
+
+    def __init__(self, seed: int = 0, delay_ms: float = 0.0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.standard_normal((8 * 8 * 3, len(CLASS_NAMES))).astype(np.float32)
+        self.delay = delay_ms / 1000.0
+
+    def predict_batch(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        n, height, width, _ = images.shape
+        cell_h, cell_w = height // 8, width // 8
+        cropped = images[:, :cell_h * 8, :cell_w * 8]
+        pooled = cropped.reshape(n, 8, cell_h, 8, cell_w, 3).mean(axis=(2, 4)) / 255.0
+        features = pooled.reshape(n, -1)
+        logits = features @ self.weights
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        if self.delay:
+            time.sleep(self.delay)
+        return features, probs / probs.sum(axis=1, keepdims=True)
+
+    def warm_up(self):
+        width, height = IMAGE_SIZE
+        self.predict_batch(np.zeros((1, height, width, 3), dtype=np.float32))
+
+
+class StubPredictor(IPredictor):
+    """Real decode, tiny model, no batching: isolates the web and storage path"""
+
+    def __init__(self, backend: TinyBackend = None):
+        self.backend = backend or TinyBackend()
+        self.model_version = "stub"
+
+    def _predict(self, image, filename: str) -> Dict[str, Any]:
+        features, preds = self.backend.predict_batch(image[np.newaxis])
+        result = build_result(filename, preds[0])
+        result["model_version"] = self.model_version
+        result["features"] = features[0]
+        return result
+
+    def predict(self, image_path: str) -> Dict[str, Any]:
+        with open(image_path, "rb") as f:
+            return self.predict_bytes(f.read(), image_path)
+
+    def predict_bytes(self, file_bytes: bytes, filename: str) -> Dict[str, Any]:
+        return self._predict(decode_image(file_bytes), filename)
+
+    def predict_many(self, items: List[Tuple[bytes, str]]) -> List[Any]:
+        results = []
+        for file_bytes, filename in items:
+            try:
+                results.append(self.predict_bytes(file_bytes, filename))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class InMemoryRepository(IPredictionRepository):
+    """Reports in a dict; images are hashed but not written anywhere.
+
+    ``delay_ms`` adds a simulated database round trip to every write.
+    """
+
+    def __init__(self, location_service: ILocationService, delay_ms: float = 0.0):
+        self.location_service = location_service
+        self.delay = delay_ms / 1000.0
+        self.reports: Dict[ObjectId, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _document(entry: Dict[str, Any], user_data: Dict[str, Any], location_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "_id": ObjectId(),
+            "classificationId": str(uuid.uuid4()),
+            "filename": entry["filename"],
+            "stored_filename": entry["filename"],
+            "prediction": entry["prediction"],
+            "confidence": float(entry["confidence"]),
+            "model_version": entry.get("model_version"),
+            "status": "pending",
+            "reviewed_by": None,
+            "location_info": location_info,
+            **(user_data or {})
+        }
+
+    def _insert(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            for doc in docs:
+                self.reports[doc["_id"]] = doc
+        return [{"inserted_id": doc["_id"], "location_info": doc["location_info"], "file_path": None}
+                for doc in docs]
+
+    def save_prediction(self, file_bytes: bytes, filename: str, prediction: str, confidence: float,
+                        user_data: Dict[str, Any], features=None, client_ip: str = None,
+                        model_version: str = None) -> Dict[str, Any]:
+        entry = {"filename": filename, "prediction": prediction, "confidence": confidence,
+                 "model_version": model_version}
+        return self.save_predictions([entry], user_data, client_ip)[0]
+
+    def save_predictions(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                         client_ip: str = None) -> List[Dict[str, Any]]:
+        location_info = self.location_service.get_location(client_ip)
+        if self.delay:
+            time.sleep(self.delay)
+        return self._insert([self._document(entry, user_data, location_info) for entry in entries])
+
+    def update_status(self, report_id: str, status: str, reviewer: str = None):
+        with self._lock:
+            report = self.reports.get(ObjectId(report_id))
+            if report is not None:
+                report.update(status=status, reviewed_by=reviewer)
+
+    def update_status_by_filename(self, filename: str, status: str, label: str = None):
+        with self._lock:
+            for report in self.reports.values():
+                if report["stored_filename"] == filename:
+                    report.update(status=status, approved_class=label)
+
+    def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            found = {report["stored_filename"]: report for report in self.reports.values()}
+            updates, _, outcomes = plan_review(decisions, found, reviewer)
+            for query, update in updates:
+                found[query["stored_filename"]].update(update["$set"])
+        return outcomes
+
+    def _page(self, match, limit: int, after_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = sorted(self.reports)
+            if after_id:
+                ids = [report_id for report_id in ids if report_id > ObjectId(after_id)]
+            matched = [self.reports[report_id] for report_id in ids if match(self.reports[report_id])]
+        return matched[:limit] if limit else matched
+
+    def fetch_pending(self, limit: int = 0, after_id: str = None, projection: Dict[str, Any] = None):
+        return self._page(lambda report: report["status"] == "pending", limit, after_id)
+
+    def fetch_by_location(self, city: str = None, country: str = None, limit: int = 0,
+                          after_id: str = None, projection: Dict[str, Any] = None):
+        def match(report):
+            location = report["location_info"]
+            return (not city or location["city"] == city) and (not country or location["country"] == country)
+        return self._page(match, limit, after_id)
+
+
+class AsyncInMemoryRepository:
+    """Coroutine front of an InMemoryRepository, for the ASGI app (delays are awaited)"""
+
+    def __init__(self, repository: InMemoryRepository):
+        self.repository = repository
+
+    async def save_prediction(self, file_bytes: bytes, filename: str, prediction: str, confidence: float,
+                              user_data: Dict[str, Any], features=None, client_ip: str = None,
+                              model_version: str = None) -> Dict[str, Any]:
+        entry = {"filename": filename, "prediction": prediction, "confidence": confidence,
+                 "model_version": model_version}
+        return (await self.save_predictions([entry], user_data, client_ip))[0]
+
+    async def save_predictions(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                               client_ip: str = None) -> List[Dict[str, Any]]:
+        location_info = await self.repository.location_service.get_location_async(client_ip)
+        if self.repository.delay:
+            await asyncio.sleep(self.repository.delay)
+        docs = [self.repository._document(entry, user_data, location_info) for entry in entries]
+        return self.repository._insert(docs)
+
+    async def update_status_by_filename(self, filename: str, status: str, label: str = None):
+        self.repository.update_status_by_filename(filename, status, label)
+
+    async def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        if self.repository.delay:
+            await asyncio.sleep(self.repository.delay)
+        return self.repository.review_many(decisions, reviewer)
+
+
+class StubLocationService(ILocationService):
+    """Fixed location after an optional simulated geocoder delay"""
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay = delay_ms / 1000.0
+
+    def get_location(self, client_ip: str = None) -> Dict[str, Any]:
+        if self.delay:
+            time.sleep(self.delay)
+        return dict(STUB_LOCATION)
+
+    async def get_location_async(self, client_ip: str = None) -> Dict[str, Any]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return dict(STUB_LOCATION)
+
+    def peek_location(self, client_ip: str = None):
+        return dict(STUB_LOCATION)
+
+    def resolve_async(self, client_ip: str = None, callback=None):
+        if callback:
+            callback(dict(STUB_LOCATION))
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
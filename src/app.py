@@ -1,11 +1,30 @@
 # refactored_app.py - Following SOLID principles
 import os
-from flask import Flask, request, jsonify
+import threading
+import time
+from io import BytesIO
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 from .dependency_container import container
 from .logger import logger
+from .metrics import metrics
 from .notifier import Notifier
+from .config import (
+    MAX_CONTENT_LENGTH, INFERENCE_WORKERS, JOB_MAX_WAIT, BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_MAX_CONTENT_LENGTH,
+    REVIEW_MAX_ITEMS, IMAGE_CACHE_MAX_AGE, SIMILARITY_MAX_K, SIMILARITY_DUPLICATE_THRESHOLD,
+    OUTBREAK_SUMMARY_DEFAULT_DAYS, OUTBREAK_SUMMARY_MAX_DAYS
+)
+from .services.job_queue import QueueFullError, CallbackNotAllowedError
+from .services.thumbnailer import MIME_TYPES
+from .services.similarity_index import IndexNotReadyError, describe_neighbours
+from .services.location_service import client_address
+from .repositories.outbreak_rollups import parse_summary_query
+from .inference.worker_pool import in_inference_worker
+from .app_common import (
+    TRUSTED_NETWORKS, user_data_from_form, announce_prediction, announce_batch, announce_job,
+    service_stats, register_gauges
+)
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
@@ -13,7 +32,22 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 # -------------------------
 # App Setup
 # -------------------------
+class InMemoryRequest(Request):
+    """Keep uploads in memory instead of werkzeug's spooled temp files"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+    
+    @property
+    def max_content_length(self):
+        # A field survey upload carries many photos in one body
+        if self.path == "/predict/batch":
+            return BATCH_UPLOAD_MAX_CONTENT_LENGTH
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 
 CORS(app, 
      origins=["http://localhost:3000", "http://192.168.1.5:3000", "http://localhost:5173"],
@@ -23,6 +57,38 @@ CORS(app,
 
 notifier = Notifier()
 
+container.get_job_queue().add_listener(lambda job: announce_job(notifier, job))
+
+# Load and warm the models in the background so worker startup (and "/") stay instant.
+# Spawned inference workers re-import this module and must not start a pool of their own.
+if not in_inference_worker():
+    container.get_model_loader().start()
+    # Resume jobs spooled before a restart
+    container.get_job_queue().start()
+    if container.get_similarity_index() is not None:
+        container.get_similarity_index().start()
+
+# -------------------------
+# Metrics
+# -------------------------
+_in_flight = {"requests": 0}
+_in_flight_lock = threading.Lock()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    with _in_flight_lock:
+        _in_flight["requests"] += 1
+
+@app.teardown_request
+def finish_request_timer(error=None):
+    with _in_flight_lock:
+        _in_flight["requests"] -= 1
+    if request.endpoint and "request_started" in g:
+        metrics.observe(f"http_{request.endpoint}", time.perf_counter() - g.request_started)
+
+register_gauges(lambda: _in_flight["requests"])
+
 # -------------------------
 # Error Handlers
 # -------------------------
@@ -36,7 +102,11 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def too_large(error):
-    return jsonify({"error": "File too large"}), 413
+    return jsonify({"error": "File too large", "max_bytes": request.max_content_length}), 413
+
+def client_ip():
+    """Original client address; X-Forwarded-For only counts from a TRUSTED_PROXIES peer"""
+    return client_address(request.remote_addr, request.headers.get("X-Forwarded-For"), TRUSTED_NETWORKS)
 
 # -------------------------
 # Routes - Single Responsibility: Handle HTTP concerns only
@@ -45,6 +115,50 @@ def too_large(error):
 def health_check():
     return jsonify({"status": "ok", "message": "Harvest Assistant Model Service is running"})
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once the models are loaded and warm, 503 until then"""
+    status = container.get_model_loader().status()
+    return jsonify(status), 200 if status["status"] == "ready" else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/profile", methods=["GET", "POST", "DELETE"])
+def profile():
+    """POST starts sampled cProfile captures of prediction requests, GET reports, DELETE stops"""
+    profiler = metrics.profiler
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        profiler.start(float(body.get("sample_rate", 0.1)), int(body.get("samples", 50)))
+        return jsonify(profiler.status())
+    if request.method == "DELETE":
+        profiler.stop()
+        return jsonify(profiler.status())
+    return Response(profiler.report(request.args.get("sort", "cumulative"), request.args.get("limit", 40, type=int)),
+                    mimetype="text/plain")
+
+@app.route("/admin/model", methods=["GET"])
+def model_status():
+    """Serving model version, the version on disk and recent hot reloads"""
+    return jsonify(container.get_model_loader().reload_status())
+
+@app.route("/admin/model/reload", methods=["POST"])
+def reload_model():
+    """Load and warm the model file now on disk in the background, then swap it in (202)"""
+    loader = container.get_model_loader()
+    if not loader.reload():
+        return jsonify({"error": "A model load or reload is already in progress", **loader.reload_status()}), 409
+    logger.info(f"Model reload requested (serving {loader.version})")
+    return jsonify(loader.reload_status()), 202
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """Batching, cache and write-behind counters for tuning"""
+    return jsonify(service_stats(notifier))
+
 @app.route("/predict", methods=["POST"])
 def predict():
     # Validate request
@@ -56,23 +170,16 @@ def predict():
         return jsonify({"error": "Empty filename"}), 400
 
     # Extract user data
-    user_data = {
-        "rsbsaNumber": request.form.get("rsbsaNumber", "anonymous"),
-        "fullName": request.form.get("fullName", "Unknown"),
-        "barangay": request.form.get("barangay", "Unknown"),
-        "crop": request.form.get("crop", "Unknown"),
-        "area": request.form.get("area", "0"),
-        "contact": request.form.get("contact", "Unknown")
-    }
+    user_data = user_data_from_form(request.form)
 
     try:
         # Use dependency injection - no direct dependencies
         prediction_service = container.get_prediction_service()
-        result = prediction_service.process_prediction(file, user_data)
+        with metrics.profiler.profile():
+            result = prediction_service.process_prediction(file, user_data, client_ip())
         
         # Log and notify
-        logger.info(f"Prediction made by {user_data['fullName']} ({user_data['rsbsaNumber']}) from {user_data['barangay']}")
-        notifier.notify_admin(f"New prediction from {user_data['fullName']}: {result['prediction']}")
+        announce_prediction(notifier, user_data, result)
         
         return jsonify(result)
 
@@ -80,18 +187,139 @@ def predict():
         logger.error(f"Prediction error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Score a field survey: many files, one shared farmer form, results in upload order"""
+    files = [file for file in request.files.getlist("files") if file.filename]
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        return jsonify({"error": f"At most {BATCH_UPLOAD_MAX_FILES} files per batch"}), 400
+
+    user_data = user_data_from_form(request.form)
+
+    try:
+        prediction_service = container.get_prediction_service()
+        with metrics.profiler.profile():
+            results = prediction_service.process_batch(files, user_data, client_ip())
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    succeeded = announce_batch(notifier, user_data, results)
+
+    return jsonify({"count": len(results), "succeeded": succeeded, "results": results})
+
+@app.route("/predict/async", methods=["POST"])
+def predict_async():
+    """Queue the upload and return a job id immediately (202)"""
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    file = request.files["file"]
+    if file.filename == "":
+        return jsonify({"error": "Empty filename"}), 400
+
+    callback_url = request.form.get("callbackUrl") or None
+    try:
+        job = container.get_job_queue().submit(file, user_data_from_form(request.form), client_ip(), callback_url)
+    except CallbackNotAllowedError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+
+    logger.info(f"Queued prediction job {job['id']} for {request.form.get('fullName', 'Unknown')}")
+    return jsonify(job), 202, {"Location": f"/jobs/{job['id']}"}
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Job status; ?wait=<seconds> long-polls until the job finishes"""
+    wait = min(max(request.args.get("wait", 0, type=float), 0.0), JOB_MAX_WAIT)
+    job = container.get_job_queue().get(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/reports/summary", methods=["GET"])
+def outbreak_summary():
+    """Pest reports per day/barangay/crop/class over a time window, from the rollup counters.
+    
+    Query: ?from=YYYY-MM-DD&to=YYYY-MM-DD (or ?days=N, ending today, UTC),
+    group_by=day,barangay,crop,label, basis=predicted|approved and optional
+    barangay/crop/class filters.
+    """
+    try:
+        query = parse_summary_query(request.args, OUTBREAK_SUMMARY_DEFAULT_DAYS, OUTBREAK_SUMMARY_MAX_DAYS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    summary = container.get_repository().outbreak_summary(**query)
+    return jsonify({"from": query["start_day"], "to": query["end_day"], "basis": query["basis"],
+                    "group_by": query["group_by"], **summary})
+
+@app.route("/reports/<report_id>/image", methods=["GET"])
+def report_image(report_id):
+    """Stream a report's image (or a cached ?size= thumbnail) from disk with ETag and Range support"""
+    thumbnailer = container.get_thumbnailer()
+    try:
+        size, image_format = thumbnailer.variant(request.args.get("size"), request.args.get("format"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    image = container.get_repository().get_image(report_id)
+    if image is None:
+        return jsonify({"error": "Image not found"}), 404
+    path, etag = image["path"], image["digest"]
+    if size:
+        try:
+            path = thumbnailer.get(path, size, image_format)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 422
+        except FileNotFoundError:
+            path = None
+        etag = f"{etag}-w{size}.{image_format}"
+    if path is None or not os.path.isfile(path):
+        # The blob was released (or never written) after the report lookup
+        return jsonify({"error": "Image not found"}), 404
+    mimetype = MIME_TYPES.get(image_format) or image["mimetype"] or "application/octet-stream"
+    
+    # send_file answers If-None-Match with 304 and Range with 206; the WSGI
+    # server's file wrapper can then use sendfile instead of copying in Python
+    return send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=IMAGE_CACHE_MAX_AGE)
+
+@app.route("/reports/<report_id>/similar", methods=["GET"])
+def similar_reports(report_id):
+    """Nearest earlier reports by VGG19 features; ?approved=true keeps confirmed cases only"""
+    index = container.get_similarity_index()
+    if index is None:
+        return jsonify({"error": "Similarity search is disabled"}), 404
+    k = min(max(request.args.get("k", 10, type=int), 1), SIMILARITY_MAX_K)
+    approved_only = request.args.get("approved", "false").lower() == "true"
+    
+    repository = container.get_repository()
+    report = repository.get_report(report_id, {"classificationId": 1})
+    if report is None:
+        return jsonify({"error": "Report not found"}), 404
+    try:
+        # Confirmed cases can be sparse, so look further before filtering
+        neighbours = index.similar(report.get("classificationId"), SIMILARITY_MAX_K if approved_only else k)
+    except IndexNotReadyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    if neighbours is None:
+        return jsonify({"error": "No features stored for this report"}), 404
+    
+    reports = repository.fetch_by_classification_ids([classification_id for classification_id, _ in neighbours])
+    results = describe_neighbours(neighbours, reports, SIMILARITY_DUPLICATE_THRESHOLD, approved_only)[:k]
+    return jsonify({"id": report_id, "k": k, "mode": index.mode, "results": results})
+
 @app.route("/admin/approve/<filename>/<label>", methods=["POST"])
 def approve(filename, label):
     """Admin approval endpoint"""
     try:
-        repository = container.get_repository()
-        file_manager = container.get_file_manager()
-        
-        # Update status in repository
-        repository.update_status_by_filename(filename, "approved", label)
-        
-        # Move file (this could be extracted to a separate service)
-        # file_manager.move_to_approved(filename, label)
+        [outcome] = container.get_review_file_mover().submit_reviewed(
+            container.get_repository().review_many([{"filename": filename, "action": "approve", "label": label}])
+        )
+        if "error" in outcome:
+            return jsonify({"error": outcome["error"]}), 404 if outcome["error"] == "Report not found" else 400
         
         logger.info(f"File {filename} approved under class {label}")
         return jsonify({"status": "approved", "file": filename, "class": label})
@@ -100,5 +328,33 @@ def approve(filename, label):
         logger.error(f"Approval error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/admin/review", methods=["POST"])
+def review():
+    """Apply many approve/reject decisions at once; images are filed in the background.
+    
+    Body: {"reviewer": "...", "decisions": [{"filename": stored_filename,
+    "action": "approve" | "reject", "label": class}]}. Returns one outcome
+    per decision, in order.
+    """
+    body = request.get_json(silent=True) or {}
+    decisions = body.get("decisions")
+    if not isinstance(decisions, list) or not decisions:
+        return jsonify({"error": "decisions must be a non-empty list"}), 400
+    if len(decisions) > REVIEW_MAX_ITEMS:
+        return jsonify({"error": f"At most {REVIEW_MAX_ITEMS} decisions per request"}), 400
+    decisions = [decision if isinstance(decision, dict) else {} for decision in decisions]
+    
+    try:
+        outcomes = container.get_repository().review_many(decisions, body.get("reviewer"))
+    except Exception as e:
+        logger.error(f"Bulk review error: {e}")
+        return jsonify({"error": str(e)}), 500
+    results = container.get_review_file_mover().submit_reviewed(outcomes)
+    
+    applied = sum(1 for result in results if "error" not in result)
+    logger.info(f"Bulk review by {body.get('reviewer', 'unknown')}: {applied}/{len(results)} applied")
+    return jsonify({"count": len(results), "applied": applied, "results": results})
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    # The reloader would fork a second server with its own worker pool
+    app.run(host="0.0.0.0", port=5001, debug=True, use_reloader=INFERENCE_WORKERS == 0, threaded=True)
\ No newline at end of file
@@ -0,0 +1,112 @@
+# app_common.py - Single Responsibility: Request-independent helpers shared by the Flask and ASGI apps
+from collections import Counter
+from typing import Any, Callable, Dict, List
+from .dependency_container import container
+from .logger import logger
+from .metrics import metrics
+from .config import TRUSTED_PROXIES
+from .services.location_service import parse_networks
+
+TRUSTED_NETWORKS = parse_networks(TRUSTED_PROXIES)
+
+
+def user_data_from_form(form) -> Dict[str, str]:
+    """Farmer details sent alongside an upload (any mapping with ``get``)"""
+    return {
+        "rsbsaNumber": form.get("rsbsaNumber", "anonymous"),
+        "fullName": form.get("fullName", "Unknown"),
+        "barangay": form.get("barangay", "Unknown"),
+        "crop": form.get("crop", "Unknown"),
+        "area": form.get("area", "0"),
+        "contact": form.get("contact", "Unknown")
+    }
+
+
+def announce_prediction(notifier, user_data: Dict[str, str], result: Dict[str, Any]):
+    """Log a scored upload and notify the admin"""
+    logger.info(f"Prediction made by {user_data['fullName']} ({user_data['rsbsaNumber']}) from {user_data['barangay']}")
+    notifier.notify_admin(
+        f"New prediction from {user_data['fullName']}: {result['prediction']}",
+        barangay=user_data["barangay"], prediction=result["prediction"]
+    )
+
+
+def announce_batch(notifier, user_data: Dict[str, str], results: List[Dict[str, Any]]) -> int:
+    """Log a scored field survey and notify the admin once per class; returns how many were scored"""
+    scored = [result for result in results if "error" not in result]
+    logger.info(
+        f"Batch of {len(results)} from {user_data['fullName']} ({user_data['rsbsaNumber']}) "
+        f"in {user_data['barangay']}: {len(scored)} scored"
+    )
+    for prediction, count in Counter(result["prediction"] for result in scored).items():
+        notifier.notify_admin(
+            f"New batch from {user_data['fullName']}: {prediction} x{count}",
+            barangay=user_data["barangay"], prediction=prediction, count=count
+        )
+    return len(scored)
+
+
+def announce_job(notifier, job: Dict[str, Any]):
+    """Notify the admin of a finished async prediction, as /predict does inline (job queue thread)"""
+    if job["status"] == "done":
+        notifier.notify_admin(
+            f"New prediction from {job['user_data']['fullName']}: {job['result']['prediction']}",
+            barangay=job["user_data"]["barangay"], prediction=job["result"]["prediction"]
+        )
+
+
+def loaded_backend():
+    """The serving inference backend, or None while it is still loading (never waits)"""
+    loader = container.get_model_loader()
+    return loader.wait() if loader.is_ready else None
+
+
+def queue_depths() -> Dict[str, int]:
+    """Depth of every queue in front of the model or the database"""
+    depths = {
+        "batch_scheduler": container.get_batch_scheduler().stats()["queue_depth"],
+        "jobs": container.get_job_queue().stats()["pending"],
+        "review_files": container.get_review_file_mover().stats()["pending"]
+    }
+    service = container.created("async_prediction_service")
+    if service is not None:
+        depths["inference_executor"] = service.stats()["pending"]
+    repository = container.created("repository")
+    if hasattr(repository, "stats"):
+        depths["write_behind"] = repository.stats()["queue_depth"]
+    backend = loaded_backend()
+    if hasattr(backend, "stats"):
+        depths["inference_workers"] = sum(worker["outstanding"] for worker in backend.stats()["workers"])
+    return depths
+
+
+def service_stats(notifier) -> Dict[str, Any]:
+    """Batching, cache and write-behind counters for tuning (may build the repository; call off the event loop)"""
+    cache = container.get_prediction_cache()
+    repository = container.get_repository()
+    backend = loaded_backend()
+    index = container.get_similarity_index()
+    return {
+        "repository": repository.stats() if hasattr(repository, "stats") else None,
+        "batching": container.get_batch_scheduler().stats(),
+        "inference_workers": backend.stats() if hasattr(backend, "stats") else None,
+        "prediction_cache": cache.stats() if cache else None,
+        "location_cache": container.get_location_service().stats(),
+        "jobs": container.get_job_queue().stats(),
+        "review_files": container.get_review_file_mover().stats(),
+        "similarity_index": index.stats() if index else None,
+        "stages": metrics.stage_summary(),
+        "notifications": notifier.stats()
+    }
+
+
+def register_gauges(in_flight: Callable[[], int]):
+    """Scrape-time gauges both apps export"""
+    metrics.gauge("in_flight_requests", "Requests currently being served", in_flight)
+    metrics.gauge("queue_depth", "Items waiting per queue", queue_depths)
+    metrics.gauge("model_ready", "1 once the model is loaded and warm",
+                  lambda: 1 if container.get_model_loader().is_ready else 0)
+    metrics.gauge("model_load_seconds", "Model load, warm-up and cold-start time", lambda: {
+        key[:-len("_seconds")]: value for key, value in container.get_model_loader().status().items()
+        if key.endswith("_seconds")
+    })
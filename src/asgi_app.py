@@ -0,0 +1,506 @@
+# asgi_app.py - ASGI serving mode: the routes of app.py on an event loop
+"""
+Run with:
+    python -m src.asgi_app
+    uvicorn src.asgi_app:app --host 0.0.0.0 --port 5001
+
+Same routes and responses as the Flask app. Geocoding (httpx) and report
+writes (motor) are awaited instead of holding a thread each; with
+REPOSITORY_MODE=write_behind, reports go to the write-behind queue as in
+the Flask app (enqueueing is handed to a thread). Decoding and
+inference run on a bounded thread pool that still feeds the shared
+BatchScheduler. ASGI_MAX_CONCURRENCY caps requests in flight and
+ASGI_MAX_PENDING_INFERENCE caps queued inference, both answering 503.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Dict, List
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from .dependency_container import container
+from .logger import logger
+from .metrics import metrics
+from .notifier import Notifier
+from .config import (
+    MAX_CONTENT_LENGTH, JOB_MAX_WAIT, BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_MAX_CONTENT_LENGTH,
+    REVIEW_MAX_ITEMS, IMAGE_CACHE_MAX_AGE, ASGI_HOST, ASGI_PORT, ASGI_MAX_CONCURRENCY,
+    SIMILARITY_MAX_K, SIMILARITY_DUPLICATE_THRESHOLD, OUTBREAK_SUMMARY_DEFAULT_DAYS, OUTBREAK_SUMMARY_MAX_DAYS
+)
+from .services.job_queue import QueueFullError, CallbackNotAllowedError, QUEUED, RUNNING
+from .services.async_prediction_service import InferenceBusyError
+from .services.thumbnailer import MIME_TYPES
+from .services.similarity_index import IndexNotReadyError, describe_neighbours
+from .services.location_service import client_address
+from .repositories.outbreak_rollups import parse_summary_query
+from .app_common import (
+    TRUSTED_NETWORKS, user_data_from_form, announce_prediction, announce_batch, announce_job,
+    service_stats, register_gauges
+)
+
+# Geocoder and Mongo clients are built for the event loop
+container.enable_async_io()
+
+notifier = Notifier()
+
+# -------------------------
+# Request limits
+# -------------------------
+class RequestLimitMiddleware:
+    """Caps requests in flight (503), rejects oversized bodies (413) and times each endpoint"""
+
+    def __init__(self, app, max_concurrency: int):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rejected = 0
+
+    @staticmethod
+    def body_limit(path: str) -> int:
+        # A field survey upload carries many photos in one body
+        return BATCH_UPLOAD_MAX_CONTENT_LENGTH if path == "/predict/batch" else MAX_CONTENT_LENGTH
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if self.in_flight >= self.max_concurrency:
+            self.rejected += 1
+            response = JSONResponse({"error": "Server busy"}, 503, headers={"Retry-After": "1"})
+            return await response(scope, receive, send)
+
+        limit = self.body_limit(scope["path"])
+        headers = dict(scope["headers"])
+        if int(headers.get(b"content-length", b"0") or 0) > limit:
+            return await JSONResponse({"error": "File too large", "max_bytes": limit}, 413)(scope, receive, send)
+
+        # Chunked bodies carry no Content-Length; count what actually arrives.
+        # Past the limit the 413 is sent from here and the app is told the
+        # client went away, so it stops reading; whatever it answers or raises
+        # after that is dropped.
+        received = 0
+        started = False
+        too_large = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                too_large = True
+                if not started:
+                    await JSONResponse({"error": "File too large", "max_bytes": limit}, 413)(scope, receive, send)
+                return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if too_large:
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        self.in_flight += 1
+        request_started = time.perf_counter()
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            # Typically ClientDisconnect from the form parser we cut off
+            if not too_large:
+                raise
+        finally:
+            self.in_flight -= 1
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                metrics.observe(f"http_{endpoint.__name__}", time.perf_counter() - request_started)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "max_concurrency": self.max_concurrency, "rejected": self.rejected}
+
+# -------------------------
+# Job long-polling
+# -------------------------
+# /jobs/<id>?wait= awaits a future instead of parking a thread on the job's event
+_job_waiters: Dict[str, List[asyncio.Future]] = {}
+
+
+def notify_job_finished(job):
+    """Notify the admin of async predictions and wake long-polls (job queue thread)"""
+    announce_job(notifier, job)
+    for future in _job_waiters.pop(job["id"], []):
+        future.get_loop().call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+
+container.get_job_queue().add_listener(notify_job_finished)
+
+# -------------------------
+# Lifespan
+# -------------------------
+@asynccontextmanager
+async def lifespan(app):
+    location_service = container.get_location_service()
+    if hasattr(location_service, "bind"):
+        location_service.bind(asyncio.get_running_loop())
+    # Load and warm the models in the background so startup (and "/") stay instant
+    container.get_model_loader().start()
+    # Resume jobs spooled before a restart
+    container.get_job_queue().start()
+    if container.get_similarity_index() is not None:
+        container.get_similarity_index().start()
+    yield
+    if hasattr(location_service, "aclose"):
+        await location_service.aclose()
+
+# -------------------------
+# Helpers
+# -------------------------
+def client_ip(request: Request) -> str:
+    """Original client address; X-Forwarded-For only counts from a TRUSTED_PROXIES peer"""
+    peer = request.client.host if request.client else None
+    return client_address(peer, request.headers.get("X-Forwarded-For"), TRUSTED_NETWORKS)
+
+
+def busy(error: InferenceBusyError) -> JSONResponse:
+    return JSONResponse({"error": str(error)}, 503, headers={"Retry-After": "1"})
+
+# -------------------------
+# Routes - Single Responsibility: Handle HTTP concerns only
+# -------------------------
+async def health_check(request: Request):
+    return JSONResponse({"status": "ok", "message": "Harvest Assistant Model Service is running"})
+
+
+async def ready(request: Request):
+    """Readiness probe: 200 once the models are loaded and warm, 503 until then"""
+    status = container.get_model_loader().status()
+    return JSONResponse(status, 200 if status["status"] == "ready" else 503)
+
+
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def profile(request: Request):
+    """POST starts sampled cProfile captures of prediction requests, GET reports, DELETE stops"""
+    profiler = metrics.profiler
+    if request.method == "POST":
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        profiler.start(float(body.get("sample_rate", 0.1)), int(body.get("samples", 50)))
+        return JSONResponse(profiler.status())
+    if request.method == "DELETE":
+        profiler.stop()
+        return JSONResponse(profiler.status())
+    return PlainTextResponse(profiler.report(request.query_params.get("sort", "cumulative"),
+                                             int(request.query_params.get("limit", 40))))
+
+
+async def model_status(request: Request):
+    """Serving model version, the version on disk and recent hot reloads"""
+    loader = container.get_model_loader()
+    return JSONResponse(await asyncio.get_running_loop().run_in_executor(None, loader.reload_status))
+
+
+async def reload_model(request: Request):
+    """Load and warm the model file now on disk in the background, then swap it in (202)"""
+    loader = container.get_model_loader()
+    accepted = loader.reload()
+    # reload_status hashes the model file; keep that off the event loop
+    status = await asyncio.get_running_loop().run_in_executor(None, loader.reload_status)
+    if not accepted:
+        return JSONResponse({"error": "A model load or reload is already in progress", **status}, 409)
+    logger.info(f"Model reload requested (serving {status.get('model_version')})")
+    return JSONResponse(status, 202)
+
+
+async def stats(request: Request):
+    """Batching, cache, concurrency and write-behind counters for tuning"""
+    # Building the repository connects to Mongo; keep it off the event loop
+    snapshot = await asyncio.get_running_loop().run_in_executor(None, service_stats, notifier)
+    service = container.created("async_prediction_service")
+    return JSONResponse({**snapshot, "asgi": {**app.stats(), "inference": service.stats() if service else None}})
+
+
+async def predict(request: Request):
+    form = await request.form()
+    file = form.get("file")
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "No file uploaded"}, 400)
+    if not file.filename:
+        return JSONResponse({"error": "Empty filename"}, 400)
+
+    user_data = user_data_from_form(form)
+
+    try:
+        prediction_service = container.get_async_prediction_service()
+        # Samples the event loop thread while this request is in flight
+        with metrics.profiler.profile():
+            result = await prediction_service.process_prediction(file, user_data, client_ip(request))
+    except InferenceBusyError as e:
+        return busy(e)
+    except Exception as e:
+        logger.error(f"Prediction error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+    announce_prediction(notifier, user_data, result)
+    return JSONResponse(result)
+
+
+async def predict_batch(request: Request):
+    """Score a field survey: many files, one shared farmer form, results in upload order"""
+    form = await request.form(max_files=BATCH_UPLOAD_MAX_FILES + 1)
+    files = [file for file in form.getlist("files") if not isinstance(file, str) and file.filename]
+    if not files:
+        return JSONResponse({"error": "No files uploaded"}, 400)
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        return JSONResponse({"error": f"At most {BATCH_UPLOAD_MAX_FILES} files per batch"}, 400)
+
+    user_data = user_data_from_form(form)
+
+    try:
+        prediction_service = container.get_async_prediction_service()
+        with metrics.profiler.profile():
+            results = await prediction_service.process_batch(files, user_data, client_ip(request))
+    except InferenceBusyError as e:
+        return busy(e)
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+    succeeded = announce_batch(notifier, user_data, results)
+    return JSONResponse({"count": len(results), "succeeded": succeeded, "results": results})
+
+
+async def predict_async(request: Request):
+    """Queue the upload and return a job id immediately (202)"""
+    form = await request.form()
+    file = form.get("file")
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "No file uploaded"}, 400)
+    if not file.filename:
+        return JSONResponse({"error": "Empty filename"}, 400)
+
+    callback_url = form.get("callbackUrl") or None
+    file_bytes = await file.read()
+    upload = SimpleNamespace(filename=file.filename, read=lambda: file_bytes)
+    submit = lambda: container.get_job_queue().submit(upload, user_data_from_form(form), client_ip(request), callback_url)
+    try:
+        # Spooling fsyncs the upload and the callback check resolves DNS; keep both off the event loop
+        job = await asyncio.get_running_loop().run_in_executor(None, submit)
+    except CallbackNotAllowedError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    except QueueFullError as e:
+        return JSONResponse({"error": str(e)}, 503, headers={"Retry-After": "30"})
+
+    logger.info(f"Queued prediction job {job['id']} for {form.get('fullName', 'Unknown')}")
+    return JSONResponse(job, 202, headers={"Location": f"/jobs/{job['id']}"})
+
+
+async def get_job(request: Request):
+    """Job status; ?wait=<seconds> long-polls until the job finishes"""
+    job_id = request.path_params["job_id"]
+    try:
+        wait = min(max(float(request.query_params.get("wait", 0)), 0.0), JOB_MAX_WAIT)
+    except ValueError:
+        wait = 0.0
+    job_queue = container.get_job_queue()
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, 404)
+    if wait > 0 and job["status"] in (QUEUED, RUNNING):
+        future = asyncio.get_running_loop().create_future()
+        _job_waiters.setdefault(job_id, []).append(future)
+        # The job may have finished between the first look and registering
+        job = job_queue.get(job_id)
+        if job is not None and job["status"] in (QUEUED, RUNNING):
+            try:
+                await asyncio.wait_for(future, wait)
+            except asyncio.TimeoutError:
+                pass
+        waiters = _job_waiters.get(job_id, [])
+        if future in waiters:
+            waiters.remove(future)
+        job = job_queue.get(job_id)
+        if job is None:
+            return JSONResponse({"error": "Job not found"}, 404)
+    return JSONResponse(job)
+
+
+async def outbreak_summary(request: Request):
+    """Pest reports per day/barangay/crop/class over a time window, from the rollup counters"""
+    try:
+        query = parse_summary_query(request.query_params, OUTBREAK_SUMMARY_DEFAULT_DAYS, OUTBREAK_SUMMARY_MAX_DAYS)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    summary = await container.get_async_repository().outbreak_summary(**query)
+    return JSONResponse({"from": query["start_day"], "to": query["end_day"], "basis": query["basis"],
+                         "group_by": query["group_by"], **summary})
+
+
+async def report_image(request: Request):
+    """Stream a report's image (or a cached ?size= thumbnail) from disk with ETag and Range support"""
+    thumbnailer = container.get_thumbnailer()
+    try:
+        size, image_format = thumbnailer.variant(request.query_params.get("size"), request.query_params.get("format"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+    image = await container.get_async_repository().get_image(request.path_params["report_id"])
+    if image is None:
+        return JSONResponse({"error": "Image not found"}, 404)
+    path, etag = image["path"], image["digest"]
+    if size:
+        etag = f"{etag}-w{size}.{image_format}"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}"}
+    if f'"{etag}"' in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if size:
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(None, thumbnailer.get, path, size, image_format)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, 422)
+        except FileNotFoundError:
+            path = None
+    if path is None or not os.path.isfile(path):
+        # The blob was released (or never written) after the report lookup
+        return JSONResponse({"error": "Image not found"}, 404)
+
+    # FileResponse answers Range with 206 and hands whole files to the server
+    # (http.response.pathsend) when it supports zero-copy sends
+    media_type = MIME_TYPES.get(image_format) or image["mimetype"] or "application/octet-stream"
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+async def similar_reports(request: Request):
+    """Nearest earlier reports by VGG19 features; ?approved=true keeps confirmed cases only"""
+    index = container.get_similarity_index()
+    if index is None:
+        return JSONResponse({"error": "Similarity search is disabled"}, 404)
+    try:
+        k = int(request.query_params.get("k", 10))
+    except ValueError:
+        k = 10
+    k = min(max(k, 1), SIMILARITY_MAX_K)
+    approved_only = request.query_params.get("approved", "false").lower() == "true"
+
+    report_id = request.path_params["report_id"]
+    repository = container.get_async_repository()
+    report = await repository.get_report(report_id, {"classificationId": 1})
+    if report is None:
+        return JSONResponse({"error": "Report not found"}, 404)
+    try:
+        # The matrix product releases the GIL; keep it off the event loop
+        neighbours = await asyncio.get_running_loop().run_in_executor(
+            None, index.similar, report.get("classificationId"), SIMILARITY_MAX_K if approved_only else k
+        )
+    except IndexNotReadyError as e:
+        return JSONResponse({"error": str(e)}, 503, headers={"Retry-After": "5"})
+    if neighbours is None:
+        return JSONResponse({"error": "No features stored for this report"}, 404)
+
+    reports = await repository.fetch_by_classification_ids([classification_id for classification_id, _ in neighbours])
+    results = describe_neighbours(neighbours, reports, SIMILARITY_DUPLICATE_THRESHOLD, approved_only)[:k]
+    return JSONResponse({"id": report_id, "k": k, "mode": index.mode, "results": results})
+
+
+async def approve(request: Request):
+    """Admin approval endpoint"""
+    filename, label = request.path_params["filename"], request.path_params["label"]
+    try:
+        [outcome] = container.get_review_file_mover().submit_reviewed(
+            await container.get_async_repository().review_many([{"filename": filename, "action": "approve", "label": label}])
+        )
+        if "error" in outcome:
+            return JSONResponse({"error": outcome["error"]}, 404 if outcome["error"] == "Report not found" else 400)
+        logger.info(f"File {filename} approved under class {label}")
+        return JSONResponse({"status": "approved", "file": filename, "class": label})
+    except Exception as e:
+        logger.error(f"Approval error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def review(request: Request):
+    """Apply many approve/reject decisions at once; images are filed in the background"""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    body = body if isinstance(body, dict) else {}
+    decisions = body.get("decisions")
+    if not isinstance(decisions, list) or not decisions:
+        return JSONResponse({"error": "decisions must be a non-empty list"}, 400)
+    if len(decisions) > REVIEW_MAX_ITEMS:
+        return JSONResponse({"error": f"At most {REVIEW_MAX_ITEMS} decisions per request"}, 400)
+    decisions = [decision if isinstance(decision, dict) else {} for decision in decisions]
+
+    try:
+        outcomes = await container.get_async_repository().review_many(decisions, body.get("reviewer"))
+    except Exception as e:
+        logger.error(f"Bulk review error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+    results = container.get_review_file_mover().submit_reviewed(outcomes)
+
+    applied = sum(1 for result in results if "error" not in result)
+    logger.info(f"Bulk review by {body.get('reviewer', 'unknown')}: {applied}/{len(results)} applied")
+    return JSONResponse({"count": len(results), "applied": applied, "results": results})
+
+
+async def not_found(request: Request, exc):
+    return JSONResponse({"error": "Endpoint not found"}, 404)
+
+
+async def internal_error(request: Request, exc):
+    return JSONResponse({"error": "Internal server error"}, 500)
+
+# -------------------------
+# App Setup
+# -------------------------
+routes = [
+    Route("/", health_check, methods=["GET"]),
+    Route("/ready", ready, methods=["GET"]),
+    Route("/metrics", prometheus_metrics, methods=["GET"]),
+    Route("/admin/profile", profile, methods=["GET", "POST", "DELETE"]),
+    Route("/admin/model", model_status, methods=["GET"]),
+    Route("/admin/model/reload", reload_model, methods=["POST"]),
+    Route("/stats", stats, methods=["GET"]),
+    Route("/predict", predict, methods=["POST"]),
+    Route("/predict/batch", predict_batch, methods=["POST"]),
+    Route("/predict/async", predict_async, methods=["POST"]),
+    Route("/jobs/{job_id}", get_job, methods=["GET"]),
+    Route("/reports/summary", outbreak_summary, methods=["GET"]),
+    Route("/reports/{report_id}/image", report_image, methods=["GET"]),
+    Route("/reports/{report_id}/similar", similar_reports, methods=["GET"]),
+    Route("/admin/approve/{filename}/{label}", approve, methods=["POST"]),
+    Route("/admin/review", review, methods=["POST"])
+]
+
+starlette_app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    exception_handlers={404: not_found, 500: internal_error},
+    middleware=[Middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://192.168.1.5:3000", "http://localhost:5173"],
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"]
+    )]
+)
+# Outermost, so rejected requests cost no routing or body parsing
+app = RequestLimitMiddleware(starlette_app, ASGI_MAX_CONCURRENCY)
+
+register_gauges(lambda: app.in_flight)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=ASGI_HOST, port=ASGI_PORT)
@@ -1,10 +1,14 @@
 import os
+from dotenv import load_dotenv
 
 # -------------------------
 # Paths
 # -------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Load .env before any setting below reads the environment
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 PENDING_FOLDER = os.path.join(UPLOAD_FOLDER, "pending")
 APPROVED_FOLDER = os.path.join(UPLOAD_FOLDER, "approved")
@@ -30,9 +34,202 @@ CLASS_INDICES = {
     3: "unknown"
 }
 
+# -------------------------
+# Inference batching
+# -------------------------
+# Concurrent /predict calls are stacked into one forward pass of up to
+# BATCH_MAX_SIZE images, waiting at most BATCH_MAX_WAIT_MS for stragglers.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# -------------------------
+# Inference backend
+# -------------------------
+# "fused": VGG19 + head as one traced graph (see src/inference/fused_backend.py)
+# "keras": original two-stage vgg19.predict → model.predict path
+# "tflite": quantized export of the fused graph (see src/inference/export_tflite.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fused").lower()
+QUANTIZED_MODEL_PATH = os.getenv("QUANTIZED_MODEL_PATH", os.path.join(BASE_DIR, "vgg", "harvest_model.int8.tflite"))
+# Worker processes for inference, each pinned to its own slice of the CPUs
+# (0 = run the model inside the web process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+# Only "tflite" workers share the weights (the model file is mapped); with
+# "fused"/"keras" every worker holds its own VGG19, so more than one worker
+# must be allowed explicitly
+INFERENCE_WORKERS_PRIVATE_WEIGHTS = os.getenv("INFERENCE_WORKERS_PRIVATE_WEIGHTS", "false").lower() == "true"
+# Hot reload: the served model file is checked every MODEL_RELOAD_POLL_SECONDS
+# (0 = only POST /admin/model/reload) and swapped in once it stops changing.
+# Deploy by writing the new file next to it and renaming it into place.
+MODEL_RELOAD_POLL_SECONDS = float(os.getenv("MODEL_RELOAD_POLL_SECONDS", "30"))
+
+# -------------------------
+# Prediction cache
+# -------------------------
+# Results are keyed by model version + SHA-256 of the upload, so resent
+# photos skip VGG19. Set PREDICTION_CACHE_DIR to add an on-disk tier.
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() == "true"
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR") or None
+
+# -------------------------
+# Feature store
+# -------------------------
+# Flattened VGG19 features of every report, kept as a float16 memmap so the
+# archive can be re-scored by a new head without re-running the CNN.
+# Set FEATURE_STORE_DIR to an empty value to disable.
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", os.path.join("storage", "features"))
+
+# -------------------------
+# Similar reports (GET /reports/<id>/similar)
+# -------------------------
+# Cosine k-NN over the feature store, held in memory as float16. Exact by
+# default; SIMILARITY_PCA_DIM > 0 projects onto that many principal
+# components and SIMILARITY_IVF_LISTS > 0 only scans the SIMILARITY_IVF_PROBE
+# closest clusters (approximate, for large archives). Neighbours at or above
+# SIMILARITY_DUPLICATE_THRESHOLD are flagged as near-duplicates.
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_PCA_DIM = int(os.getenv("SIMILARITY_PCA_DIM", "0"))
+SIMILARITY_IVF_LISTS = int(os.getenv("SIMILARITY_IVF_LISTS", "0"))
+SIMILARITY_IVF_PROBE = int(os.getenv("SIMILARITY_IVF_PROBE", "8"))
+SIMILARITY_MAX_K = int(os.getenv("SIMILARITY_MAX_K", "50"))
+SIMILARITY_DUPLICATE_THRESHOLD = float(os.getenv("SIMILARITY_DUPLICATE_THRESHOLD", "0.98"))
+
+# -------------------------
+# Location lookup
+# -------------------------
+# Geocoder results are cached per client IP and refreshed in the background
+# once older than LOCATION_CACHE_TTL seconds
+LOCATION_CACHE_TTL = float(os.getenv("LOCATION_CACHE_TTL", str(6 * 3600)))
+GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", "1.5"))
+GEOCODER_BUDGET = float(os.getenv("GEOCODER_BUDGET", "3"))
+# X-Forwarded-For is only honoured for requests from these proxies (IPs or
+# CIDRs, comma-separated); empty means the socket peer is the client
+TRUSTED_PROXIES = [spec.strip() for spec in os.getenv("TRUSTED_PROXIES", "").split(",") if spec.strip()]
+
+# -------------------------
+# Image storage
+# -------------------------
+# Content-addressed image blobs, sharded as <dir>/ab/cd/<sha256>.<ext>
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join("storage", "blobs"))
+
+# -------------------------
+# Report persistence
+# -------------------------
+# "sync": insert_one per /predict; "write_behind": queue reports and flush
+# them with insert_many every WRITE_BEHIND_BATCH_SIZE docs / FLUSH_MS
+REPOSITORY_MODE = os.getenv("REPOSITORY_MODE", "sync").lower()
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_JOURNAL = os.getenv("WRITE_BEHIND_JOURNAL", os.path.join("storage", "write_behind.journal"))
+
+# -------------------------
+# Async prediction jobs
+# -------------------------
+# POST /predict/async spools uploads here and JOB_WORKERS threads process them.
+# At most JOB_MAX_PENDING jobs wait; finished jobs are kept JOB_RETENTION_SECONDS
+# (up to JOB_MAX_RETAINED) for GET /jobs/<id>, which long-polls up to JOB_MAX_WAIT.
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join("storage", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "10000"))
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "5"))
+# callbackUrl is only accepted for these hosts ("*" = any host); empty disables
+# callbacks. Hosts resolving to private, loopback or link-local addresses are
+# always refused. JOB_CALLBACK_WORKERS threads deliver them, apart from the job workers.
+JOB_CALLBACK_HOSTS = [host.strip().lower() for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()]
+JOB_CALLBACK_WORKERS = int(os.getenv("JOB_CALLBACK_WORKERS", "2"))
+
+# -------------------------
+# Logging
+# -------------------------
+# "json": one JSON object per line in the log file; "text": the classic format.
+# Records beyond LOG_QUEUE_SIZE waiting are dropped rather than blocking a request.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# -------------------------
+# Admin notifications
+# -------------------------
+# Events are grouped by NOTIFY_GROUP_BY ("barangay" or "prediction") and sent
+# as one digest per group every NOTIFY_DIGEST_SECONDS, at most
+# NOTIFY_MAX_PER_MINUTE digests per sink. NOTIFY_SINKS: log, file, webhook.
+NOTIFY_SINKS = [name.strip() for name in os.getenv("NOTIFY_SINKS", "log").split(",") if name.strip()]
+NOTIFY_GROUP_BY = os.getenv("NOTIFY_GROUP_BY", "barangay")
+NOTIFY_DIGEST_SECONDS = float(os.getenv("NOTIFY_DIGEST_SECONDS", "60"))
+NOTIFY_MAX_PER_MINUTE = int(os.getenv("NOTIFY_MAX_PER_MINUTE", "6"))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+NOTIFY_FILE = os.getenv("NOTIFY_FILE", os.path.join("storage", "notifications.jsonl"))
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL")
+
+# -------------------------
+# Image serving (GET /reports/<id>/image)
+# -------------------------
+# Thumbnails are generated once (at ingest for THUMBNAIL_DEFAULT_SIZE when
+# THUMBNAIL_AT_INGEST, otherwise on first request) and cached next to the
+# blob. Only THUMBNAIL_SIZES (longest edge in px) may be requested.
+THUMBNAIL_SIZES = [int(size) for size in os.getenv("THUMBNAIL_SIZES", "128,256,512").split(",") if size.strip()]
+THUMBNAIL_DEFAULT_SIZE = int(os.getenv("THUMBNAIL_DEFAULT_SIZE", "256"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_AT_INGEST = os.getenv("THUMBNAIL_AT_INGEST", "true").lower() == "true"
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(24 * 3600)))
+
+# -------------------------
+# Outbreak summary (GET /reports/summary)
+# -------------------------
+# Served from per day/barangay/crop/class counters; windows default to the
+# last OUTBREAK_SUMMARY_DEFAULT_DAYS days and may span at most MAX_DAYS
+OUTBREAK_SUMMARY_DEFAULT_DAYS = int(os.getenv("OUTBREAK_SUMMARY_DEFAULT_DAYS", "30"))
+OUTBREAK_SUMMARY_MAX_DAYS = int(os.getenv("OUTBREAK_SUMMARY_MAX_DAYS", "366"))
+
+# -------------------------
+# Admin review (POST /admin/review)
+# -------------------------
+# Decisions per request, and the background workers that link reviewed
+# images into APPROVED_FOLDER/<label> or REJECTED_FOLDER (failed links are
+# retried REVIEW_MOVE_RETRIES times, backing off from REVIEW_MOVE_RETRY_DELAY s)
+REVIEW_MAX_ITEMS = int(os.getenv("REVIEW_MAX_ITEMS", "5000"))
+REVIEW_MOVE_WORKERS = int(os.getenv("REVIEW_MOVE_WORKERS", "2"))
+REVIEW_MOVE_RETRIES = int(os.getenv("REVIEW_MOVE_RETRIES", "5"))
+REVIEW_MOVE_RETRY_DELAY = float(os.getenv("REVIEW_MOVE_RETRY_DELAY", "1"))
+
+# -------------------------
+# ASGI serving mode (python -m src.asgi_app)
+# -------------------------
+# At most ASGI_MAX_CONCURRENCY requests are served at once (503 beyond that).
+# Decode + inference run on ASGI_INFERENCE_THREADS threads; once
+# ASGI_MAX_PENDING_INFERENCE calls are waiting, uploads get 503 + Retry-After.
+ASGI_HOST = os.getenv("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.getenv("ASGI_PORT", "5001"))
+ASGI_MAX_CONCURRENCY = int(os.getenv("ASGI_MAX_CONCURRENCY", "1000"))
+ASGI_INFERENCE_THREADS = int(os.getenv("ASGI_INFERENCE_THREADS", "32"))
+ASGI_MAX_PENDING_INFERENCE = int(os.getenv("ASGI_MAX_PENDING_INFERENCE", "256"))
+
 # Allowed file types
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
 
+# -------------------------
+# Uploads
+# -------------------------
+# Larger request bodies are rejected with 413 before they are buffered
+MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(16 * 1024 * 1024)))
+
+# POST /predict/batch: files per request, its own body limit, and the threads
+# that decode a batch in parallel (OpenCV releases the GIL while decoding)
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "100"))
+BATCH_UPLOAD_MAX_CONTENT_LENGTH = int(os.getenv("BATCH_UPLOAD_MAX_CONTENT_LENGTH", str(256 * 1024 * 1024)))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Decode large JPEGs at 1/2, 1/4 or 1/8 scale when that still covers IMAGE_SIZE.
+# Pixels differ slightly from a full decode; check prediction parity with
+# python -m benchmarks.parity_decode before turning it on
+FAST_DECODE_ENABLED = os.getenv("FAST_DECODE_ENABLED", "false").lower() == "true"
+
 # Ensure folders exist
 for folder in [UPLOAD_FOLDER, PENDING_FOLDER, APPROVED_FOLDER, REJECTED_FOLDER]:
     os.makedirs(folder, exist_ok=True)
@@ -1,28 +1,143 @@
 # dependency_container.py - Dependency Injection Container
 import os
+from concurrent.futures import ThreadPoolExecutor
 from .services.prediction_service import PredictionService
+from .services.job_queue import JobQueue
 from .services.location_service import LocationService
 from .services.file_manager import FileManager
+from .services.review_file_mover import ReviewFileMover
+from .services.thumbnailer import Thumbnailer
+from .services.similarity_index import SimilarityIndex
+from .services.prediction_cache import PredictionCache
 from .repositories.mongo_repository import MongoRepository
-from .predict import predict_image  # Your existing prediction function
+from .repositories.write_behind_repository import WriteBehindRepository
+from .repositories.feature_store import FeatureStore
+from .repositories.blob_store import BlobStore
+from .inference.batch_scheduler import BatchScheduler
+from .inference.backends import create_backend, model_path_for
+from .inference.worker_pool import InferenceWorkerPool
+from .inference.model_loader import ModelLoader
+from .predict import load_image, decode_image, build_result  # Your existing prediction functions
 from .interfaces import IPredictor
-from .config import PENDING_FOLDER
+from .metrics import metrics
+from .config import (
+    PENDING_FOLDER, APPROVED_FOLDER, REJECTED_FOLDER, CLASS_NAMES,
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, INFERENCE_BACKEND, INFERENCE_WORKERS, INFERENCE_WORKERS_PRIVATE_WEIGHTS,
+    MODEL_RELOAD_POLL_SECONDS,
+    PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DIR,
+    FEATURE_STORE_DIR, SIMILARITY_ENABLED, SIMILARITY_PCA_DIM, SIMILARITY_IVF_LISTS, SIMILARITY_IVF_PROBE,
+    BLOB_STORE_DIR, LOCATION_CACHE_TTL, GEOCODER_TIMEOUT, GEOCODER_BUDGET,
+    REPOSITORY_MODE, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_MS, WRITE_BEHIND_MAX_QUEUE, WRITE_BEHIND_JOURNAL,
+    DECODE_WORKERS, THUMBNAIL_SIZES, THUMBNAIL_DEFAULT_SIZE, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY, THUMBNAIL_AT_INGEST,
+    REVIEW_MOVE_WORKERS, REVIEW_MOVE_RETRIES, REVIEW_MOVE_RETRY_DELAY,
+    ASGI_INFERENCE_THREADS, ASGI_MAX_PENDING_INFERENCE, JOB_SPOOL_DIR, JOB_WORKERS, JOB_MAX_PENDING, JOB_RETENTION_SECONDS, JOB_MAX_RETAINED, JOB_CALLBACK_TIMEOUT,
+    JOB_CALLBACK_HOSTS, JOB_CALLBACK_WORKERS
+)
 
 class PredictorAdapter(IPredictor):
-    """Adapter to make existing predict_image function conform to interface"""
+    """Adapter to make existing prediction functions conform to interface.
+
+    Decoding happens on the caller's thread; the forward pass goes through
+    the shared BatchScheduler so concurrent requests share one model call.
+    ``predict_many`` decodes on a thread pool and queues every image at
+    once, so the scheduler stacks them into full batches. Each result
+    carries the ``model_version`` of the model that scored it.
+    """
+    
+    def __init__(self, scheduler: BatchScheduler, loader: ModelLoader,
+                 decode_workers: int = DECODE_WORKERS):
+        self.scheduler = scheduler
+        self.loader = loader
+        self._decoders = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="decode")
+    
+    def _predict_image(self, load, filename: str):
+        try:
+            with metrics.timer("decode"):
+                image = load()
+            # Queue wait + the shared batch forward pass
+            with metrics.timer("inference"):
+                features, preds, version = self.scheduler.predict(image)
+            result = build_result(filename, preds)
+            result["model_version"] = version
+            result["features"] = features  # consumed by the feature store, not returned to clients
+            return result
+        except Exception as e:
+            raise Exception(f"Prediction failed: {str(e)}")
+    
+    @staticmethod
+    def _timed_decode(file_bytes: bytes):
+        with metrics.timer("decode"):
+            return decode_image(file_bytes)
     
     def predict(self, image_path: str):
-        return predict_image(image_path)
+        return self._predict_image(lambda: load_image(image_path), os.path.basename(image_path))
+    
+    def predict_bytes(self, file_bytes: bytes, filename: str):
+        return self._predict_image(lambda: decode_image(file_bytes), filename)
+    
+    def predict_many(self, items):
+        decoded = [self._decoders.submit(self._timed_decode, file_bytes) for file_bytes, _ in items]
+        
+        # Queue every decoded image before waiting on any of them
+        pending = []
+        for future in decoded:
+            try:
+                pending.append(self.scheduler.submit(future.result()))
+            except Exception as e:
+                pending.append(e)
+        
+        results = []
+        for (_, filename), outputs in zip(items, pending):
+            try:
+                if isinstance(outputs, Exception):
+                    raise outputs
+                features, preds, version = outputs.result()
+                result = build_result(filename, preds)
+                result["model_version"] = version
+                result["features"] = features
+                results.append(result)
+            except Exception as e:
+                results.append(Exception(f"Prediction failed: {str(e)}"))
+        return results
+    
+    @property
+    def model_version(self) -> str:
+        """Version serving right now (results may still name the previous one mid-swap)"""
+        return self.loader.version
+    
+    def stats(self):
+        return self.scheduler.stats()
 
 class DependencyContainer:
     """Container for dependency injection"""
     
     def __init__(self):
         self._instances = {}
+        self._async_io = False
+    
+    def register(self, name: str, instance):
+        """Provide an instance up front instead of building it (benchmarks, custom wiring)"""
+        self._instances[name] = instance
+    
+    def created(self, name: str):
+        """An already-built instance, or None (never constructs one)"""
+        return self._instances.get(name)
+    
+    def enable_async_io(self):
+        """Build event-loop clients (geocoder, Mongo) for the ASGI app; call before any get_*"""
+        self._async_io = True
     
     def get_location_service(self):
         if 'location_service' not in self._instances:
-            self._instances['location_service'] = LocationService()
+            service_class = LocationService
+            if self._async_io:
+                from .services.async_location_service import AsyncLocationService
+                service_class = AsyncLocationService
+            self._instances['location_service'] = service_class(
+                ttl_seconds=LOCATION_CACHE_TTL,
+                provider_timeout=GEOCODER_TIMEOUT,
+                budget_seconds=GEOCODER_BUDGET
+            )
         return self._instances['location_service']
     
     def get_file_manager(self):
@@ -30,26 +145,143 @@ class DependencyContainer:
             self._instances['file_manager'] = FileManager(PENDING_FOLDER)
         return self._instances['file_manager']
     
+    def get_review_file_mover(self):
+        if 'review_file_mover' not in self._instances:
+            self._instances['review_file_mover'] = ReviewFileMover(
+                self.get_file_manager(), APPROVED_FOLDER, REJECTED_FOLDER, CLASS_NAMES,
+                REVIEW_MOVE_WORKERS, REVIEW_MOVE_RETRIES, REVIEW_MOVE_RETRY_DELAY
+            )
+        return self._instances['review_file_mover']
+    
+    def get_feature_store(self):
+        if 'feature_store' not in self._instances:
+            self._instances['feature_store'] = FeatureStore(FEATURE_STORE_DIR) if FEATURE_STORE_DIR else None
+        return self._instances['feature_store']
+    
+    def get_similarity_index(self):
+        """k-NN index over the feature store, or None when either is disabled"""
+        if 'similarity_index' not in self._instances:
+            feature_store = self.get_feature_store()
+            index = None
+            if SIMILARITY_ENABLED and feature_store is not None:
+                index = SimilarityIndex(feature_store, SIMILARITY_PCA_DIM, SIMILARITY_IVF_LISTS, SIMILARITY_IVF_PROBE)
+            self._instances['similarity_index'] = index
+        return self._instances['similarity_index']
+    
+    def get_blob_store(self):
+        if 'blob_store' not in self._instances:
+            self._instances['blob_store'] = BlobStore(BLOB_STORE_DIR)
+        return self._instances['blob_store']
+    
+    def get_thumbnailer(self):
+        if 'thumbnailer' not in self._instances:
+            self._instances['thumbnailer'] = Thumbnailer(
+                self.get_blob_store(), THUMBNAIL_SIZES, THUMBNAIL_DEFAULT_SIZE, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY
+            )
+        return self._instances['thumbnailer']
+    
     def get_repository(self):
         if 'repository' not in self._instances:
             mongo_uri = os.getenv("MONGO_URI")
             db_name = os.getenv("DB_NAME")
             location_service = self.get_location_service()
-            self._instances['repository'] = MongoRepository(mongo_uri, db_name, location_service)
+            feature_store = self.get_feature_store()
+            blob_store = self.get_blob_store()
+            thumbnailer = self.get_thumbnailer() if THUMBNAIL_AT_INGEST else None
+            if REPOSITORY_MODE == "write_behind":
+                repository = WriteBehindRepository(
+                    mongo_uri, db_name, location_service, feature_store, blob_store, thumbnailer,
+                    max_queue=WRITE_BEHIND_MAX_QUEUE,
+                    batch_size=WRITE_BEHIND_BATCH_SIZE,
+                    flush_interval=WRITE_BEHIND_FLUSH_MS / 1000.0,
+                    journal_path=WRITE_BEHIND_JOURNAL or None
+                )
+            elif REPOSITORY_MODE == "sync":
+                repository = MongoRepository(mongo_uri, db_name, location_service, feature_store, blob_store, thumbnailer)
+            else:
+                raise ValueError(f"Unknown REPOSITORY_MODE: {REPOSITORY_MODE}")
+            self._instances['repository'] = repository
         return self._instances['repository']
     
+    def _build_inference_backend(self):
+        """Construct the configured backend (imports TensorFlow; slow)"""
+        if INFERENCE_WORKERS > 0:
+            # Models live in worker processes; this process never imports TensorFlow
+            return InferenceWorkerPool(INFERENCE_WORKERS, INFERENCE_BACKEND, BATCH_MAX_SIZE,
+                                       private_weights=INFERENCE_WORKERS_PRIVATE_WEIGHTS)
+        return create_backend(INFERENCE_BACKEND, BATCH_MAX_SIZE)
+    
+    def get_model_loader(self):
+        if 'model_loader' not in self._instances:
+            self._instances['model_loader'] = ModelLoader(
+                self._build_inference_backend, model_path_for(INFERENCE_BACKEND), MODEL_RELOAD_POLL_SECONDS
+            )
+        return self._instances['model_loader']
+    
+    def get_inference_backend(self):
+        """Warm backend; blocks until the background load has finished"""
+        return self.get_model_loader().wait()
+    
+    def get_batch_scheduler(self):
+        if 'batch_scheduler' not in self._instances:
+            # Resolved per batch, so a hot-reloaded model takes over at the next batch
+            predict_batch = lambda images: self.get_model_loader().predict_batch(images)
+            # One dispatcher per worker process keeps every worker busy
+            self._instances['batch_scheduler'] = BatchScheduler(
+                predict_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, concurrency=max(1, INFERENCE_WORKERS)
+            )
+        return self._instances['batch_scheduler']
+    
     def get_predictor(self):
         if 'predictor' not in self._instances:
-            self._instances['predictor'] = PredictorAdapter()
+            self._instances['predictor'] = PredictorAdapter(self.get_batch_scheduler(), self.get_model_loader())
         return self._instances['predictor']
     
+    def get_prediction_cache(self):
+        if 'prediction_cache' not in self._instances:
+            cache = None
+            if PREDICTION_CACHE_ENABLED:
+                cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DIR)
+            self._instances['prediction_cache'] = cache
+        return self._instances['prediction_cache']
+    
     def get_prediction_service(self):
         if 'prediction_service' not in self._instances:
             predictor = self.get_predictor()
-            file_manager = self.get_file_manager()
             repository = self.get_repository()
-            self._instances['prediction_service'] = PredictionService(predictor, file_manager, repository)
+            cache = self.get_prediction_cache()
+            self._instances['prediction_service'] = PredictionService(predictor, repository, cache)
         return self._instances['prediction_service']
+    
+    def get_async_repository(self):
+        if 'async_repository' not in self._instances:
+            from .repositories.async_mongo_repository import AsyncMongoRepository
+            self._instances['async_repository'] = AsyncMongoRepository(
+                self.get_repository(), os.getenv("MONGO_URI"), os.getenv("DB_NAME")
+            )
+        return self._instances['async_repository']
+    
+    def get_async_prediction_service(self):
+        if 'async_prediction_service' not in self._instances:
+            from .services.async_prediction_service import AsyncPredictionService
+            self._instances['async_prediction_service'] = AsyncPredictionService(
+                self.get_predictor(), self.get_repository(), self.get_async_repository(),
+                self.get_prediction_cache(), ASGI_INFERENCE_THREADS, ASGI_MAX_PENDING_INFERENCE
+            )
+        return self._instances['async_prediction_service']
+    
+    def get_job_queue(self):
+        if 'job_queue' not in self._instances:
+            # Resolve the service per job so creating the queue does not connect to Mongo
+            process = lambda upload, user_data, client_ip: self.get_prediction_service().process_prediction(
+                upload, user_data, client_ip
+            )
+            self._instances['job_queue'] = JobQueue(
+                process, JOB_SPOOL_DIR, JOB_WORKERS, JOB_MAX_PENDING,
+                JOB_RETENTION_SECONDS, JOB_MAX_RETAINED, JOB_CALLBACK_TIMEOUT,
+                JOB_CALLBACK_HOSTS, JOB_CALLBACK_WORKERS
+            )
+        return self._instances['job_queue']
 
 # Global container instance
 container = DependencyContainer()
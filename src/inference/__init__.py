@@ -0,0 +1 @@
+# Inference module
@@ -0,0 +1,28 @@
+# backends.py - Factory: build the configured inference backend by name
+from ..interfaces import IInferenceBackend
+from ..config import MODEL_PATH, QUANTIZED_MODEL_PATH
+
+
+def model_path_for(kind: str) -> str:
+    """The model file a backend kind serves (what versions and reloads track)"""
+    return QUANTIZED_MODEL_PATH if kind == "tflite" else MODEL_PATH
+
+
+def create_backend(kind: str, max_batch_size: int = 16, num_threads: int = None) -> IInferenceBackend:
+    """Construct a backend from the model file currently on disk.
+
+    Imports TensorFlow, so call it off the request path. VGG19 is loaded
+    once per process; each call loads a fresh head, so calling it again
+    after a deploy picks up the new model.
+    """
+    if kind == "fused":
+        from .fused_backend import FusedBackend
+        from ..predict import load_feature_extractor, load_head
+        return FusedBackend(load_feature_extractor(), load_head(MODEL_PATH), max_batch_size=max_batch_size)
+    if kind == "keras":
+        from .keras_backend import KerasBackend
+        return KerasBackend(MODEL_PATH)
+    if kind == "tflite":
+        from .quantized_backend import QuantizedBackend
+        return QuantizedBackend(QUANTIZED_MODEL_PATH, num_threads=num_threads, max_batch_size=max_batch_size)
+    raise ValueError(f"Unknown INFERENCE_BACKEND: {kind}")
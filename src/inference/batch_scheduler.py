@@ -0,0 +1,147 @@
+# batch_scheduler.py - Single Responsibility: Coalesce concurrent inference calls
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import Callable, Dict, Any
+import numpy as np
+from ..metrics import metrics
+
+
+class BatchScheduler:
+    """Collects concurrent single-image requests into one stacked model call.
+
+    Callers block on ``predict`` while a background worker waits up to
+    ``max_wait_ms`` for more requests (or until ``max_batch_size`` is
+    reached), runs ``batch_fn`` once on the stacked batch and hands each
+    caller back its own row of every output array. If the batch fails, each
+    request is retried on its own so an error only reaches its own caller.
+    With ``concurrency`` > 1 that many batches may be in flight at once (one
+    per inference worker).
+    """
+
+    def __init__(self, batch_fn: Callable, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 concurrency: int = 1):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._queue: Queue = Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "errors": 0,
+            "max_batch_size_seen": 0,
+            "batch_size_histogram": {},
+            "total_batch_seconds": 0.0,
+            "last_batch_ms": 0.0
+        }
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.concurrency:
+                worker = threading.Thread(
+                    target=self._run, name=f"batch-scheduler-{len(self._workers)}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout: float = None):
+        """Stop the workers after the queued requests are served"""
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Queue one (H, W, 3) image and return a future for its outputs"""
+        self.start()
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def predict(self, image: np.ndarray):
+        """Blocking helper around submit()"""
+        return self.submit(image).result()
+
+    def _collect(self):
+        """Block for the first request, then gather more until size or time limit"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if item is None:
+                # Re-queue the stop signal so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        try:
+            outputs = self.batch_fn(np.stack([image for image, _ in batch]))
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad image (wrong shape, unreadable values) must not fail
+                # the requests it happened to be batched with: run each alone
+                for item in batch:
+                    self._process([item])
+                return
+            with self._lock:
+                self._stats["errors"] += 1
+            batch[0][1].set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+        metrics.observe("batch_forward", elapsed)
+
+        for i, (_, future) in enumerate(batch):
+            if isinstance(outputs, tuple):
+                future.set_result(tuple(output[i] for output in outputs))
+            else:
+                future.set_result(outputs[i])
+
+        size = len(batch)
+        with self._lock:
+            self._stats["requests"] += size
+            self._stats["batches"] += 1
+            self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], size)
+            histogram = self._stats["batch_size_histogram"]
+            histogram[size] = histogram.get(size, 0) + 1
+            self._stats["total_batch_seconds"] += elapsed
+            self._stats["last_batch_ms"] = elapsed * 1000.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size counters for tuning"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_size_histogram"] = dict(stats["batch_size_histogram"])
+        batches = stats["batches"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = stats["requests"] / batches if batches else 0.0
+        stats["avg_batch_ms"] = stats.pop("total_batch_seconds") * 1000.0 / batches if batches else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000.0
+        stats["concurrency"] = self.concurrency
+        return stats
@@ -0,0 +1,281 @@
+# batch_score.py - Stream an image archive through the model and write results incrementally
+"""
+Usage:
+    python -m src.inference.batch_score --input uploads --output scores.jsonl
+    python -m src.inference.batch_score --input archive/ --recursive --format parquet --output scores/
+    python -m src.inference.batch_score --input uploads --output scores.jsonl --review   # old predict.py behaviour
+
+The pipeline is a chain of generators: a lazy ``os.scandir`` walk feeds a
+thread pool that reads and decodes a bounded number of images ahead, those
+are grouped into batches for the backend, and each scored batch is appended
+to the output. Paths are recorded in a checkpoint file once their results are
+durable, so an interrupted run started again with the same arguments skips
+everything already scored.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Iterable, List, Tuple, Set
+import numpy as np
+from ..config import (
+    UPLOAD_FOLDER, ALLOWED_EXTENSIONS, CLASS_NAMES, INFERENCE_BACKEND, MODEL_PATH, QUANTIZED_MODEL_PATH
+)
+from ..predict import load_image, build_result, TO_REVIEW_DIR
+from ..services.file_manager import link_or_copy
+from .backends import create_backend
+from .versioning import model_version
+
+logger = logging.getLogger("BatchScore")
+
+
+def scan_images(root: str, recursive: bool = False) -> Iterator[str]:
+    """Yield image paths below ``root`` lazily, without listing whole directories"""
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.name.rsplit(".", 1)[-1].lower() in ALLOWED_EXTENSIONS:
+                    yield entry.path
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Paths already scored by earlier runs"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def decode_ahead(paths: Iterable[str], pool: ThreadPoolExecutor, prefetch: int) -> Iterator[Tuple[str, object]]:
+    """Decode on the pool, at most ``prefetch`` images ahead; yields (path, image or Exception) in order"""
+    in_flight = deque()
+    for path in paths:
+        in_flight.append((path, pool.submit(load_image, path)))
+        if len(in_flight) >= prefetch:
+            yield _resolve(*in_flight.popleft())
+    while in_flight:
+        yield _resolve(*in_flight.popleft())
+
+
+def _resolve(path: str, future) -> Tuple[str, object]:
+    try:
+        return path, future.result()
+    except Exception as e:
+        return path, e
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batches(batches: Iterable[List[Tuple[str, object]]], backend, root: str, version: str) -> Iterator[List[dict]]:
+    """Run each batch's decodable images through the backend; yields one row per path"""
+    for batch in batches:
+        images = [image for _, image in batch if not isinstance(image, Exception)]
+        preds = backend.predict_batch(np.stack(images))[1] if images else []
+        rows, row = [], 0
+        for path, image in batch:
+            relative = os.path.relpath(path, root)
+            if isinstance(image, Exception):
+                rows.append({"path": relative, "error": str(image), "model_version": version})
+                continue
+            result = build_result(os.path.basename(path), preds[row])
+            row += 1
+            rows.append({
+                "path": relative,
+                "prediction": result["prediction"],
+                "confidence": result["confidence"],
+                "probabilities": result["probabilities"],
+                "model_version": version,
+                "timestamp": result["timestamp"]
+            })
+        yield rows
+
+
+class JsonlSink:
+    """Appends one JSON object per line; every batch is durable once written"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def write(self, rows: List[dict]) -> List[dict]:
+        for row in rows:
+            self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return rows
+
+    def close(self) -> List[dict]:
+        self.file.close()
+        return []
+
+
+class ParquetSink:
+    """Writes part files into a directory, one row group per batch.
+
+    A Parquet file is only readable once closed, so rows count as durable
+    (and reach the checkpoint) when their part file is finished.
+    """
+
+    def __init__(self, directory: str, rows_per_file: int = 50000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.run_id = time.strftime("%Y%m%d-%H%M%S")
+        self.parts = 0
+        self.writer = None
+        self.pending: List[dict] = []
+        self.schema = self._schema()
+        os.makedirs(directory, exist_ok=True)
+
+    def _schema(self):
+        pa = self.pa
+        fields = [("path", pa.string()), ("prediction", pa.string()), ("confidence", pa.float64())]
+        fields += [(f"prob_{name}", pa.float64()) for name in CLASS_NAMES]
+        fields += [("model_version", pa.string()), ("timestamp", pa.string()), ("error", pa.string())]
+        return pa.schema(fields)
+
+    def _table(self, rows: List[dict]):
+        columns = {field.name: [] for field in self.schema}
+        for row in rows:
+            probabilities = row.get("probabilities") or {}
+            for name in columns:
+                if name.startswith("prob_"):
+                    columns[name].append(probabilities.get(name[len("prob_"):]))
+                else:
+                    columns[name].append(row.get(name))
+        return self.pa.table(columns, schema=self.schema)
+
+    def write(self, rows: List[dict]) -> List[dict]:
+        if self.writer is None:
+            path = os.path.join(self.directory, f"part-{self.run_id}-{self.parts:05d}.parquet")
+            self.writer = self.pq.ParquetWriter(path, self.schema)
+            self.parts += 1
+        self.writer.write_table(self._table(rows))
+        self.pending += rows
+        if len(self.pending) >= self.rows_per_file:
+            return self.close_part()
+        return []
+
+    def close_part(self) -> List[dict]:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        committed, self.pending = self.pending, []
+        return committed
+
+    def close(self) -> List[dict]:
+        return self.close_part()
+
+
+def link_for_review(root: str, rows: List[dict]):
+    """Link scored images and their metadata into storage/to_review (old __main__ behaviour)"""
+    for row in rows:
+        if "error" in row:
+            continue
+        base_name = os.path.splitext(os.path.basename(row["path"]))[0]
+        link_or_copy(os.path.join(root, row["path"]), os.path.join(TO_REVIEW_DIR, f"{base_name}.png"))
+        with open(os.path.join(TO_REVIEW_DIR, f"{base_name}.json"), "w") as f:
+            json.dump(row, f)
+
+
+def run(args) -> dict:
+    output = args.output or ("scores" if args.format == "parquet" else "scores.jsonl")
+    checkpoint = args.checkpoint or f"{output.rstrip(os.sep)}.checkpoint"
+    done = load_checkpoint(checkpoint)
+    if done:
+        logger.info(f"Resuming: {len(done)} images already scored")
+
+    backend = create_backend(args.backend, args.batch_size)
+    backend.warm_up()
+    version = model_version(QUANTIZED_MODEL_PATH if args.backend == "tflite" else MODEL_PATH)
+
+    paths = (path for path in scan_images(args.input, args.recursive)
+             if os.path.relpath(path, args.input) not in done)
+    sink = ParquetSink(output, args.rows_per_file) if args.format == "parquet" else JsonlSink(output)
+
+    scored = errors = 0
+    started = time.perf_counter()
+    last_report = started
+    with ThreadPoolExecutor(max_workers=args.decode_workers, thread_name_prefix="decode") as pool, \
+            open(checkpoint, "a") as checkpoint_file:
+
+        def commit(rows: List[dict]):
+            if not rows:
+                return
+            checkpoint_file.write("".join(f"{row['path']}\n" for row in rows))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+        try:
+            decoded = decode_ahead(paths, pool, args.prefetch)
+            for rows in score_batches(batched(decoded, args.batch_size), backend, args.input, version):
+                commit(sink.write(rows))
+                if args.review:
+                    link_for_review(args.input, rows)
+                scored += len(rows)
+                errors += sum(1 for row in rows if "error" in row)
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    logger.info(f"{scored} images, {scored / (now - started):.1f} img/s, {errors} errors")
+                    last_report = now
+        finally:
+            commit(sink.close())
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "scored": scored,
+        "errors": errors,
+        "skipped": len(done),
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(scored / elapsed, 2) if elapsed else 0.0,
+        "output": output,
+        "checkpoint": checkpoint
+    }
+    logger.info(f"Done: {summary}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a folder of images in batches, resumably")
+    parser.add_argument("--input", default=UPLOAD_FOLDER, help="Image folder (default: UPLOAD_FOLDER)")
+    parser.add_argument("--recursive", action="store_true", help="Descend into subfolders")
+    parser.add_argument("--output", help="JSONL file or Parquet directory (default: scores.jsonl / scores/)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--backend", choices=["fused", "keras", "tflite"], default=INFERENCE_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--decode-workers", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--prefetch", type=int, default=128, help="Images decoded ahead of inference")
+    parser.add_argument("--rows-per-file", type=int, default=50000, help="Rows per Parquet part file")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--review", action="store_true", help="Also link images into storage/to_review")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    summary = run(args)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
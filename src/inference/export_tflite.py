@@ -0,0 +1,86 @@
+# export_tflite.py - Export the fused VGG19 + head to a quantized TFLite model
+"""
+Usage:
+    python -m src.inference.export_tflite --quantize int8 --calibration-dir uploads/approved
+    python -m src.inference.export_tflite --quantize float16 --output vgg/harvest_model.fp16.tflite
+
+int8     full-integer weights and activations, calibrated on real photos
+dynamic  int8 weights, float activations (no calibration needed)
+float16  float16 weights (half the size, near-lossless)
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import keras
+import numpy as np
+import tensorflow as tf
+from ..config import APPROVED_FOLDER, ALLOWED_EXTENSIONS, QUANTIZED_MODEL_PATH
+from ..predict import load_models, load_image
+from .fused_backend import FusedBackend
+
+
+def calibration_images(directory: str, limit: int):
+    """Random sample of image paths below `directory`"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths += [
+            os.path.join(root, name) for name in files
+            if name.rsplit(".", 1)[-1].lower() in ALLOWED_EXTENSIONS
+        ]
+    random.Random(0).shuffle(paths)
+    return paths[:limit]
+
+
+def export(output: str, quantize: str, calibration_dir: str, calibration_size: int):
+    vgg19, model = load_models()
+    fused = FusedBackend(vgg19, model)
+    spec = tf.TensorSpec((None,) + fused.input_shape, tf.float32)
+
+    # Go through a Keras export archive: converting the tf.function directly
+    # fails on Keras 3 variable reads
+    archive = keras.export.ExportArchive()
+    archive.track(fused.model)
+    archive.add_endpoint("serve", fused._forward, input_signature=[spec])
+    saved_model_dir = tempfile.mkdtemp(prefix="harvest_export_")
+    archive.write_out(saved_model_dir)
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    if quantize in ("int8", "dynamic", "float16"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    if quantize == "int8":
+        paths = calibration_images(calibration_dir, calibration_size)
+        if not paths:
+            raise SystemExit(f"No calibration images found in {calibration_dir}")
+        print(f"Calibrating on {len(paths)} images from {calibration_dir}")
+
+        def representative_dataset():
+            for path in paths:
+                yield [np.asarray([load_image(path)], dtype=np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    shutil.rmtree(saved_model_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(tflite_model)
+    print(f"Wrote {output} ({len(tflite_model) / 1e6:.1f} MB, {quantize})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the fused model to TFLite")
+    parser.add_argument("--output", default=QUANTIZED_MODEL_PATH)
+    parser.add_argument("--quantize", choices=["int8", "dynamic", "float16", "none"], default="int8")
+    parser.add_argument("--calibration-dir", default=APPROVED_FOLDER)
+    parser.add_argument("--calibration-size", type=int, default=200)
+    args = parser.parse_args()
+    export(args.output, args.quantize, args.calibration_dir, args.calibration_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# keras_backend.py - Adapter: expose the two-stage predict.py path as a backend
+import numpy as np
+from ..interfaces import IInferenceBackend
+from ..predict import load_feature_extractor, load_head, predict_batch
+from ..config import IMAGE_SIZE, MODEL_PATH
+
+
+class KerasBackend(IInferenceBackend):
+    """Original path: vgg19.predict → model.predict with a host round trip"""
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        # VGG19 is shared; each backend owns its head so a reload can swap it
+        self.head = load_head(model_path)
+
+    def predict_batch(self, images):
+        return predict_batch(images, self.head)
+
+    def warm_up(self):
+        """Load VGG19 and pay Keras' first-call setup before the first request"""
+        load_feature_extractor()
+        width, height = IMAGE_SIZE
+        predict_batch(np.zeros((1, height, width, 3), dtype=np.uint8), self.head)
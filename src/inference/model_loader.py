@@ -0,0 +1,208 @@
+# model_loader.py - Single Responsibility: Load, warm and hot-swap models off the request path
+import gc
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional, Tuple
+from ..interfaces import IInferenceBackend
+from .versioning import model_version
+
+
+class ModelLoader:
+    """Builds and warms the inference backend on a background thread.
+
+    Worker startup only spawns the thread; ``/ready`` reports progress and
+    callers that need the backend block in ``wait()`` until it is warm.
+
+    ``reload()`` builds and warms a backend from the model file now on
+    disk while the current one keeps serving, then swaps the
+    ``(backend, version)`` pair in one assignment. Batches already running
+    finish on the old backend, which is released afterwards. Only one
+    reload runs at a time, so at most two backends are alive; a backend
+    with its own ``reload()`` (the worker pool) is updated in place
+    instead. With ``poll_interval`` set, the model file is watched and
+    reloaded once a new version has stopped changing.
+    """
+
+    def __init__(self, factory: Callable[[], IInferenceBackend], model_path: str = None,
+                 poll_interval: float = 0.0):
+        self.factory = factory
+        self.model_path = model_path
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger("ModelLoader")
+        self._active: Optional[Tuple[IInferenceBackend, str]] = None
+        self._error: Optional[BaseException] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._created_at = time.monotonic()
+        self._timings: Dict[str, float] = {}
+        self._reloading = False
+        self._reload_error: Optional[str] = None
+        self._history: deque = deque(maxlen=10)
+
+    def start(self):
+        """Begin loading (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+                self._thread.start()
+            if self.poll_interval > 0 and self.model_path and self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+                self._watcher.start()
+
+    def _file_version(self) -> str:
+        return model_version(self.model_path) if self.model_path else "unknown"
+
+    def _build(self) -> Tuple[IInferenceBackend, str, float, float]:
+        """Load and warm a backend; fails if the model file changed underneath"""
+        version = self._file_version()
+        started = time.monotonic()
+        backend = self.factory()
+        loaded = time.monotonic()
+        backend.warm_up()
+        warmed = time.monotonic()
+        if self._file_version() != version:
+            raise RuntimeError("Model file changed while it was loading")
+        return backend, getattr(backend, "version", None) or version, loaded - started, warmed - loaded
+
+    def _load(self):
+        try:
+            backend, version, load_seconds, warm_up_seconds = self._build()
+        except BaseException as e:
+            self.logger.error(f"Model loading failed: {e}")
+            self._error = e
+            self._ready.set()
+            return
+
+        self._timings = {
+            "load_seconds": load_seconds,
+            "warm_up_seconds": warm_up_seconds,
+            "cold_start_seconds": time.monotonic() - self._created_at
+        }
+        self._active = (backend, version)
+        self._history.append({"version": version, "loaded_at": time.time(), "seconds": load_seconds + warm_up_seconds})
+        self.logger.info(
+            f"Models ready ({version}): load {self._timings['load_seconds']:.2f}s, "
+            f"warm-up {self._timings['warm_up_seconds']:.2f}s, "
+            f"cold start {self._timings['cold_start_seconds']:.2f}s"
+        )
+        self._ready.set()
+
+    # ----- hot reload -----
+
+    def reload(self) -> bool:
+        """Start a background reload; False if one is already running or the first load has not finished"""
+        with self._lock:
+            if self._reloading or self._active is None:
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload, name="model-reloader", daemon=True).start()
+        return True
+
+    def _reload(self):
+        started = time.monotonic()
+        try:
+            current, _ = self._active
+            if hasattr(current, "reload"):
+                current.reload()
+                self._active = (current, current.version)
+            else:
+                backend, version, _, _ = self._build()
+                # One assignment: a batch sees either the old pair or the new one
+                self._active = (backend, version)
+                del current
+                gc.collect()
+            self._reload_error = None
+            version = self._active[1]
+            self._history.append({"version": version, "loaded_at": time.time(),
+                                  "seconds": time.monotonic() - started})
+            self.logger.info(f"Swapped in model {version} after {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            self._reload_error = str(e)
+            self.logger.error(f"Model reload failed, still serving {self.version}: {e}")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def _watch(self):
+        """Reload when the model file's (mtime, size) changes and then holds still for one poll"""
+        def signature():
+            try:
+                stat = os.stat(self.model_path)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        loaded, previous = signature(), None
+        while True:
+            time.sleep(self.poll_interval)
+            current = signature()
+            if current is not None and current != loaded and current == previous and self._active is not None:
+                if self.reload():
+                    loaded = current
+            previous = current
+
+    # ----- serving -----
+
+    @property
+    def is_ready(self) -> bool:
+        return self._active is not None
+
+    @property
+    def version(self) -> str:
+        """Version of the model serving right now (of the file on disk before the first load)"""
+        active = self._active
+        return active[1] if active is not None else self._file_version()
+
+    def wait(self, timeout: float = None) -> IInferenceBackend:
+        """Return the warm backend, starting and blocking on the load if needed"""
+        return self._wait_active(timeout)[0]
+
+    def _wait_active(self, timeout: float = None) -> Tuple[IInferenceBackend, str]:
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Models are still loading")
+        if self._error is not None:
+            raise RuntimeError(f"Model loading failed: {self._error}")
+        return self._active
+
+    def predict_batch(self, images):
+        """(features, preds, versions): the batch runs on one backend and every row names its model"""
+        backend, version = self._wait_active()
+        outputs = backend.predict_batch(images)
+        if len(outputs) == 3:
+            return outputs  # the worker pool tags rows with each worker's version
+        features, preds = outputs
+        return features, preds, [version] * len(preds)
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness, cold-start timings and the serving model version"""
+        if self._error is not None:
+            state = "failed"
+        elif self._active is not None:
+            state = "ready"
+        elif self._thread is not None:
+            state = "loading"
+        else:
+            state = "idle"
+        status = {"status": state, **self._timings}
+        if self._active is not None:
+            status["model_version"] = self._active[1]
+        if self._error is not None:
+            status["error"] = str(self._error)
+        return status
+
+    def reload_status(self) -> Dict[str, Any]:
+        """Serving version, whether a reload is running, and recent swaps"""
+        return {
+            **self.status(),
+            "model_path": self.model_path,
+            "file_version": self._file_version(),
+            "reloading": self._reloading,
+            "last_reload_error": self._reload_error,
+            "history": list(self._history)
+        }
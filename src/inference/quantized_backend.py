@@ -0,0 +1,87 @@
+# quantized_backend.py - Single Responsibility: Run the exported int8/float16 TFLite model
+import logging
+import os
+import threading
+from typing import Dict
+import numpy as np
+import tensorflow as tf
+from ..interfaces import IInferenceBackend
+from .fused_backend import _bucket_sizes
+from ..config import IMAGE_SIZE, CLASS_NAMES
+
+
+class QuantizedBackend(IInferenceBackend):
+    """CPU inference over the fused VGG19 + head exported to TFLite.
+
+    The ``.tflite`` file comes from ``python -m src.inference.export_tflite``
+    and takes raw (N, H, W, 3) pixels, so preprocessing runs inside it.
+    Like FusedBackend, batches are zero-padded to a power-of-two bucket;
+    each bucket has its own interpreter, sized and allocated once, so
+    variable batch sizes never trigger ``allocate_tensors`` again.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = None, max_batch_size: int = 16):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Quantized model not found: {model_path} (run python -m src.inference.export_tflite)"
+            )
+        self.logger = logging.getLogger("QuantizedBackend")
+        self.model_path = model_path
+        self.num_threads = num_threads or os.cpu_count()
+        self.buckets = list(_bucket_sizes(max(1, int(max_batch_size))))
+        self._interpreters: Dict[int, tf.lite.Interpreter] = {}
+        self._lock = threading.Lock()
+
+        width, height = IMAGE_SIZE
+        self.input_shape = (height, width, 3)
+        self._interpreter_for(self.buckets[0])  # fail fast on a broken model file
+
+    def _interpreter_for(self, bucket: int):
+        """The interpreter whose input is fixed at ``bucket`` images (caller holds the lock)"""
+        interpreter = self._interpreters.get(bucket)
+        if interpreter is None:
+            interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]["index"], (bucket,) + self.input_shape)
+            interpreter.allocate_tensors()
+            self._interpreters[bucket] = interpreter
+        return interpreter
+
+    @staticmethod
+    def _outputs(interpreter):
+        """(features, probabilities) told apart by their width"""
+        features = preds = None
+        for detail in interpreter.get_output_details():
+            tensor = interpreter.get_tensor(detail["index"])
+            if tensor.shape[-1] == len(CLASS_NAMES):
+                preds = tensor
+            else:
+                features = tensor
+        return features, preds
+
+    def _run_bucket(self, images: np.ndarray):
+        count = len(images)
+        bucket = next(size for size in self.buckets if size >= count)
+        if bucket > count:
+            padding = np.zeros((bucket - count,) + self.input_shape, dtype=np.float32)
+            images = np.concatenate([images, padding])
+        with self._lock:
+            interpreter = self._interpreter_for(bucket)
+            interpreter.set_tensor(interpreter.get_input_details()[0]["index"], images)
+            interpreter.invoke()
+            features, preds = self._outputs(interpreter)
+            return features[:count].copy(), preds[:count].copy()
+
+    def predict_batch(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        largest = self.buckets[-1]
+        if len(images) <= largest:
+            return self._run_bucket(images)
+
+        chunks = [self._run_bucket(images[i:i + largest]) for i in range(0, len(images), largest)]
+        return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+    def warm_up(self):
+        """Allocate every bucket's interpreter so requests never do"""
+        for bucket in self.buckets:
+            self._run_bucket(np.zeros((bucket,) + self.input_shape, dtype=np.float32))
+        self.logger.info(f"Quantized model ready: {self.model_path} ({len(self.buckets)} batch buckets)")
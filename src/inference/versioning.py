@@ -0,0 +1,36 @@
+# versioning.py - Single Responsibility: Identify which model file produced a result
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_versions: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def model_version(model_path: str) -> str:
+    """Short content hash of the model file.
+
+    Hashing is cached per (mtime, size), so repeated calls are a single
+    ``os.stat`` until the file is replaced.
+    """
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return "unknown"
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        cached = _versions.get(model_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    version = digest.hexdigest()[:12]
+
+    with _lock:
+        _versions[model_path] = (signature, version)
+    return version
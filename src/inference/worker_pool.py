@@ -0,0 +1,353 @@
+# worker_pool.py - Single Responsibility: Run inference in pinned worker processes
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, List
+import numpy as np
+from ..interfaces import IInferenceBackend
+
+WORKER_NAME_PREFIX = "inference-worker"
+# Backends whose workers map one model file instead of each loading its own copy of the weights
+SHARED_WEIGHT_BACKENDS = ("tflite",)
+
+
+def in_inference_worker() -> bool:
+    """True inside a pool worker (spawn re-imports the parent's __main__ there)"""
+    return multiprocessing.current_process().name.startswith(WORKER_NAME_PREFIX)
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores: List[int], workers: int) -> List[List[int]]:
+    """Split cores into contiguous, near-equal slices; workers share cores when outnumbering them"""
+    if workers <= len(cores):
+        size, extra = divmod(len(cores), workers)
+        slices, start = [], 0
+        for i in range(workers):
+            end = start + size + (1 if i < extra else 0)
+            slices.append(cores[start:end])
+            start = end
+        return slices
+    return [[cores[i % len(cores)]] for i in range(workers)]
+
+
+def _configure_threads(cores: List[int]):
+    """Pin this process and size the TF/BLAS thread pools to its slice (before TF is imported)"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    threads = str(max(1, len(cores)))
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[name] = threads
+    # One inter-op thread: a worker runs a single graph at a time
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(int(threads))
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _worker_main(worker_id: int, cores: List[int], kind: str, max_batch_size: int, inbox, results):
+    """Worker process: build and warm the backend, then serve batches until a None job"""
+    try:
+        _configure_threads(cores)
+        from .backends import create_backend, model_path_for
+        from .versioning import model_version
+        version = model_version(model_path_for(kind))
+        backend = create_backend(kind, max_batch_size, num_threads=max(1, len(cores)))
+        backend.warm_up()
+        if model_version(model_path_for(kind)) != version:
+            raise RuntimeError("Model file changed while it was loading")
+    except BaseException as e:
+        results.put(("failed", worker_id, f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", worker_id, os.getpid(), version))
+
+    while True:
+        job = inbox.get()
+        if job is None:
+            return
+        job_id, images = job
+        try:
+            outputs = backend.predict_batch(images)
+            if isinstance(outputs, tuple):
+                outputs = tuple(np.asarray(output) for output in outputs)
+            else:
+                outputs = (np.asarray(outputs),)
+            # Every row names the model that produced it
+            results.put(("result", job_id, outputs + ([version] * len(outputs[0]),)))
+        except Exception as e:
+            results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+
+
+class InferenceWorkerPool(IInferenceBackend):
+    """Spreads batches over N spawned processes, each pinned to its own core slice.
+
+    Every worker holds its own backend, so N batches run truly in parallel
+    instead of contending for one interpreter and the GIL. Each worker is sized
+    to its slice (intra-op = cores in slice, inter-op = 1) so the processes do
+    not oversubscribe the machine. With the ``tflite`` backend the interpreter
+    maps the model file, so the weights are shared through the page cache; the
+    Keras backends would keep a private copy of VGG19 per worker, so more than
+    one of those workers is refused unless ``private_weights`` is set.
+
+    Batches go to the worker with the fewest outstanding jobs. Worker
+    liveness is checked every ``check_interval`` seconds, busy or idle; a
+    worker that died stops receiving batches, fails its in-flight jobs and
+    is respawned. ``reload()`` replaces the
+    workers one at a time (at most N + 1 processes), each retired worker
+    finishing its queued batches first; results carry the version of the
+    worker that computed them.
+    """
+
+    def __init__(self, workers: int, backend_kind: str, max_batch_size: int = 16,
+                 cores: List[int] = None, start_timeout: float = 600.0, check_interval: float = 0.5,
+                 private_weights: bool = False):
+        self.workers = max(1, int(workers))
+        self.backend_kind = backend_kind
+        self.max_batch_size = max_batch_size
+        self.start_timeout = start_timeout
+        self.check_interval = check_interval
+        self.core_slices = partition_cores(cores or available_cores(), self.workers)
+        self.logger = logging.getLogger("InferenceWorkerPool")
+        if self.workers > 1 and backend_kind not in SHARED_WEIGHT_BACKENDS:
+            if not private_weights:
+                raise ValueError(
+                    f"{self.workers} {backend_kind} workers would each load their own copy of the model weights; "
+                    f"use INFERENCE_BACKEND=tflite or set INFERENCE_WORKERS_PRIVATE_WEIGHTS=true"
+                )
+            self.logger.warning(f"Each of the {self.workers} {backend_kind} workers loads its own copy of the weights")
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._worker_ids = itertools.count()
+        self._pending: Dict[int, tuple] = {}  # job id -> (slot, future)
+        self._by_worker: Dict[int, Dict[str, Any]] = {}  # worker id -> slot, including retiring ones
+        self._slots: List[Dict[str, Any]] = [None] * self.workers
+        self._collector = None
+        self._closed = False
+
+    def _spawn(self, index: int, restarts: int = 0) -> Dict[str, Any]:
+        """Start a worker process for ``index``'s core slice; the caller installs the returned slot"""
+        worker_id = next(self._worker_ids)
+        slot = {"id": worker_id, "index": index, "process": None, "inbox": self._ctx.Queue(),
+                "ready": threading.Event(), "error": None, "outstanding": 0, "jobs": 0,
+                "restarts": restarts, "pid": None, "version": None}
+        slot["process"] = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.core_slices[index], self.backend_kind, self.max_batch_size,
+                  slot["inbox"], self._results),
+            name=f"{WORKER_NAME_PREFIX}-{index}",
+            daemon=True
+        )
+        with self._lock:
+            self._by_worker[worker_id] = slot
+        slot["process"].start()
+        return slot
+
+    def start(self):
+        """Spawn the workers and the result collector (idempotent)"""
+        if self._collector is not None:
+            return
+        with self._start_lock:
+            if self._collector is not None:
+                return
+            for index in range(self.workers):
+                self._slots[index] = self._spawn(index)
+            self._collector = threading.Thread(target=self._collect, name="inference-pool-results", daemon=True)
+            self._collector.start()
+
+    def warm_up(self):
+        """Block until every worker has built and warmed its backend"""
+        self.start()
+        deadline = time.monotonic() + self.start_timeout
+        for index, slot in enumerate(self._slots):
+            if not slot["ready"].wait(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"Inference worker {index} did not start")
+            if slot["error"]:
+                raise RuntimeError(f"Inference worker {index} failed: {slot['error']}")
+        self.logger.info(
+            f"{self.workers} {self.backend_kind} workers ready on cores {self.core_slices}"
+        )
+
+    def reload(self):
+        """Rolling restart onto the model file now on disk; raises if a replacement fails to start.
+
+        Workers already replaced keep the new model, so a failure part-way
+        leaves a mix of versions (see ``version``) until the next reload.
+        """
+        with self._reload_lock:
+            for index in range(self.workers):
+                new = self._spawn(index, self._slots[index]["restarts"])
+                if not new["ready"].wait(self.start_timeout) or new["error"]:
+                    new["process"].terminate()
+                    with self._lock:
+                        self._by_worker.pop(new["id"], None)
+                    raise RuntimeError(f"Replacement for inference worker {index} failed: "
+                                       f"{new['error'] or 'did not start'}")
+                with self._lock:
+                    # Whatever serves the slot now, which may be a respawn of the worker we started from
+                    old, self._slots[index] = self._slots[index], new
+                # Queued batches run before the stop signal
+                old["inbox"].put(None)
+                self.logger.info(f"Inference worker {index} now serves model {new['version']}")
+
+    def _reap(self):
+        """Forget retired workers that have exited, failing any batch they never answered (collector thread)"""
+        with self._lock:
+            current = {slot["id"] for slot in self._slots if slot is not None}
+            retired = [slot for worker_id, slot in self._by_worker.items()
+                       if worker_id not in current and not slot["process"].is_alive()]
+        # A worker flushes its results before exiting, so once it is dead an
+        # empty queue means nothing of its is still on the way
+        if not retired or not self._results.empty():
+            return
+        lost = []
+        with self._lock:
+            for slot in retired:
+                self._by_worker.pop(slot["id"], None)
+                if not slot["ready"].is_set():
+                    # A replacement that died while starting; wake reload() instead of letting it time out
+                    slot["error"] = f"exited ({slot['process'].exitcode}) before it was ready"
+                    slot["ready"].set()
+                lost += [self._pending.pop(job_id)[1] for job_id, (owner, _) in list(self._pending.items())
+                         if owner is slot]
+        for future in lost:
+            future.set_exception(RuntimeError("Retired inference worker exited"))
+
+    @property
+    def version(self) -> str:
+        """Model version served by the workers (comma-separated while they differ)"""
+        return ",".join(sorted({slot["version"] or "loading" for slot in self._slots if slot is not None}))
+
+    def predict_batch(self, images):
+        if self._closed:
+            raise RuntimeError("Inference worker pool is closed")
+        self.start()
+        future = Future()
+        with self._lock:
+            ready = [slot for slot in self._slots if slot["ready"].is_set() and not slot["error"]]
+            if not ready:
+                raise RuntimeError("No inference worker is available")
+            slot = min(ready, key=lambda candidate: candidate["outstanding"])
+            job_id = next(self._job_ids)
+            self._pending[job_id] = (slot, future)
+            slot["outstanding"] += 1
+        slot["inbox"].put((job_id, np.asarray(images, dtype=np.float32)))
+        return future.result()
+
+    def _finish(self, job_id: int):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            if entry is not None:
+                slot = entry[0]
+                slot["outstanding"] -= 1
+                slot["jobs"] += 1
+        return entry[1] if entry is not None else None
+
+    def _collect(self):
+        next_check = time.monotonic() + self.check_interval
+        while not self._closed:
+            try:
+                self._handle(self._results.get(timeout=self.check_interval))
+            except queue.Empty:
+                pass
+            # On every pass, not only when idle: under steady load a dead worker
+            # would otherwise keep being handed batches that nobody answers
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.check_interval
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind in ("ready", "failed"):
+            with self._lock:
+                slot = self._by_worker.get(message[1])
+            if slot is None:
+                # A replacement that reload() gave up on, or a worker already reaped
+                self.logger.debug(f"Ignoring {kind} from unknown inference worker {message[1]}")
+                return
+            if kind == "ready":
+                _, _, pid, version = message
+                slot["pid"], slot["version"] = pid, version
+            else:
+                self.logger.error(f"Inference worker {slot['index']} failed to start: {message[2]}")
+                slot["error"] = message[2]
+            slot["ready"].set()
+        elif kind == "result":
+            future = self._finish(message[1])
+            if future is not None:
+                future.set_result(message[2])
+        elif kind == "error":
+            future = self._finish(message[1])
+            if future is not None:
+                future.set_exception(RuntimeError(message[2]))
+
+    def _check_workers(self):
+        """Fail the jobs of dead workers and respawn them"""
+        for index, slot in enumerate(self._slots):
+            process = slot["process"]
+            if self._closed or process is None or process.is_alive() or slot["error"]:
+                continue
+            self.logger.warning(f"Inference worker {index} exited ({process.exitcode}); restarting")
+            with self._lock:
+                # Unroutable first (predict_batch skips slots with an error), so no new
+                # batch can be assigned to it after its jobs are failed below
+                slot["error"] = f"exited ({process.exitcode})"
+                slot["ready"].set()
+                lost = [job_id for job_id, (owner, _) in self._pending.items() if owner is slot]
+                futures = [self._pending.pop(job_id)[1] for job_id in lost]
+                slot["outstanding"] = 0
+                self._by_worker.pop(slot["id"], None)
+            for future in futures:
+                future.set_exception(RuntimeError(f"Inference worker {index} exited"))
+            replacement = self._spawn(index, slot["restarts"] + 1)
+            with self._lock:
+                self._slots[index] = replacement
+        self._reap()
+
+    def close(self, timeout: float = 10.0):
+        """Stop the workers after their current batch"""
+        self._closed = True
+        with self._lock:
+            slots = list(self._by_worker.values())
+        for slot in slots:
+            slot["inbox"].put(None)
+        for slot in slots:
+            process = slot["process"]
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-worker pinning, load, restart counters and model version"""
+        with self._lock:
+            return {
+                "backend": self.backend_kind,
+                "workers": [
+                    {
+                        "pid": slot["pid"],
+                        "cores": self.core_slices[index],
+                        "ready": slot["ready"].is_set() and not slot["error"],
+                        "outstanding": slot["outstanding"],
+                        "jobs": slot["jobs"],
+                        "restarts": slot["restarts"],
+                        "version": slot["version"]
+                    }
+                    for index, slot in enumerate(self._slots) if slot is not None
+                ],
+                "retiring": len(self._by_worker) - sum(1 for slot in self._slots if slot is not None)
+            }
@@ -1,6 +1,6 @@
 # interfaces.py - Interface Segregation: Define clear contracts
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Optional, Callable
 
 class IPredictionRepository(ABC):
     """Interface for prediction data storage"""
@@ -8,7 +8,14 @@ class IPredictionRepository(ABC):
     @abstractmethod
     def save_prediction(self, file_bytes: bytes, filename: str, 
                        prediction: str, confidence: float, 
-                       user_data: Dict[str, Any]) -> Dict[str, Any]:
+                       user_data: Dict[str, Any], features=None,
+                       client_ip: str = None, model_version: str = None) -> Dict[str, Any]:
+        pass
+    
+    @abstractmethod
+    def save_predictions(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                         client_ip: str = None) -> List[Dict[str, Any]]:
+        """Persist several predictions in one bulk write; one result (or {"error"}) per entry"""
         pass
     
     @abstractmethod
@@ -16,11 +23,20 @@ class IPredictionRepository(ABC):
         pass
     
     @abstractmethod
-    def fetch_pending(self) -> List[Dict[str, Any]]:
+    def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        """Approve/reject many reports in one bulk write; one outcome (or {"error"}) per decision"""
         pass
     
     @abstractmethod
-    def fetch_by_location(self, city: str = None, country: str = None) -> List[Dict[str, Any]]:
+    def fetch_pending(self, limit: int = 0, after_id: str = None,
+                      projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Pending reports in _id order; limit=0 returns all of them"""
+        pass
+    
+    @abstractmethod
+    def fetch_by_location(self, city: str = None, country: str = None, limit: int = 0,
+                          after_id: str = None, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Reports for a city/country in _id order; limit=0 returns all of them"""
         pass
 
 class IPredictor(ABC):
@@ -29,12 +45,43 @@ class IPredictor(ABC):
     @abstractmethod
     def predict(self, image_path: str) -> Dict[str, Any]:
         pass
+    
+    @abstractmethod
+    def predict_bytes(self, file_bytes: bytes, filename: str) -> Dict[str, Any]:
+        """Predict straight from an in-memory upload (no temp file)"""
+        pass
+    
+    @abstractmethod
+    def predict_many(self, items: List[Tuple[bytes, str]]) -> List[Any]:
+        """Predict (file_bytes, filename) pairs together; a failed item yields its Exception"""
+        pass
+
+class IInferenceBackend(ABC):
+    """Interface for batched model inference"""
+    
+    @abstractmethod
+    def predict_batch(self, images) -> Tuple[Any, Any]:
+        """Map a stacked (N, H, W, 3) batch to (features, probabilities)"""
+        pass
+    
+    @abstractmethod
+    def warm_up(self):
+        pass
 
 class ILocationService(ABC):
     """Interface for location detection"""
     
     @abstractmethod
-    def get_location(self) -> Dict[str, Any]:
+    def get_location(self, client_ip: str = None) -> Dict[str, Any]:
+        pass
+    
+    @abstractmethod
+    def peek_location(self, client_ip: str = None) -> Optional[Dict[str, Any]]:
+        """Cached location or None, without blocking"""
+        pass
+    
+    @abstractmethod
+    def resolve_async(self, client_ip: str = None, callback: Callable = None):
         pass
 
 class IFileManager(ABC):
@@ -52,5 +99,6 @@ class INotificationService(ABC):
     """Interface for notifications"""
     
     @abstractmethod
-    def notify_admin(self, message: str):
+    def notify_admin(self, message: str, **event):
+        """Queue a notification; event fields (barangay, prediction, ...) drive digests"""
         pass
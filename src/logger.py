@@ -1,19 +1,82 @@
 # logger.py
 import os
+import copy
+import json
+import atexit
 import logging
-from datetime import datetime
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from .config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Configure main logger
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log")),
-        logging.StreamHandler()
-    ]
-)
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed via extra={...}
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any extra={...} fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the caller: count and drop records when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message and traceback now; keep extra fields for the JSON formatter"""
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _build_listener() -> logging.handlers.QueueListener:
+    file_handler = logging.FileHandler(
+        os.path.join(LOG_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log")
+    )
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+
+# Configure main logger: request threads only enqueue records; a background
+# listener thread formats them and does the file/console I/O
+log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+logging.basicConfig(level=LOG_LEVEL, handlers=[DroppingQueueHandler(log_queue)])
+listener = _build_listener()
+listener.start()
+atexit.register(listener.stop)
 
 logger = logging.getLogger("HarvestAssistant")
@@ -0,0 +1,230 @@
+# metrics.py - Single Responsibility: Stage timings, gauges and on-demand profiling
+import bisect
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Quantiles reported from the recent-sample window
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Cumulative bucket counts plus a bounded window of recent samples for quantiles"""
+
+    def __init__(self, window: int = 2048):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+            self.samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.total, self.count
+            samples = sorted(self.samples)
+        quantiles = {}
+        for q in QUANTILES:
+            quantiles[q] = samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+        return {"counts": counts, "sum": total, "count": count, "quantiles": quantiles}
+
+
+class Profiler:
+    """Sampled cProfile captures, switched on at runtime.
+
+    While active, each ``profile()`` block is captured with probability
+    ``sample_rate`` until ``max_samples`` have been taken; captures are merged
+    into one pstats report. Only one capture runs at a time, so concurrent
+    requests are never slowed by more than one profiler.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._capture_lock = threading.Lock()
+        self.sample_rate = 0.0
+        self.remaining = 0
+        self.captured = 0
+        self._stats: Optional[pstats.Stats] = None
+
+    def start(self, sample_rate: float = 0.1, max_samples: int = 50):
+        """Begin a new capture session, discarding the previous report"""
+        with self._lock:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+            self.remaining = max(0, int(max_samples))
+            self.captured = 0
+            self._stats = None
+
+    def stop(self):
+        with self._lock:
+            self.remaining = 0
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0
+
+    @contextmanager
+    def profile(self):
+        if self.remaining <= 0 or random.random() >= self.sample_rate or not self._capture_lock.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+        finally:
+            self._capture_lock.release()
+        with self._lock:
+            if self.remaining <= 0:
+                return
+            self.remaining -= 1
+            self.captured += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        """Text report of the merged captures"""
+        with self._lock:
+            if self._stats is None:
+                return "No profile captured yet"
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def status(self) -> Dict[str, Any]:
+        return {"active": self.active, "sample_rate": self.sample_rate,
+                "remaining": self.remaining, "captured": self.captured}
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms, counters and callback gauges"""
+
+    def __init__(self, prefix: str = "harvest"):
+        self.prefix = prefix
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._gauges: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.profiler = Profiler()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time a block into the ``stage`` histogram (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], Any]):
+        """Register a gauge read at scrape time; ``read`` returns a number or {label: number}"""
+        self._gauges[name] = (help_text, read)
+
+    def reset(self):
+        """Forget all samples and counters (gauges stay registered)"""
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 (ms) and counts per stage, for /stats"""
+        summary = {}
+        for stage, histogram in sorted(self._histograms.items()):
+            snap = histogram.snapshot()
+            summary[stage] = {
+                "count": snap["count"],
+                "mean_ms": snap["sum"] * 1000.0 / snap["count"] if snap["count"] else 0.0,
+                **{f"p{int(q * 100)}_ms": value * 1000.0 for q, value in snap["quantiles"].items()}
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        """Text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines += [f"# HELP {name} Time spent per request stage", f"# TYPE {name} histogram"]
+        quantile_lines = []
+        for stage, histogram in sorted(self._histograms.items()):
+            snap = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), snap["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {snap["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {snap["count"]}')
+            for q, value in snap["quantiles"].items():
+                quantile_lines.append(f'{name}_recent{{stage="{stage}",quantile="{q}"}} {value}')
+        if quantile_lines:
+            lines += [f"# HELP {name}_recent Quantiles over the most recent samples per stage",
+                      f"# TYPE {name}_recent gauge"] + quantile_lines
+
+        with self._lock:
+            counters = dict(self._counters)
+        for counter in sorted({key[0] for key in counters}):
+            full = f"{self.prefix}_{counter}_total"
+            lines.append(f"# TYPE {full} counter")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == counter:
+                    lines.append(f"{full}{_labels(dict(labels))} {value}")
+
+        for gauge, (help_text, read) in sorted(self._gauges.items()):
+            try:
+                value = read()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            full = f"{self.prefix}_{gauge}"
+            lines += [f"# HELP {full} {help_text}", f"# TYPE {full} gauge"]
+            if isinstance(value, dict):
+                for label_value, number in sorted(value.items()):
+                    if number is not None:
+                        lines.append(f'{full}{{name="{label_value}"}} {float(number)}')
+            else:
+                lines.append(f"{full} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+# Global registry, imported wherever a stage is timed
+metrics = MetricsRegistry()
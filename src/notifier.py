@@ -1,13 +1,262 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from .interfaces import INotificationService
+from .config import (
+    NOTIFY_DIGEST_SECONDS, NOTIFY_GROUP_BY, NOTIFY_MAX_PER_MINUTE, NOTIFY_QUEUE_SIZE,
+    NOTIFY_SINKS, NOTIFY_FILE, NOTIFY_WEBHOOK_URL
+)
+
+
+class LogSink:
+    """Write digests to the application log"""
 
-class Notifier:
     def __init__(self):
         self.logger = logging.getLogger("Notifier")
 
-    def notify_admin(self, message: str):
+    def send(self, digest: Dict[str, Any]):
+        self.logger.info(f"[ADMIN NOTIFY] {digest['summary']}", extra={"digest": digest})
+
+
+class FileSink:
+    """Append digests as JSON lines to a local file (handy for tests and audits)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def send(self, digest: Dict[str, Any]):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(digest, default=str) + "\n")
+
+
+class MemorySink:
+    """Keep digests in a list, for tests"""
+
+    def __init__(self):
+        self.digests: List[Dict[str, Any]] = []
+
+    def send(self, digest: Dict[str, Any]):
+        self.digests.append(digest)
+
+
+class WebhookSink:
+    """POST each digest as JSON (email/Telegram/PocketBase gateways sit behind a webhook)"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, digest: Dict[str, Any]):
+        response = requests.post(self.url, json=digest, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class NotificationDispatcher:
+    """Coalesces admin events into periodic digests, off the request thread.
+
+    ``publish`` only enqueues. A background thread groups events by
+    ``group_by`` (e.g. barangay or prediction) and every ``digest_seconds``
+    sends one digest per group to each sink. At most ``max_per_minute``
+    digests go out per sink; groups over the limit, or whose delivery
+    failed, stay in that sink's backlog for the next window instead of
+    being dropped. Sinks that already received a group do not get it again.
+    """
+
+    def __init__(self, sinks: List[Any], group_by: str = "barangay", digest_seconds: float = 60.0,
+                 max_per_minute: int = 6, max_queue: int = 10000, max_examples: int = 5):
+        self.sinks = sinks
+        self.group_by = group_by
+        self.digest_seconds = digest_seconds
+        self.max_per_minute = max_per_minute
+        self.max_examples = max_examples
+        self.logger = logging.getLogger("NotificationDispatcher")
+
+        self._events: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self._sent: Dict[int, List[float]] = {id(sink): [] for sink in sinks}
+        self._backlog: Dict[int, Dict[str, Dict[str, Any]]] = {id(sink): {} for sink in sinks}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._stats = {"published": 0, "dropped": 0, "digests_sent": 0, "rate_limited": 0, "delivery_errors": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def publish(self, event: Dict[str, Any]):
+        """Queue an event without blocking; drops (and counts) when the queue is full"""
+        self.start()
+        event.setdefault("ts", time.time())
+        try:
+            self._events.put_nowait(event)
+            self._count("published")
+        except queue.Full:
+            self._count("dropped")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _run(self):
+        next_flush = time.monotonic() + self.digest_seconds
+        while not self._stopping.is_set():
+            try:
+                self._add(self._events.get(timeout=max(0.0, next_flush - time.monotonic())))
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.digest_seconds
+
+    def _add(self, event: Dict[str, Any]):
+        key = str(event.get(self.group_by) or "unknown")
+        with self._lock:
+            group = self._groups.setdefault(key, {
+                "count": 0, "first_ts": event["ts"], "by_prediction": Counter(), "by_barangay": Counter(),
+                "examples": []
+            })
+            group["count"] += event.get("count", 1)
+            group["last_ts"] = event["ts"]
+            if event.get("prediction"):
+                group["by_prediction"][event["prediction"]] += event.get("count", 1)
+            if event.get("barangay"):
+                group["by_barangay"][event["barangay"]] += event.get("count", 1)
+            if len(group["examples"]) < self.max_examples:
+                group["examples"].append(event.get("message"))
+
+    def _digest(self, key: str, group: Dict[str, Any]) -> Dict[str, Any]:
+        top = ", ".join(f"{name} x{count}" for name, count in group["by_prediction"].most_common(3))
+        return {
+            "group_by": self.group_by,
+            "group": key,
+            "count": group["count"],
+            "by_prediction": dict(group["by_prediction"]),
+            "by_barangay": dict(group["by_barangay"]),
+            "examples": group["examples"],
+            "first_ts": group["first_ts"],
+            "last_ts": group["last_ts"],
+            "summary": f"{group['count']} new report(s) for {self.group_by} {key}" + (f": {top}" if top else "")
+        }
+
+    def _allowed(self, sink) -> bool:
+        """Sliding one-minute rate limit per sink; a slot is only used by ``_sent_one``"""
+        now = time.monotonic()
+        with self._lock:
+            sent = [t for t in self._sent[id(sink)] if now - t < 60.0]
+            self._sent[id(sink)] = sent
+            return len(sent) < self.max_per_minute
+
+    def _sent_one(self, sink):
+        """Count a delivered digest against the sink's rate limit"""
+        with self._lock:
+            self._sent[id(sink)].append(time.monotonic())
+            self._stats["digests_sent"] += 1
+
+    def flush(self):
+        """Drain queued events and send one digest per group to each sink (called by the background thread)"""
+        while True:
+            try:
+                self._add(self._events.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            groups, self._groups = self._groups, {}
+            for sink in self.sinks:
+                for key, group in groups.items():
+                    self._merge(self._backlog[id(sink)], key, self._copy(group))
+
+        for sink in self.sinks:
+            backlog = self._backlog[id(sink)]
+            with self._lock:
+                pending = list(backlog.items())
+            for key, group in pending:
+                if not self._allowed(sink):
+                    self._count("rate_limited")
+                    continue
+                try:
+                    sink.send(self._digest(key, group))
+                except Exception as e:
+                    # A failed delivery does not use up one of the sink's slots
+                    self._count("delivery_errors")
+                    self.logger.warning(f"Notification sink {type(sink).__name__} failed: {e}")
+                    continue
+                self._sent_one(sink)
+                with self._lock:
+                    if backlog.get(key) is group:
+                        del backlog[key]
+
+    @staticmethod
+    def _copy(group: Dict[str, Any]) -> Dict[str, Any]:
+        return {**group, "by_prediction": Counter(group["by_prediction"]),
+                "by_barangay": Counter(group["by_barangay"]), "examples": list(group["examples"])}
+
+    def _merge(self, groups: Dict[str, Dict[str, Any]], key: str, group: Dict[str, Any]):
+        """Fold a group into a sink's backlog so its next digest includes both (caller holds the lock)"""
+        current = groups.get(key)
+        if current is None:
+            groups[key] = group
+            return
+        current["count"] += group["count"]
+        current["first_ts"] = min(current["first_ts"], group["first_ts"])
+        current["last_ts"] = max(current["last_ts"], group["last_ts"])
+        current["by_prediction"].update(group["by_prediction"])
+        current["by_barangay"].update(group["by_barangay"])
+        current["examples"] = (current["examples"] + group["examples"])[:self.max_examples]
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is pending and stop the background thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending_groups = len(set(self._groups).union(*self._backlog.values()))
+            stats = dict(self._stats)
+        return {**stats, "queued": self._events.qsize(), "pending_groups": pending_groups}
+
+
+def build_sinks(names: List[str]) -> List[Any]:
+    sinks = []
+    for name in names:
+        if name == "log":
+            sinks.append(LogSink())
+        elif name == "file":
+            sinks.append(FileSink(NOTIFY_FILE))
+        elif name == "webhook" and NOTIFY_WEBHOOK_URL:
+            sinks.append(WebhookSink(NOTIFY_WEBHOOK_URL))
+    return sinks
+
+
+class Notifier(INotificationService):
+    def __init__(self, dispatcher: Optional[NotificationDispatcher] = None):
+        self.logger = logging.getLogger("Notifier")
+        self.dispatcher = dispatcher or NotificationDispatcher(
+            build_sinks(NOTIFY_SINKS), NOTIFY_GROUP_BY, NOTIFY_DIGEST_SECONDS, NOTIFY_MAX_PER_MINUTE, NOTIFY_QUEUE_SIZE
+        )
+
+    def notify_admin(self, message: str, **event):
         """
-        Notify admin (for now, just log).
-        Can be extended to send email, Telegram, or PocketBase push.
+        Notify admin without blocking the caller.
+        The event (barangay, prediction, ...) is queued and delivered in a
+        periodic digest to the configured sinks (log, local file, webhook).
         """
-        self.logger.info(f"[ADMIN NOTIFY] {message}")
-        print(f"[ADMIN NOTIFY] {message}")  # console feedback too
+        self.dispatcher.publish({"message": message, **event})
+
+    def stats(self) -> Dict[str, Any]:
+        return self.dispatcher.stats()
@@ -1,72 +1,192 @@
 import os
 import cv2
 import json
+import logging
+import threading
 import numpy as np
 from datetime import datetime
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications import VGG19
-from tensorflow.keras.applications.vgg19 import preprocess_input
 
+from .services.file_manager import link_or_copy
+from .metrics import metrics
 from .config import (
     UPLOAD_FOLDER,
     MODEL_PATH,
     IMAGE_SIZE,
-    CLASS_INDICES
+    CLASS_INDICES,
+    FAST_DECODE_ENABLED
 )
 
 # Directories for review
 TO_REVIEW_DIR = os.path.join("storage", "to_review")
 os.makedirs(TO_REVIEW_DIR, exist_ok=True)
 
-# Load models once on startup
-print("Loading VGG19 for feature extraction...")
-vgg19 = VGG19(include_top=False, weights="imagenet")
+logger = logging.getLogger("HarvestAssistant")
 
-print("Loading trained model...")
-model = load_model(MODEL_PATH)
+# Models are loaded on first use (TensorFlow is only imported then), so
+# importing this module stays cheap
+_models = {}
+_models_lock = threading.Lock()
 
-print(f"Model input shape: {model.input_shape}")
-print(f"Model output shape: {model.output_shape}")
 
+def load_feature_extractor():
+    """ImageNet VGG19 (never retrained), loaded once and shared by every head."""
+    with _models_lock:
+        if "vgg19" not in _models:
+            from tensorflow.keras.applications import VGG19
 
-def preprocess_image(img_path):
-    """Resize → preprocess → extract VGG19 features."""
-    img = cv2.imread(img_path)
+            logger.info("Loading VGG19 for feature extraction...")
+            _models["vgg19"] = VGG19(include_top=False, weights="imagenet")
+    return _models["vgg19"]
+
+
+def load_head(model_path=MODEL_PATH):
+    """Load a trained head from disk (uncached; used for hot reloads)."""
+    from tensorflow.keras.models import load_model
+
+    logger.info(f"Loading trained model {model_path}...")
+    model = load_model(model_path)
+    logger.info(f"Model input shape: {model.input_shape}")
+    logger.info(f"Model output shape: {model.output_shape}")
+    return model
+
+
+def load_models():
+    """Load VGG19 and the trained model once; safe to call from any thread."""
+    vgg19 = load_feature_extractor()
+    with _models_lock:
+        if "model" not in _models:
+            _models["model"] = load_head(MODEL_PATH)
+    return vgg19, _models["model"]
+
+
+# JPEG start-of-frame markers (baseline, progressive, ...) carry the dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# libjpeg can decode at 1/2, 1/4 or 1/8 scale straight from the DCT coefficients
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+
+def jpeg_dimensions(file_bytes):
+    """(width, height) from the JPEG header, or None if not a readable JPEG."""
+    data = memoryview(file_bytes)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xD9 or marker == 0xDA:  # end of image / start of scan
+            return None
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def decode_flag(file_bytes, target_size=IMAGE_SIZE):
+    """Pick the cheapest decode that still yields at least target_size pixels."""
+    if not FAST_DECODE_ENABLED:
+        return cv2.IMREAD_COLOR
+
+    dimensions = jpeg_dimensions(file_bytes)
+    if dimensions is None:
+        return cv2.IMREAD_COLOR  # PNG and anything else: full decode
+
+    width, height = dimensions
+    target_width, target_height = target_size
+    for scale, flag in _REDUCED_DECODE_FLAGS:
+        if width // scale >= target_width and height // scale >= target_height:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(file_bytes):
+    """Decode an in-memory upload and resize it to the training size."""
+    buffer = np.frombuffer(file_bytes, dtype=np.uint8)
+    img = cv2.imdecode(buffer, decode_flag(file_bytes))
     if img is None:
+        raise ValueError("Could not decode image")
+    return cv2.resize(img, IMAGE_SIZE)
+
+
+def load_image(img_path):
+    """Read an image from disk and resize it to the training size."""
+    try:
+        with open(img_path, "rb") as f:
+            file_bytes = f.read()
+        return decode_image(file_bytes)
+    except (OSError, ValueError):
         raise ValueError(f"Could not load image: {img_path}")
-    
-    img_resized = cv2.resize(img, IMAGE_SIZE)
-    img_array = np.array([img_resized])  # add batch dimension
 
-    img_preprocessed = preprocess_input(img_array)
-    features = vgg19.predict(img_preprocessed, verbose=0)
-    features_flattened = features.reshape(features.shape[0], -1)
 
-    return features_flattened
+def extract_features(images):
+    """Preprocess a stacked batch → extract flattened VGG19 features."""
+    from tensorflow.keras.applications.vgg19 import preprocess_input
+
+    vgg19 = load_feature_extractor()
+    with metrics.timer("vgg19"):
+        img_preprocessed = preprocess_input(np.asarray(images, dtype=np.float32))
+        features = vgg19.predict(img_preprocessed, verbose=0)
+    return features.reshape(features.shape[0], -1)
+
+
+def predict_batch(images, model=None):
+    """Run VGG19 + trained head (default: the one at MODEL_PATH) on a stacked (N, H, W, 3) batch."""
+    features = extract_features(images)
+    if model is None:
+        _, model = load_models()
+    with metrics.timer("head"):
+        preds = model.predict(features, verbose=0)
+    return features, preds
+
+
+def build_result(filename, preds):
+    """Turn one row of class probabilities into the API result dict."""
+    predicted_class_idx = int(np.argmax(preds))
+    predicted_class = CLASS_INDICES[predicted_class_idx]
+    confidence = float(np.max(preds))
+
+    # Probabilities per class
+    probabilities = {
+        CLASS_INDICES[idx]: float(prob) for idx, prob in enumerate(preds)
+    }
+
+    return {
+        "filename": filename,
+        "prediction": predicted_class,
+        "confidence": confidence,
+        "probabilities": probabilities,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def preprocess_image(img_path):
+    """Resize → preprocess → extract VGG19 features."""
+    with metrics.timer("load_image"):
+        img_array = np.array([load_image(img_path)])  # add batch dimension
+    return extract_features(img_array)
 
 
 def predict_image(img_path, save_for_review=False):
     """Run prediction and optionally store for admin review."""
     try:
         features = preprocess_image(img_path)
-        preds = model.predict(features, verbose=0)
-
-        predicted_class_idx = np.argmax(preds)
-        predicted_class = CLASS_INDICES[predicted_class_idx]
-        confidence = float(np.max(preds))
+        _, model = load_models()
+        with metrics.timer("head"):
+            preds = model.predict(features, verbose=0)
 
-        # Probabilities per class
-        probabilities = {
-            CLASS_INDICES[idx]: float(prob) for idx, prob in enumerate(preds[0])
-        }
-
-        result = {
-            "filename": os.path.basename(img_path),
-            "prediction": predicted_class,
-            "confidence": confidence,
-            "probabilities": probabilities,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        result = build_result(os.path.basename(img_path), preds[0])
 
         # Save to "to_review" for admin (only if requested)
         if save_for_review:
@@ -74,13 +194,13 @@ def predict_image(img_path, save_for_review=False):
             review_img_path = os.path.join(TO_REVIEW_DIR, f"{base_name}.png")
             review_meta_path = os.path.join(TO_REVIEW_DIR, f"{base_name}.json")
 
-            # Copy image instead of moving (since app.py needs it)
-            import shutil
-            shutil.copy2(img_path, review_img_path)
-            
-            # Save JSON metadata
-            with open(review_meta_path, "w") as f:
-                json.dump(result, f, indent=4)
+            with metrics.timer("review_copy"):
+                # Link instead of moving (since app.py needs it) or copying
+                link_or_copy(img_path, review_img_path)
+                
+                # Save JSON metadata
+                with open(review_meta_path, "w") as f:
+                    json.dump(result, f, indent=4)
 
         return result
 
@@ -89,23 +209,7 @@ def predict_image(img_path, save_for_review=False):
 
 
 if __name__ == "__main__":
-    images = [f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-
-    if not images:
-        print("No images found in upload folder.")
-        exit()
-
-    print(f"Found {len(images)} images in upload folder")
-    print("-" * 60)
-
-    for img_name in images:
-        img_path = os.path.join(UPLOAD_FOLDER, img_name)
-        result = predict_image(img_path, save_for_review=True)
-
-        print(f"\nProcessing: {result['filename']}")
-        for cls, prob in result["probabilities"].items():
-            print(f"  {cls}: {prob:.4f}")
-        print(f"→ Prediction: {result['prediction']} (confidence: {result['confidence']:.4f})")
-
-    print("\n" + "-" * 60)
-    print("Prediction complete! Files copied to storage/to_review/")
+    # Batch scoring now lives in a streaming, resumable CLI; --review keeps
+    # the old behaviour of linking every image into storage/to_review
+    from .inference.batch_score import main
+    main(["--input", UPLOAD_FOLDER, "--review"])
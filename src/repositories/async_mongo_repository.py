@@ -0,0 +1,265 @@
+# async_mongo_repository.py - Single Responsibility: Non-blocking report writes for the ASGI app
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError
+from .mongo_repository import (
+    MongoRepository, REPORT_SUMMARY_PROJECTION, DEFAULT_PAGE_SIZE, IMAGE_MISSING_UPDATE, plan_review,
+    reviewed_changes, image_info
+)
+from .write_behind_repository import WriteBehindRepository
+from .outbreak_rollups import (
+    ROLLUP_SOURCE_PROJECTION, PREDICTED, insert_deltas, review_deltas, rollup_updates, bucket_query, summarise
+)
+from ..metrics import metrics
+
+
+class AsyncMongoRepository:
+    """Coroutine versions of the request-path repository methods, on motor.
+
+    Documents are assembled by the wrapped ``MongoRepository`` (blob store,
+    feature store, cached location) in a worker thread, so the hashing and
+    file I/O never run on the event loop; only the database round trips
+    are awaited here. Locations resolved later are written back on the
+    loop that saved the report.
+
+    If the wrapped repository is a ``WriteBehindRepository``
+    (REPOSITORY_MODE=write_behind), saves and reviews are delegated to it
+    on a worker thread, so reports take the same queue, journal and flush
+    order as in the Flask app instead of bypassing it through motor.
+    """
+
+    def __init__(self, repository: MongoRepository, connection_string: str, database_name: str):
+        self.repository = repository
+        self.location_service = repository.location_service
+        self.client = AsyncIOMotorClient(connection_string)
+        self.collection = self.client[database_name]["reports"]
+        self.rollups = self.client[database_name]["report_rollups"]
+        self.logger = logging.getLogger("AsyncMongoRepository")
+        self.write_behind = isinstance(repository, WriteBehindRepository)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _delegate(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: fn(*args))
+
+    def _later(self, coroutine_fn):
+        """Callback that runs ``coroutine_fn(location_info)`` on this repository's loop"""
+        loop = self._loop
+        return lambda info: asyncio.run_coroutine_threadsafe(coroutine_fn(info), loop)
+
+    async def _apply_rollups(self, deltas):
+        """Mirrors OutbreakRollups.apply: failures are logged, a rebuild repairs them"""
+        updates = rollup_updates(deltas)
+        if not updates:
+            return
+        try:
+            with metrics.timer("mongo_rollups"):
+                await self.rollups.bulk_write(updates, ordered=False)
+        except PyMongoError as e:
+            self.logger.error(f"Rollup update of {len(updates)} buckets failed: {e}")
+
+    async def _build_documents(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                               client_ip: str = None):
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(None, lambda: [
+            self.repository._build_document(
+                entry["file_bytes"], entry["filename"], entry["prediction"], entry["confidence"],
+                user_data, entry.get("features"), client_ip, entry.get("model_version")
+            )
+            for entry in entries
+        ])
+
+    async def save_prediction(self, file_bytes: bytes, filename: str,
+                              prediction: str, confidence: float,
+                              user_data: Dict[str, Any], features=None,
+                              client_ip: str = None, model_version: str = None) -> Dict[str, Any]:
+        """Save one report; mirrors MongoRepository.save_prediction"""
+        if self.write_behind:
+            return await self._delegate(self.repository.save_prediction, file_bytes, filename, prediction,
+                                        confidence, user_data, features, client_ip, model_version)
+        entry = {"file_bytes": file_bytes, "filename": filename, "prediction": prediction,
+                 "confidence": confidence, "features": features, "model_version": model_version}
+        [(doc, location_pending)] = await self._build_documents([entry], user_data, client_ip)
+
+        try:
+            with metrics.timer("mongo_insert"):
+                result = await self.collection.insert_one(doc)
+        except PyMongoError:
+            self.repository._take_features([doc["_id"]])
+            raise
+        await self._apply_rollups(insert_deltas([doc]))
+        await self._store_features([result.inserted_id])
+        await self._record_image_failures([result.inserted_id])
+
+        if location_pending:
+            report_id = result.inserted_id
+            self.location_service.resolve_async(
+                client_ip, callback=self._later(lambda info: self._set_locations([report_id], info))
+            )
+
+        return {
+            "inserted_id": result.inserted_id,
+            "location_info": doc["location_info"],
+            "file_path": doc["file_path"]
+        }
+
+    async def save_predictions(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                               client_ip: str = None) -> List[Dict[str, Any]]:
+        """Save a batch with one insert_many; mirrors MongoRepository.save_predictions"""
+        if self.write_behind:
+            return await self._delegate(self.repository.save_predictions, entries, user_data, client_ip)
+        built = await self._build_documents(entries, user_data, client_ip)
+        docs = [doc for doc, _ in built]
+        location_pending = any(pending for _, pending in built)
+
+        failed = await self._insert_documents(docs)
+
+        saved_ids = [doc["_id"] for i, doc in enumerate(docs) if i not in failed]
+        if location_pending and saved_ids:
+            self.location_service.resolve_async(
+                client_ip, callback=self._later(lambda info: self._set_locations(saved_ids, info))
+            )
+
+        return [
+            {"error": failed[i]} if i in failed else {
+                "inserted_id": doc["_id"],
+                "location_info": doc["location_info"],
+                "file_path": doc["file_path"]
+            }
+            for i, doc in enumerate(docs)
+        ]
+
+    async def _insert_documents(self, docs: List[Dict[str, Any]]) -> Dict[int, str]:
+        if not docs:
+            return {}
+        try:
+            with metrics.timer("mongo_bulk_insert"):
+                await self.collection.insert_many(docs, ordered=False)
+            failed = {}
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "Insert failed") for err in e.details.get("writeErrors", [])}
+        except PyMongoError as e:
+            self.logger.error(f"Bulk insert of {len(docs)} reports failed: {e}")
+            self.repository._take_image_failures([doc["_id"] for doc in docs])
+            self.repository._take_features([doc["_id"] for doc in docs])
+            return {i: str(e) for i in range(len(docs))}
+        await self._apply_rollups(insert_deltas(doc for i, doc in enumerate(docs) if i not in failed))
+        self.repository._take_features([doc["_id"] for i, doc in enumerate(docs) if i in failed])
+        await self._store_features([doc["_id"] for i, doc in enumerate(docs) if i not in failed])
+        await self._record_image_failures([doc["_id"] for doc in docs])
+        return failed
+
+    async def _store_features(self, report_ids: List[Any]):
+        """Feature-store appends take a file lock, so they run off the loop"""
+        if self.repository.feature_store is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.repository._store_features, report_ids)
+
+    async def _record_image_failures(self, report_ids: List[Any]):
+        """Mirrors MongoRepository._record_image_failures"""
+        failed = self.repository._take_image_failures(report_ids)
+        if failed:
+            try:
+                await self.collection.update_many({"_id": {"$in": failed}}, IMAGE_MISSING_UPDATE)
+            except PyMongoError as e:
+                self.logger.error(f"Could not mark {len(failed)} reports as missing their image: {e}")
+
+    async def _set_locations(self, report_ids: List[Any], location_info: Dict[str, Any]):
+        try:
+            await self.collection.update_many({"_id": {"$in": report_ids}}, {"$set": {"location_info": location_info}})
+        except PyMongoError as e:
+            self.logger.error(f"Location update failed: {e}")
+
+    async def update_status_by_filename(self, filename: str, status: str, label: str = None):
+        """Update status by filename (for admin approval)"""
+        update_data = {"status": status, "reviewed_at": datetime.utcnow()}
+        if label:
+            update_data["approved_class"] = label
+        before = await self.collection.find_one_and_update(
+            {"stored_filename": filename}, {"$set": update_data},
+            projection=ROLLUP_SOURCE_PROJECTION, return_document=ReturnDocument.BEFORE
+        )
+        if before is not None:
+            await self._apply_rollups(review_deltas([(before, status, label or before.get("approved_class"))]))
+
+    async def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        """Approve/reject many reports with one lookup and one bulk_write; mirrors MongoRepository.review_many"""
+        if self.write_behind:
+            # Flushes the queue first so freshly uploaded reports can be reviewed
+            return await self._delegate(self.repository.review_many, decisions, reviewer)
+        cursor = self.collection.find(
+            {"stored_filename": {"$in": [decision.get("filename") for decision in decisions]}},
+            {"stored_filename": 1, "file_path": 1, **ROLLUP_SOURCE_PROJECTION}
+        )
+        found = {doc["stored_filename"]: doc for doc in await cursor.to_list(length=None)}
+        updates, positions, outcomes = plan_review(decisions, found, reviewer)
+        if updates:
+            try:
+                with metrics.timer("mongo_bulk_review"):
+                    await self.collection.bulk_write([UpdateOne(query, update) for query, update in updates],
+                                                     ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    position = positions[err["index"]]
+                    outcomes[position] = {"filename": outcomes[position]["filename"],
+                                          "error": err.get("errmsg", "Update failed")}
+            except PyMongoError as e:
+                self.logger.error(f"Bulk review of {len(updates)} reports failed: {e}")
+                for position in positions:
+                    outcomes[position] = {"filename": outcomes[position]["filename"], "error": str(e)}
+        await self._apply_rollups(review_deltas(reviewed_changes(outcomes, found)))
+        return outcomes
+
+    async def outbreak_summary(self, start_day: str, end_day: str, group_by: List[str], basis: str = PREDICTED,
+                               barangay: str = None, crop: str = None, label: str = None) -> Dict[str, Any]:
+        """Report counts over a day window; mirrors MongoRepository.outbreak_summary"""
+        cursor = self.rollups.find(bucket_query(start_day, end_day, basis, barangay, crop, label), {"_id": 0})
+        return summarise(await cursor.to_list(length=None), group_by)
+
+    async def get_image(self, report_id: str) -> Optional[Dict[str, str]]:
+        """Path, content hash and MIME type of a report's image, or None; mirrors MongoRepository.get_image"""
+        if not ObjectId.is_valid(report_id):
+            return None
+        doc = await self.collection.find_one({"_id": ObjectId(report_id)},
+                                             {"file_path": 1, "blob_hash": 1, "filename": 1})
+        path = MongoRepository._image_path(doc)
+        if not path or not os.path.exists(path):
+            return None
+        return image_info(doc, self.repository.blob_store)
+
+    async def get_report(self, report_id: str, projection: Optional[Dict[str, Any]] = REPORT_SUMMARY_PROJECTION):
+        """One report by _id, or None; mirrors MongoRepository.get_report"""
+        if not ObjectId.is_valid(report_id):
+            return None
+        return await self.collection.find_one({"_id": ObjectId(report_id)}, projection)
+
+    async def fetch_by_classification_ids(self, classification_ids: List[str],
+                                          projection: Optional[Dict[str, Any]] = REPORT_SUMMARY_PROJECTION) -> Dict[str, Dict[str, Any]]:
+        """Reports keyed by classificationId; mirrors MongoRepository.fetch_by_classification_ids"""
+        cursor = self.collection.find({"classificationId": {"$in": list(classification_ids)}}, projection)
+        return {doc["classificationId"]: doc for doc in await cursor.to_list(length=None)}
+
+    async def _page(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]],
+                    after_id: str = None, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, Any]]:
+        if after_id:
+            query = {**query, "_id": {"$gt": ObjectId(after_id)}}
+        cursor = self.collection.find(query, projection).sort("_id", ASCENDING)
+        return await cursor.to_list(length=limit or None)
+
+    async def fetch_pending(self, limit: int = 0, after_id: str = None,
+                            projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch pending predictions; mirrors MongoRepository.fetch_pending"""
+        return await self._page({"status": "pending"}, projection, after_id, limit)
+
+    async def fetch_by_location(self, city: str = None, country: str = None, limit: int = 0,
+                                after_id: str = None,
+                                projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch predictions by location; mirrors MongoRepository.fetch_by_location"""
+        return await self._page(MongoRepository._location_query(city, country), projection, after_id, limit)
+
+    def close(self):
+        self.client.close()
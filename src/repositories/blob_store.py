@@ -0,0 +1,64 @@
+# blob_store.py - Single Responsibility: Content-addressed, sharded image files
+import glob
+import hashlib
+import os
+from typing import Optional
+
+
+class BlobStore:
+    """Stores each distinct image once under its SHA-256.
+
+    Files live at ``<root>/ab/cd/<sha256>`` so no directory grows past a
+    few hundred entries. The path depends on the content only (never on
+    the upload's extension), so one digest is one file and one reference
+    count. Writes are atomic and skipped when the blob already exists;
+    reference counts are kept by the repository.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def digest(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    @staticmethod
+    def digest_of(path: str) -> str:
+        """Hash of a stored blob, from its file name"""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def write(self, digest: str, file_bytes: bytes) -> bool:
+        """Write the blob unless it is already stored; True if written"""
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(file_bytes)
+        os.replace(tmp_path, path)
+        return True
+
+    @staticmethod
+    def derived_path(path: str, suffix: str) -> str:
+        """Where a file derived from a blob (e.g. a thumbnail) is cached: next to it"""
+        return f"{os.path.splitext(path)[0]}~{suffix}"
+
+    def read(self, path: str) -> Optional[bytes]:
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def remove(self, path: str):
+        """Delete a blob and everything derived from it"""
+        derived = glob.glob(glob.escape(os.path.splitext(path)[0]) + "~*") if path else []
+        for file_path in [path] + derived:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass  # File might already be deleted
@@ -0,0 +1,172 @@
+# feature_store.py - Single Responsibility: Persist VGG19 features for re-scoring
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class FeatureStore:
+    """Append-only float16 feature matrix backed by a ``.npy`` memmap.
+
+    Row ``i`` of ``features.npy`` belongs to the report id on line ``i`` of
+    ``index.txt``. The matrix is preallocated and doubled when full; the
+    index is the source of truth for how many rows are valid, and a row is
+    always written before its index line so a crash never exposes garbage.
+    Several processes (gunicorn workers, a batch re-score) may share one
+    directory: appends hold an ``flock`` on ``features.lock`` and first
+    catch up with rows and regrown files written by the others (POSIX only).
+    """
+
+    FEATURES_FILE = "features.npy"
+    INDEX_FILE = "index.txt"
+    LOCK_FILE = "features.lock"
+
+    def __init__(self, directory: str, initial_capacity: int = 1024):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self.features_path = os.path.join(directory, self.FEATURES_FILE)
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.lock_path = os.path.join(directory, self.LOCK_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._features = None
+        self._features_inode = None
+        self._listeners: List[Callable] = []
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._features is None else self._features.shape[1]
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        """Cross-process lock on the store (caller also holds the thread lock)"""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Pick up index lines and a regrown matrix written by other processes (caller holds both locks)"""
+        if os.path.exists(self.features_path):
+            inode = os.stat(self.features_path).st_ino
+            if inode != self._features_inode:
+                self._features = np.load(self.features_path, mmap_mode="r+")
+                self._features_inode = inode
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == self._index_offset:
+            return
+        with open(self.index_path, "r") as f:
+            f.seek(self._index_offset)
+            tail = f.read()
+        # A line without its newline is still being written; leave it for the next sync
+        complete = tail[:tail.rfind("\n") + 1]
+        self._index_offset += len(complete.encode())
+        capacity = 0 if self._features is None else self._features.shape[0]
+        for report_id in complete.splitlines():
+            # Drop index lines whose rows never made it to disk
+            if report_id.strip() and len(self._ids) < capacity:
+                self._rows[report_id] = len(self._ids)
+                self._ids.append(report_id)
+
+    def _allocate(self, capacity: int, dim: int):
+        """Create (or grow into) a memmap of the given capacity"""
+        tmp_path = f"{self.features_path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        count = len(self._ids)
+        if self._features is not None and count:
+            grown[:count] = self._features[:count]
+        grown.flush()
+        del grown
+        self._features = None
+        os.replace(tmp_path, self.features_path)
+        self._features = np.load(self.features_path, mmap_mode="r+")
+        self._features_inode = os.stat(self.features_path).st_ino
+
+    def add_listener(self, listener: Callable):
+        """Call ``listener(report_id, vector)`` after every append (e.g. to update an index)"""
+        self._listeners.append(listener)
+
+    def append(self, report_id: str, features) -> int:
+        """Store one feature vector for a report and return its row"""
+        vector = np.asarray(features, dtype=np.float16).reshape(-1)
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            if self._features is None:
+                self._allocate(self.initial_capacity, vector.shape[0])
+            elif vector.shape[0] != self._features.shape[1]:
+                raise ValueError(f"Feature size {vector.shape[0]} does not match store size {self._features.shape[1]}")
+
+            row = len(self._ids)
+            if row >= self._features.shape[0]:
+                self._allocate(self._features.shape[0] * 2, vector.shape[0])
+
+            self._features[row] = vector
+            line = f"{report_id}\n"
+            with open(self.index_path, "a") as f:
+                f.write(line)
+            self._index_offset += len(line.encode())
+            self._ids.append(report_id)
+            self._rows[report_id] = row
+        for listener in self._listeners:
+            listener(report_id, vector)
+        return row
+
+    def flush(self):
+        """Push dirty memmap pages to disk"""
+        with self._lock:
+            if self._features is not None:
+                self._features.flush()
+
+    def refresh(self):
+        """Catch up with rows appended by other processes"""
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+
+    def matrix(self) -> np.ndarray:
+        """Zero-copy (N, dim) float16 view over every stored row"""
+        with self._lock:
+            if self._features is None:
+                return np.empty((0, 0), dtype=np.float16)
+            return self._features[:len(self._ids)]
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._ids)
+
+    def row_of(self, report_id: str) -> Optional[int]:
+        return self._rows.get(report_id)
+
+    def get(self, report_id: str) -> Optional[np.ndarray]:
+        """Feature vector for a report, or None if it was never stored"""
+        row = self.row_of(report_id)
+        return None if row is None else self.matrix()[row]
+
+    def rescore(self, head_fn: Callable, chunk_size: int = 8192) -> Tuple[List[str], np.ndarray]:
+        """Run a new head over the whole archive without touching the CNN.
+
+        ``head_fn`` maps an (n, dim) float32 block to (n, classes), e.g. a
+        Keras head's ``predict`` or ``lambda x: x @ weights + bias``. Chunks
+        bound the float32 upcast; each chunk is one vectorised call.
+        """
+        self.refresh()
+        ids = self.ids()
+        matrix = self.matrix()[:len(ids)]
+        if not ids:
+            return ids, np.empty((0, 0), dtype=np.float32)
+        scores = [
+            np.asarray(head_fn(matrix[start:start + chunk_size].astype(np.float32)))
+            for start in range(0, len(ids), chunk_size)
+        ]
+        return ids, np.concatenate(scores)
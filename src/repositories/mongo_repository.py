@@ -1,52 +1,261 @@
 # mongo_repository.py - Dependency Inversion: Implement interface
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pymongo import MongoClient
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError, DuplicateKeyError
+import logging
+import mimetypes
 import os
+import threading
+import time
 import uuid
-import shutil
-from typing import Dict, Any, List
+from collections import OrderedDict
+from typing import Dict, Any, List, Iterator, Optional
 from ..interfaces import IPredictionRepository, ILocationService
+from .blob_store import BlobStore
+from .outbreak_rollups import (
+    OutbreakRollups, ROLLUP_SOURCE_PROJECTION, PREDICTED, insert_deltas, delete_deltas, review_deltas
+)
+from ..metrics import metrics
+from ..config import CLASS_NAMES
+
+# Every list query filters on these keys and pages by _id, so each has a
+# compound index ending in _id (keyset pagination never sorts in memory)
+REPORT_INDEXES = [
+    ([("status", ASCENDING), ("_id", ASCENDING)], {}),
+    ([("stored_filename", ASCENDING)], {}),
+    ([("classificationId", ASCENDING)], {}),
+    ([("blob_hash", ASCENDING)], {}),
+    ([("location_info.city", ASCENDING), ("_id", ASCENDING)], {}),
+    ([("location_info.country", ASCENDING), ("_id", ASCENDING)], {})
+]
+
+# Fields an admin list screen needs; excludes features and bulky user data
+REPORT_SUMMARY_PROJECTION = {
+    "classificationId": 1, "stored_filename": 1, "prediction": 1, "confidence": 1,
+    "status": 1, "timestamp": 1, "barangay": 1, "crop": 1, "fullName": 1,
+    "location_info": 1, "approved_class": 1, "model_version": 1
+}
+
+DEFAULT_PAGE_SIZE = 100
+
+# Admin review actions and the status each one sets
+REVIEW_ACTIONS = {"approve": "approved", "reject": "rejected"}
+
+# Applied to a report whose background image write failed: it holds no blob
+# reference, and image reads and review filing see that there is no file
+IMAGE_MISSING_UPDATE = {"$set": {"image_missing": True}, "$unset": {"file_path": "", "blob_hash": ""}}
+
+# Images whose features were stored recently, remembered for prediction-cache hits
+BLOB_FEATURES_CACHE_SIZE = 4096
 
 class MongoRepository(IPredictionRepository):
     """MongoDB implementation of prediction repository with file system storage"""
     
-    def __init__(self, connection_string: str, database_name: str, location_service: ILocationService):
+    def __init__(self, connection_string: str, database_name: str, location_service: ILocationService,
+                 feature_store=None, blob_store: BlobStore = None, thumbnailer=None):
         self.client = MongoClient(connection_string)
         self.db = self.client[database_name]
         self.collection = self.db["reports"]
+        self.blobs = self.db["blobs"]  # {_id: sha256, refs: n, path, deleting: set while the file is removed}
+        # Per day/barangay/crop/class counters, kept in step with every insert and review
+        self.rollups = OutbreakRollups(self.db["report_rollups"])
         self.location_service = location_service
+        self.feature_store = feature_store
+        
+        # Images are stored once per distinct content, sharded by hash
+        self.blob_store = blob_store or BlobStore(os.path.join("storage", "blobs"))
+        # Grid thumbnails are generated when the blob is first written
+        self.thumbnailer = thumbnailer
+        
+        # Image files are written off the request thread
+        self.logger = logging.getLogger("MongoRepository")
+        self._writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-writer")
+        # Reports whose image write failed before their insert landed
+        self._image_failures = set()
+        self._image_lock = threading.Lock()
+        # Features of reports not inserted yet, appended to the store once they are
+        self._pending_features: Dict[Any, tuple] = {}
+        # blob hash -> classificationId of the latest report whose features were stored (LRU)
+        self._blob_features: OrderedDict = OrderedDict()
+        self._features_lock = threading.Lock()
         
-        # Create file storage directories
-        self.storage_dir = os.path.join("storage", "images")
-        os.makedirs(self.storage_dir, exist_ok=True)
+        self.ensure_indexes()
     
-    def save_prediction(self, file_bytes: bytes, filename: str, 
-                       prediction: str, confidence: float, 
-                       user_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Save prediction with file system storage"""
+    def ensure_indexes(self):
+        """Create the indexes the query methods rely on (no-op if present)"""
+        for keys, options in REPORT_INDEXES:
+            try:
+                self.collection.create_index(keys, **options)
+            except PyMongoError as e:
+                self.logger.warning(f"Could not create index {keys}: {e}")
+        self.rollups.ensure_indexes()
+    
+    def _add_blob_ref(self, digest: str, path: str, wait: float = 5.0):
+        """Count one more reference, waiting out a release that is deleting the file"""
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                # While "deleting" is set the filter misses and the upsert collides on _id
+                self.blobs.update_one(
+                    {"_id": digest, "deleting": {"$exists": False}},
+                    {"$inc": {"refs": 1}, "$setOnInsert": {"path": path}},
+                    upsert=True
+                )
+                return
+            except DuplicateKeyError:
+                if time.monotonic() >= deadline:
+                    # The releasing process died half-way; take the record over
+                    self.logger.warning(f"Blob {digest} was stuck in deletion; reclaiming it")
+                    self.blobs.update_one({"_id": digest}, {"$unset": {"deleting": ""}, "$inc": {"refs": 1}})
+                    return
+                time.sleep(0.02)
+    
+    def _store_blob(self, digest: str, file_bytes: bytes) -> bool:
+        """Count one more reference and write the bytes if they are new; False if the write failed"""
+        path = self.blob_store.path_for(digest)
+        self._add_blob_ref(digest, path)
+        try:
+            with metrics.timer("blob_write"):
+                written = self.blob_store.write(digest, file_bytes)
+        except OSError as e:
+            self.logger.error(f"Failed to store image {path}: {e}")
+            return False
+        if written and self.thumbnailer is not None:
+            self.thumbnailer.create_default(path, file_bytes)
+        return True
+    
+    def _release_blob(self, digest: str, path: str):
+        """Drop one reference; delete the file once nobody points at it"""
+        blob = self.blobs.find_one_and_update(
+            {"_id": digest}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            self.blob_store.remove(path)  # never counted
+            return
+        if blob["refs"] > 0:
+            return
+        # Claim the deletion: _store_blob waits until the record is gone instead
+        # of counting a reference to a file that is about to disappear
+        claimed = self.blobs.find_one_and_update(
+            {"_id": digest, "refs": {"$lte": 0}, "deleting": {"$exists": False}}, {"$set": {"deleting": True}}
+        )
+        if claimed is None:
+            return  # re-referenced in the meantime, or another release is deleting it
+        # Blobs written before paths dropped the extension live under the recorded path
+        for blob_path in {path, claimed.get("path"), self.blob_store.path_for(digest)}:
+            if blob_path:
+                self.blob_store.remove(blob_path)
+        self.blobs.delete_one({"_id": digest, "deleting": True})
+    
+    def _write_image(self, report_id, digest: str, file_bytes: bytes):
+        """Background write of a new report's image; a failure is recorded on the report"""
+        try:
+            if self._store_blob(digest, file_bytes):
+                return
+            self._release_blob(digest, self.blob_store.path_for(digest))
+        except PyMongoError as e:
+            # Nothing waits on this executor task, so the error would otherwise vanish
+            self.logger.error(f"Image of report {report_id} not stored, blob {digest} bookkeeping failed: {e}")
+        metrics.increment("image_write_failures")
+        self._mark_image_missing(report_id)
+    
+    def _mark_image_missing(self, report_id):
+        with self._image_lock:
+            try:
+                matched = self.collection.update_one({"_id": report_id}, IMAGE_MISSING_UPDATE).matched_count
+            except PyMongoError as e:
+                self.logger.error(f"Could not mark the image of report {report_id} missing: {e}")
+                matched = 0
+            if not matched:
+                self._image_failures.add(report_id)  # not inserted yet; see _take_image_failures
+    
+    def _take_image_failures(self, report_ids: List[Any]) -> List[Any]:
+        """Ids among just-inserted reports whose image write had already failed"""
+        with self._image_lock:
+            failed = [report_id for report_id in report_ids if report_id in self._image_failures]
+            self._image_failures.difference_update(failed)
+        return failed
+    
+    def _record_image_failures(self, report_ids: List[Any]):
+        failed = self._take_image_failures(report_ids)
+        if failed:
+            self.collection.update_many({"_id": {"$in": failed}}, IMAGE_MISSING_UPDATE)
+    
+    @staticmethod
+    def _image_path(doc: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Path of a report's image (reads never move files; see migrate_legacy_files)"""
+        return doc.get('file_path') if doc else None
+    
+    def migrate_legacy_files(self) -> int:
+        """Move every pre-blob-store image into the blob store; returns the count.
+        
+        Run it explicitly (``python -m src.repositories.mongo_repository``);
+        serving a legacy image reads it in place, so concurrent requests
+        cannot count one file twice.
+        """
+        migrated = 0
+        for doc in self.iter_reports({"blob_hash": {"$exists": False}, "file_path": {"$exists": True}}, {"file_path": 1}):
+            legacy_path = doc.get('file_path')
+            file_bytes = self.blob_store.read(legacy_path)
+            if file_bytes is None:
+                continue
+            digest = self.blob_store.digest(file_bytes)
+            if not self._store_blob(digest, file_bytes):
+                self._release_blob(digest, self.blob_store.path_for(digest))
+                continue
+            moved = self.collection.update_one(
+                {"_id": doc["_id"], "blob_hash": {"$exists": False}},
+                {"$set": {"blob_hash": digest, "file_path": self.blob_store.path_for(digest)}}
+            ).modified_count
+            if moved:
+                self.blob_store.remove(legacy_path)
+                migrated += 1
+            else:
+                self._release_blob(digest, self.blob_store.path_for(digest))  # migrated concurrently
+        return migrated
+    
+    def _build_document(self, file_bytes: bytes, filename: str,
+                        prediction: str, confidence: float,
+                        user_data: Dict[str, Any], features=None,
+                        client_ip: str = None, model_version: str = None):
+        """Start the image write and assemble the report document, ``_id`` included (no database write).
+        
+        Returns the document and whether its location still has to be resolved.
+        """
         # Generate unique filename to avoid conflicts
         file_ext = os.path.splitext(filename)[1]
         unique_filename = f"{uuid.uuid4().hex}{file_ext}"
         
-        # Save file to disk
-        file_path = os.path.join(self.storage_dir, unique_filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_bytes)
+        # The id is final now, so a failed background write can be recorded on the report
+        report_id = ObjectId()
+        
+        # Identical photos share one content-addressed file, written in the background
+        blob_hash = self.blob_store.digest(file_bytes)
+        file_path = self.blob_store.path_for(blob_hash)
+        self._writer.submit(self._write_image, report_id, blob_hash, file_bytes)
         
-        # Get location metadata
-        location_info = self.location_service.get_location()
+        # Get location metadata from cache; on a miss it is filled in after insert
+        cached_location = self.location_service.peek_location(client_ip)
+        location_info = cached_location if cached_location is not None else {
+            'latitude': None, 'longitude': None, 'city': None, 'country': None
+        }
         
         # Generate unique classification ID
         classification_id = str(uuid.uuid4())
         
         # Build document (store file path instead of GridFS file_id)
         doc = {
+            "_id": report_id,
             "classificationId": classification_id,  # Add missing classificationId
             "filename": filename,
             "stored_filename": unique_filename,
             "file_path": file_path,
+            "blob_hash": blob_hash,
             "prediction": prediction,
             "confidence": float(confidence),
+            "model_version": model_version,  # which model scored it, for audits and re-scoring
             "status": "pending",
             "reviewed_by": None,
             "timestamp": datetime.utcnow(),
@@ -56,34 +265,206 @@ class MongoRepository(IPredictionRepository):
         if user_data:
             doc.update(user_data)
         
-        result = self.collection.insert_one(doc)
+        # Keep the VGG19 features so the archive can be re-scored without the CNN
+        if self.feature_store is not None and features is None:
+            # Prediction-cache hits carry no features; reuse those of an earlier upload of the same bytes
+            features = self._features_of_blob(blob_hash)
+        if self.feature_store is not None and features is not None:
+            with self._features_lock:
+                self._pending_features[report_id] = (classification_id, blob_hash, features)
+        
+        return doc, cached_location is None
+    
+    def _features_of_blob(self, blob_hash: str):
+        """Stored features of a recent report with the same image, or None (no database query)"""
+        with self._features_lock:
+            classification_id = self._blob_features.get(blob_hash)
+            if classification_id is not None:
+                self._blob_features.move_to_end(blob_hash)
+        return None if classification_id is None else self.feature_store.get(classification_id)
+    
+    def _store_features(self, report_ids: List[Any]):
+        """Append the held features of reports whose insert has landed"""
+        for classification_id, blob_hash, features in self._take_features(report_ids):
+            try:
+                with metrics.timer("feature_append"):
+                    self.feature_store.append(classification_id, features)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Could not store features of {classification_id}: {e}")
+                continue
+            with self._features_lock:
+                self._blob_features[blob_hash] = classification_id
+                self._blob_features.move_to_end(blob_hash)
+                if len(self._blob_features) > BLOB_FEATURES_CACHE_SIZE:
+                    self._blob_features.popitem(last=False)
+    
+    def _take_features(self, report_ids: List[Any]) -> List[tuple]:
+        """Forget held features (their report landed, or will never land)"""
+        with self._features_lock:
+            return [self._pending_features.pop(report_id) for report_id in report_ids
+                    if report_id in self._pending_features]
+    
+    def _resolve_location_later(self, report_id, client_ip: str = None):
+        """Fill in location_info once a geocoder answers"""
+        self.location_service.resolve_async(client_ip, callback=lambda info: self._set_location(report_id, info))
+    
+    def _set_location(self, report_id, location_info: Dict[str, Any]):
+        self.collection.update_one({"_id": report_id}, {"$set": {"location_info": location_info}})
+    
+    def save_prediction(self, file_bytes: bytes, filename: str, 
+                       prediction: str, confidence: float, 
+                       user_data: Dict[str, Any], features=None,
+                       client_ip: str = None, model_version: str = None) -> Dict[str, Any]:
+        """Save prediction with file system storage"""
+        doc, location_pending = self._build_document(
+            file_bytes, filename, prediction, confidence, user_data, features, client_ip, model_version
+        )
+        
+        try:
+            with metrics.timer("mongo_insert"):
+                result = self.collection.insert_one(doc)
+        except PyMongoError:
+            self._take_features([doc["_id"]])
+            raise
+        self.rollups.apply(insert_deltas([doc]))
+        self._store_features([result.inserted_id])
+        self._record_image_failures([result.inserted_id])
+        
+        if location_pending:
+            self._resolve_location_later(result.inserted_id, client_ip)
         
         return {
             "inserted_id": result.inserted_id,
-            "location_info": location_info,
-            "file_path": file_path
+            "location_info": doc["location_info"],
+            "file_path": doc["file_path"]
         }
     
+    def save_predictions(self, entries: List[Dict[str, Any]], user_data: Dict[str, Any],
+                         client_ip: str = None) -> List[Dict[str, Any]]:
+        """Save a batch of predictions that share one farmer and location.
+        
+        Each entry holds file_bytes, filename, prediction, confidence and
+        optionally features and model_version. All reports go to Mongo in one insert_many and
+        a location miss is geocoded once for the whole batch.
+        """
+        docs, location_pending = [], False
+        for entry in entries:
+            doc, pending = self._build_document(
+                entry["file_bytes"], entry["filename"], entry["prediction"], entry["confidence"],
+                user_data, entry.get("features"), client_ip, entry.get("model_version")
+            )
+            docs.append(doc)
+            location_pending = location_pending or pending
+        
+        failed = self._insert_documents(docs)
+        
+        saved_ids = [doc["_id"] for i, doc in enumerate(docs) if i not in failed]
+        if location_pending and saved_ids:
+            self.location_service.resolve_async(client_ip, callback=lambda info: self._set_locations(saved_ids, info))
+        
+        return [
+            {"error": failed[i]} if i in failed else {
+                "inserted_id": doc["_id"],
+                "location_info": doc["location_info"],
+                "file_path": doc["file_path"]
+            }
+            for i, doc in enumerate(docs)
+        ]
+    
+    def _insert_documents(self, docs: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Bulk insert; returns {index: error message} for documents that failed"""
+        if not docs:
+            return {}
+        try:
+            with metrics.timer("mongo_bulk_insert"):
+                self.collection.insert_many(docs, ordered=False)
+            failed = {}
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "Insert failed") for err in e.details.get("writeErrors", [])}
+        except PyMongoError as e:
+            self.logger.error(f"Bulk insert of {len(docs)} reports failed: {e}")
+            self._take_image_failures([doc["_id"] for doc in docs])
+            self._take_features([doc["_id"] for doc in docs])
+            return {i: str(e) for i in range(len(docs))}
+        self.rollups.apply(insert_deltas(doc for i, doc in enumerate(docs) if i not in failed))
+        self._take_features([doc["_id"] for i, doc in enumerate(docs) if i in failed])
+        self._store_features([doc["_id"] for i, doc in enumerate(docs) if i not in failed])
+        self._record_image_failures([doc["_id"] for doc in docs])
+        return failed
+    
+    def _set_locations(self, report_ids: List[Any], location_info: Dict[str, Any]):
+        self.collection.update_many({"_id": {"$in": report_ids}}, {"$set": {"location_info": location_info}})
+    
     def update_status(self, report_id: str, status: str, reviewer: str = None):
         """Update prediction status"""
-        self.collection.update_one(
+        before = self.collection.find_one_and_update(
             {"_id": report_id},
-            {"$set": {"status": status, "reviewed_by": reviewer}}
+            {"$set": {"status": status, "reviewed_by": reviewer}},
+            projection=ROLLUP_SOURCE_PROJECTION, return_document=ReturnDocument.BEFORE
         )
+        if before is not None:
+            self.rollups.apply(review_deltas([(before, status, before.get("approved_class"))]))
     
-    def fetch_pending(self) -> List[Dict[str, Any]]:
-        """Fetch pending predictions"""
-        return list(self.collection.find({"status": "pending"}))
-    
-    def fetch_by_location(self, city: str = None, country: str = None) -> List[Dict[str, Any]]:
-        """Fetch predictions by location"""
+    @staticmethod
+    def _location_query(city: str = None, country: str = None) -> Dict[str, Any]:
         query = {}
         if city:
             query['location_info.city'] = city
         if country:
             query['location_info.country'] = country
+        return query
+    
+    def iter_reports(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                     after_id: str = None, limit: int = 0, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Stream matching reports in _id order straight from the cursor.
         
-        return list(self.collection.find(query))
+        ``after_id`` is the last _id of the previous page (keyset
+        pagination); ``limit=0`` streams everything in ``batch_size`` chunks.
+        """
+        if after_id:
+            query = {**query, "_id": {"$gt": ObjectId(after_id)}}
+        cursor = self.collection.find(query, projection).sort("_id", ASCENDING).batch_size(batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+    
+    def fetch_pending(self, limit: int = 0, after_id: str = None,
+                      projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch pending predictions; every full document by default, or one page with
+        limit=DEFAULT_PAGE_SIZE, after_id and projection=REPORT_SUMMARY_PROJECTION"""
+        return list(self.iter_reports({"status": "pending"}, projection, after_id, limit))
+    
+    def fetch_by_location(self, city: str = None, country: str = None, limit: int = 0,
+                          after_id: str = None, projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch predictions by location (paged the same way as fetch_pending)"""
+        query = self._location_query(city, country)
+        return list(self.iter_reports(query, projection, after_id, limit))
+    
+    @classmethod
+    def planned_queries(cls) -> Dict[str, tuple]:
+        """(filter, sort) of every list/lookup query, by name; each must be served by REPORT_INDEXES"""
+        return {
+            "fetch_pending": ({"status": "pending"}, [("_id", ASCENDING)]),
+            "fetch_by_city": (cls._location_query(city="x"), [("_id", ASCENDING)]),
+            "fetch_by_country": (cls._location_query(country="x"), [("_id", ASCENDING)]),
+            "fetch_by_city_country": (cls._location_query("x", "x"), [("_id", ASCENDING)]),
+            "by_stored_filename": ({"stored_filename": "x"}, None),
+            "by_classification_id": ({"classificationId": "x"}, None),
+            "by_blob_hash": ({"blob_hash": "x"}, None)
+        }
+    
+    def explain_queries(self) -> Dict[str, List[str]]:
+        """Winning-plan stages of every planned query (used to catch COLLSCANs)"""
+        plans = {}
+        for name, (query, sort) in self.planned_queries().items():
+            cursor = self.collection.find(query).limit(DEFAULT_PAGE_SIZE)
+            if sort:
+                cursor = cursor.sort(sort)
+            plans[name] = _plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+        return plans
     
     def update_status_by_filename(self, filename: str, status: str, label: str = None):
         """Update status by filename (for admin approval)"""
@@ -91,41 +472,171 @@ class MongoRepository(IPredictionRepository):
         if label:
             update_data["approved_class"] = label
             
-        self.collection.update_one(
+        before = self.collection.find_one_and_update(
             {"stored_filename": filename},  # Use stored_filename instead of filename
-            {"$set": update_data}
+            {"$set": update_data},
+            projection=ROLLUP_SOURCE_PROJECTION, return_document=ReturnDocument.BEFORE
         )
+        if before is not None:
+            self.rollups.apply(review_deltas([(before, status, label or before.get("approved_class"))]))
+    
+    def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        """Apply approve/reject decisions with one lookup and one bulk_write.
+        
+        Each decision is {"filename": stored_filename, "action": "approve" or
+        "reject", "label": class (approve only)}. Returns one outcome per
+        decision, in order: the new status plus the image ``file_path``, or
+        an ``error``.
+        """
+        found = {doc["stored_filename"]: doc for doc in self.collection.find(
+            {"stored_filename": {"$in": [decision.get("filename") for decision in decisions]}},
+            {"stored_filename": 1, "file_path": 1, **ROLLUP_SOURCE_PROJECTION}
+        )}
+        updates, positions, outcomes = plan_review(decisions, found, reviewer)
+        if updates:
+            try:
+                with metrics.timer("mongo_bulk_review"):
+                    self.collection.bulk_write([UpdateOne(query, update) for query, update in updates], ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    position = positions[err["index"]]
+                    outcomes[position] = {"filename": outcomes[position]["filename"],
+                                          "error": err.get("errmsg", "Update failed")}
+            except PyMongoError as e:
+                self.logger.error(f"Bulk review of {len(updates)} reports failed: {e}")
+                for position in positions:
+                    outcomes[position] = {"filename": outcomes[position]["filename"], "error": str(e)}
+        self.rollups.apply(review_deltas(reviewed_changes(outcomes, found)))
+        return outcomes
+    
+    def outbreak_summary(self, start_day: str, end_day: str, group_by: List[str], basis: str = PREDICTED,
+                         barangay: str = None, crop: str = None, label: str = None) -> Dict[str, Any]:
+        """Report counts over a day window from the rollup buckets (never scans reports)"""
+        return self.rollups.summary(start_day, end_day, group_by, basis, barangay, crop, label)
+    
+    def get_image(self, report_id: str) -> Optional[Dict[str, str]]:
+        """Path, content hash and MIME type of a report's image, or None (for streaming from disk)"""
+        if not ObjectId.is_valid(report_id):
+            return None
+        doc = self.collection.find_one({"_id": ObjectId(report_id)}, {"file_path": 1, "blob_hash": 1, "filename": 1})
+        path = self._image_path(doc)
+        if not path or not os.path.exists(path):
+            return None
+        return image_info(doc, self.blob_store)
+    
+    def get_report(self, report_id: str, projection: Optional[Dict[str, Any]] = REPORT_SUMMARY_PROJECTION):
+        """One report by _id, or None"""
+        if not ObjectId.is_valid(report_id):
+            return None
+        return self.collection.find_one({"_id": ObjectId(report_id)}, projection)
+    
+    def fetch_by_classification_ids(self, classification_ids: List[str],
+                                    projection: Optional[Dict[str, Any]] = REPORT_SUMMARY_PROJECTION) -> Dict[str, Dict[str, Any]]:
+        """Reports keyed by classificationId (one indexed $in query; missing ids are left out)"""
+        cursor = self.collection.find({"classificationId": {"$in": list(classification_ids)}}, projection)
+        return {doc["classificationId"]: doc for doc in cursor}
     
     def get_file_by_id(self, prediction_id: str) -> bytes:
         """Retrieve file from disk by prediction ID"""
-        from bson import ObjectId
-        doc = self.collection.find_one({"_id": ObjectId(prediction_id)})
-        if doc and 'file_path' in doc and os.path.exists(doc['file_path']):
-            with open(doc['file_path'], 'rb') as f:
-                return f.read()
-        return None
+        doc = self.collection.find_one({"_id": ObjectId(prediction_id)}, {"file_path": 1, "blob_hash": 1})
+        return self.blob_store.read(self._image_path(doc))
     
     def get_file_by_stored_filename(self, stored_filename: str) -> bytes:
         """Retrieve file from disk by stored filename"""
-        doc = self.collection.find_one({"stored_filename": stored_filename})
-        if doc and 'file_path' in doc and os.path.exists(doc['file_path']):
-            with open(doc['file_path'], 'rb') as f:
-                return f.read()
-        return None
+        doc = self.collection.find_one({"stored_filename": stored_filename}, {"file_path": 1, "blob_hash": 1})
+        return self.blob_store.read(self._image_path(doc))
     
     def delete_file(self, prediction_id: str) -> bool:
-        """Delete file from disk and remove document"""
-        from bson import ObjectId
-        doc = self.collection.find_one({"_id": ObjectId(prediction_id)})
+        """Release the image and remove the document"""
+        doc = self.collection.find_one({"_id": ObjectId(prediction_id)},
+                                       {"file_path": 1, "blob_hash": 1, **ROLLUP_SOURCE_PROJECTION})
         if doc:
-            # Delete file from disk
-            if 'file_path' in doc and os.path.exists(doc['file_path']):
-                try:
-                    os.remove(doc['file_path'])
-                except OSError:
-                    pass  # File might already be deleted
-            
             # Delete document from MongoDB
             result = self.collection.delete_one({"_id": ObjectId(prediction_id)})
+            if result.deleted_count:
+                self.rollups.apply(delete_deltas([doc]))
+            
+            # Shared blobs are only removed with their last reference
+            if doc.get('blob_hash'):
+                self._release_blob(doc['blob_hash'], doc['file_path'])
+            elif 'file_path' in doc:
+                self.blob_store.remove(doc['file_path'])  # legacy flat file
             return result.deleted_count > 0
         return False
+
+def image_info(doc: Dict[str, Any], blob_store: BlobStore) -> Dict[str, Optional[str]]:
+    """What report_image needs; blob files have no extension, so the type comes from the upload's name"""
+    path = doc["file_path"]
+    return {"path": path, "digest": doc.get("blob_hash") or blob_store.digest_of(path),
+            "mimetype": mimetypes.guess_type(doc.get("filename") or path)[0]}
+
+def plan_review(decisions: List[Dict[str, Any]], found: Dict[str, Dict[str, Any]],
+                reviewer: str = None):
+    """Validate review decisions against the reports that exist.
+    
+    Returns the (query, update) pairs to bulk-write, the decision index of
+    each pair, and one outcome per decision (errors already filled in).
+    """
+    updates, positions, outcomes, seen = [], [], [], set()
+    reviewed_at = datetime.utcnow()
+    for i, decision in enumerate(decisions):
+        filename = decision.get("filename")
+        action = decision.get("action")
+        label = decision.get("label")
+        error = None
+        if not isinstance(filename, str) or not filename:
+            error = "filename is required"
+        elif filename in seen:
+            error = "Duplicate decision for this file"
+        elif action not in REVIEW_ACTIONS:
+            error = f"action must be one of {sorted(REVIEW_ACTIONS)}"
+        elif action == "approve" and label not in CLASS_NAMES:
+            error = f"label must be one of {CLASS_NAMES}"
+        elif filename not in found:
+            error = "Report not found"
+        if error:
+            outcomes.append({"filename": filename, "error": error})
+            continue
+        
+        seen.add(filename)
+        status = REVIEW_ACTIONS[action]
+        label = label if action == "approve" else None
+        updates.append(({"stored_filename": filename}, {"$set": {
+            "status": status, "approved_class": label, "reviewed_by": reviewer, "reviewed_at": reviewed_at
+        }}))
+        positions.append(i)
+        outcomes.append({"filename": filename, "status": status, "label": label,
+                         "file_path": found[filename].get("file_path")})
+    return updates, positions, outcomes
+
+def reviewed_changes(outcomes: List[Dict[str, Any]], found: Dict[str, Dict[str, Any]]):
+    """(report before review, new status, new label) for every decision that was applied"""
+    return [(found[outcome["filename"]], outcome["status"], outcome["label"])
+            for outcome in outcomes if "error" not in outcome]
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten an explain() plan tree into its stage names"""
+    stages = [plan.get("stage", "?")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
+    
+    parser = argparse.ArgumentParser(description="Move pre-blob-store report images into the blob store")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default=os.getenv("DB_NAME"))
+    parser.add_argument("--blob-dir", default=os.getenv("BLOB_STORE_DIR", os.path.join("storage", "blobs")))
+    args = parser.parse_args()
+    
+    repository = MongoRepository(args.mongo_uri, args.db, location_service=None, blob_store=BlobStore(args.blob_dir))
+    print(f"Migrated {repository.migrate_legacy_files()} images")
+
+if __name__ == "__main__":
+    main()
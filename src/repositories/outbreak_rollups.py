@@ -0,0 +1,268 @@
+# outbreak_rollups.py - Single Responsibility: Pre-aggregated report counts for outbreak dashboards
+"""
+One counter document per (day, barangay, crop, basis, label):
+
+* basis "predicted": label is the model's prediction; ``reports`` counts
+  every report and ``pending``/``approved``/``rejected`` its review status.
+* basis "approved": label is the admin-confirmed class; ``reports`` counts
+  approved reports only.
+
+Counters are ``$inc``-ed in the same code paths that insert or review
+reports, so a dashboard reads O(buckets) documents instead of scanning
+``reports``. Days are UTC dates of the report's ``timestamp``. The counts
+can drift if a write fails half-way or two admins review the same report
+at once; rebuild them from the raw reports with
+
+    python -m src.repositories.outbreak_rollups
+
+Pause the upload and review workers while it runs: ``$inc`` writes that
+land between the aggregation and the swap would be lost, so the rebuild
+aborts (and leaves the live counters alone) if it sees any.
+"""
+import argparse
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+from ..metrics import metrics
+
+PREDICTED = "predicted"
+APPROVED = "approved"
+BASES = (PREDICTED, APPROVED)
+GROUP_FIELDS = ("day", "barangay", "crop", "label")
+COUNTERS = ("reports", "pending", "approved", "rejected")
+
+# Report fields the counters are derived from
+ROLLUP_SOURCE_PROJECTION = {"timestamp": 1, "barangay": 1, "crop": 1, "prediction": 1, "status": 1, "approved_class": 1}
+
+ROLLUP_INDEXES = [
+    ([("day", ASCENDING), ("barangay", ASCENDING), ("crop", ASCENDING), ("basis", ASCENDING), ("label", ASCENDING)],
+     {"unique": True})
+]
+
+BucketKey = Tuple[Optional[str], Optional[str], Optional[str], str, Optional[str]]
+
+
+def report_day(doc: Dict[str, Any]) -> Optional[str]:
+    timestamp = doc.get("timestamp")
+    return timestamp.strftime("%Y-%m-%d") if isinstance(timestamp, datetime) else None
+
+
+def _key(doc: Dict[str, Any], basis: str, label: Optional[str]) -> BucketKey:
+    return report_day(doc), doc.get("barangay"), doc.get("crop"), basis, label
+
+
+def insert_deltas(docs: Iterable[Dict[str, Any]]) -> Dict[BucketKey, Dict[str, int]]:
+    """Counter increments for newly inserted reports"""
+    deltas: Dict[BucketKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+        bucket = deltas[_key(doc, PREDICTED, doc.get("prediction"))]
+        bucket["reports"] += 1
+        bucket[doc.get("status") or "pending"] += 1
+        if doc.get("status") == APPROVED:
+            deltas[_key(doc, APPROVED, doc.get("approved_class"))]["reports"] += 1
+    return deltas
+
+
+def delete_deltas(docs: Iterable[Dict[str, Any]]) -> Dict[BucketKey, Dict[str, int]]:
+    """Counter decrements for removed reports"""
+    return {key: {field: -n for field, n in fields.items()} for key, fields in insert_deltas(docs).items()}
+
+
+def review_deltas(changes: Iterable[Tuple[Dict[str, Any], str, Optional[str]]]) -> Dict[BucketKey, Dict[str, int]]:
+    """Counter moves for ``(report before the update, new status, new approved_class)`` triples"""
+    deltas: Dict[BucketKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for before, status, label in changes:
+        old_status = before.get("status") or "pending"
+        if old_status != status:
+            bucket = deltas[_key(before, PREDICTED, before.get("prediction"))]
+            bucket[old_status] -= 1
+            bucket[status] += 1
+        if old_status == APPROVED:
+            deltas[_key(before, APPROVED, before.get("approved_class"))]["reports"] -= 1
+        if status == APPROVED:
+            deltas[_key(before, APPROVED, label)]["reports"] += 1
+    return deltas
+
+
+def rollup_updates(deltas: Dict[BucketKey, Dict[str, int]]) -> List[UpdateOne]:
+    """One upserting $inc per touched bucket (zero moves are dropped)"""
+    updates = []
+    for (day, barangay, crop, basis, label), fields in deltas.items():
+        increments = {field: n for field, n in fields.items() if n}
+        if increments:
+            query = {"day": day, "barangay": barangay, "crop": crop, "basis": basis, "label": label}
+            updates.append(UpdateOne(query, {"$inc": increments}, upsert=True))
+    return updates
+
+
+def parse_window(start: str = None, end: str = None, days: int = None, default_days: int = 30,
+                 max_days: int = 366) -> Tuple[str, str]:
+    """Inclusive ``(from, to)`` UTC days; raises ValueError on bad input"""
+    end_date = datetime.strptime(end, "%Y-%m-%d") if end else datetime.utcnow()
+    if start:
+        start_date = datetime.strptime(start, "%Y-%m-%d")
+    else:
+        start_date = end_date - timedelta(days=(days or default_days) - 1)
+    if start_date > end_date:
+        raise ValueError("from must not be after to")
+    if (end_date - start_date).days + 1 > max_days:
+        raise ValueError(f"Window is limited to {max_days} days")
+    return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+
+def parse_summary_query(params, default_days: int = 30, max_days: int = 366) -> Dict[str, Any]:
+    """Keyword arguments for ``outbreak_summary`` from ``?from=&to=&days=&group_by=&basis=&barangay=&crop=&class=``"""
+    days = params.get("days")
+    if days is not None and (not days.isdigit() or int(days) < 1):
+        raise ValueError("days must be a positive integer")
+    start_day, end_day = parse_window(params.get("from"), params.get("to"), int(days) if days else None,
+                                      default_days, max_days)
+    group_by = [field.strip() for field in params.get("group_by", "day,barangay,label").split(",") if field.strip()]
+    unknown = [field for field in group_by if field not in GROUP_FIELDS]
+    if unknown:
+        raise ValueError(f"group_by must be a subset of {list(GROUP_FIELDS)}")
+    basis = params.get("basis", PREDICTED)
+    if basis not in BASES:
+        raise ValueError(f"basis must be one of {list(BASES)}")
+    return {"start_day": start_day, "end_day": end_day, "group_by": group_by, "basis": basis,
+            "barangay": params.get("barangay"), "crop": params.get("crop"), "label": params.get("class")}
+
+
+def bucket_query(start_day: str, end_day: str, basis: str = PREDICTED, barangay: str = None,
+                 crop: str = None, label: str = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"day": {"$gte": start_day, "$lte": end_day}, "basis": basis}
+    for field, value in (("barangay", barangay), ("crop", crop), ("label", label)):
+        if value:
+            query[field] = value
+    return query
+
+
+def summarise(buckets: Iterable[Dict[str, Any]], group_by: List[str]) -> Dict[str, Any]:
+    """Fold bucket documents into per-group and overall counter totals"""
+    groups: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    totals = dict.fromkeys(COUNTERS, 0)
+    scanned = 0
+    for bucket in buckets:
+        scanned += 1
+        group = groups[tuple(bucket.get(field) for field in group_by)]
+        for counter in COUNTERS:
+            group[counter] += bucket.get(counter, 0)
+            totals[counter] += bucket.get(counter, 0)
+    rows = [{**dict(zip(group_by, key)), **counts} for key, counts in groups.items() if counts["reports"]]
+    rows.sort(key=lambda row: [str(row[field]) for field in group_by])
+    return {"groups": rows, "totals": totals, "buckets_scanned": scanned}
+
+
+class RollupsChangedError(Exception):
+    """Raised when counters were written while a rebuild was computing"""
+
+
+class OutbreakRollups:
+    """Counter collection next to ``reports`` (pymongo; AsyncMongoRepository reuses the helpers above)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.logger = logging.getLogger("OutbreakRollups")
+
+    def ensure_indexes(self):
+        for keys, options in ROLLUP_INDEXES:
+            try:
+                self.collection.create_index(keys, **options)
+            except PyMongoError as e:
+                self.logger.warning(f"Could not create index {keys}: {e}")
+
+    def apply(self, deltas: Dict[BucketKey, Dict[str, int]]):
+        """Write counter changes; failures are logged, not raised (a rebuild repairs them)"""
+        updates = rollup_updates(deltas)
+        if not updates:
+            return
+        try:
+            with metrics.timer("mongo_rollups"):
+                self.collection.bulk_write(updates, ordered=False)
+        except PyMongoError as e:
+            self.logger.error(f"Rollup update of {len(updates)} buckets failed: {e}")
+
+    def summary(self, start_day: str, end_day: str, group_by: List[str], basis: str = PREDICTED,
+                barangay: str = None, crop: str = None, label: str = None) -> Dict[str, Any]:
+        """Counter totals over a day window, grouped by any of GROUP_FIELDS"""
+        query = bucket_query(start_day, end_day, basis, barangay, crop, label)
+        return summarise(self.collection.find(query, {"_id": 0}), group_by)
+
+    def _totals(self) -> Dict[str, Dict[str, int]]:
+        """Every counter summed per basis; any concurrent $inc changes it"""
+        rows = self.collection.aggregate([
+            {"$group": {"_id": "$basis", **{counter: {"$sum": f"${counter}"} for counter in COUNTERS}}}
+        ])
+        return {row["_id"]: {counter: row[counter] for counter in COUNTERS} for row in rows}
+
+    def rebuild(self, reports) -> int:
+        """Recompute every bucket from ``reports`` server-side and swap the result in; returns buckets written.
+
+        Writers must be paused: the aggregation is not a snapshot, and counters
+        $inc-ed on the live collection before the swap are replaced. If the live
+        totals moved meanwhile, the staged result is dropped and
+        RollupsChangedError is raised instead.
+        """
+        before = self._totals()
+        day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+        group_key = {"day": day, "barangay": "$barangay", "crop": "$crop"}
+        buckets: Dict[BucketKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        predicted = reports.aggregate([
+            {"$group": {"_id": {**group_key, "label": "$prediction", "status": "$status"}, "n": {"$sum": 1}}}
+        ], allowDiskUse=True)
+        for row in predicted:
+            key = row["_id"]
+            bucket = buckets[(key.get("day"), key.get("barangay"), key.get("crop"), PREDICTED, key.get("label"))]
+            bucket["reports"] += row["n"]
+            bucket[key.get("status") or "pending"] += row["n"]
+        approved = reports.aggregate([
+            {"$match": {"status": APPROVED}},
+            {"$group": {"_id": {**group_key, "label": "$approved_class"}, "n": {"$sum": 1}}}
+        ], allowDiskUse=True)
+        for row in approved:
+            key = row["_id"]
+            buckets[(key.get("day"), key.get("barangay"), key.get("crop"), APPROVED, key.get("label"))]["reports"] += row["n"]
+
+        staging = self.collection.database[f"{self.collection.name}_rebuild"]
+        staging.drop()
+        docs = [{"day": d, "barangay": b, "crop": c, "basis": basis, "label": label, **counts}
+                for (d, b, c, basis, label), counts in buckets.items()]
+        if docs:
+            staging.insert_many(docs, ordered=False)
+        # Checked as late as possible; a write after this point is still lost
+        if self._totals() != before:
+            staging.drop()
+            raise RollupsChangedError("Rollups were updated during the rebuild; pause writers and run it again")
+        if docs:
+            # rename replaces the live collection in one step, so readers never see a partial rebuild
+            staging.rename(self.collection.name, dropTarget=True)
+        else:
+            self.collection.delete_many({})
+        self.ensure_indexes()
+        return len(docs)
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
+
+    parser = argparse.ArgumentParser(description="Recompute the outbreak rollups from the raw reports (pause uploads and reviews first)")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default=os.getenv("DB_NAME"))
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.db]
+    try:
+        written = OutbreakRollups(db["report_rollups"]).rebuild(db["reports"])
+    except RollupsChangedError as e:
+        raise SystemExit(str(e))
+    print(f"Rebuilt {written} rollup buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# write_behind_repository.py - Buffered persistence: acknowledge now, insert in batches
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Any, List
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from .mongo_repository import MongoRepository, IMAGE_MISSING_UPDATE
+from .outbreak_rollups import insert_deltas
+from ..metrics import metrics
+
+# Queue item kinds
+INSERT = "insert"
+UPDATE = "update"
+
+
+class WriteBehindRepository(MongoRepository):
+    """MongoRepository whose report inserts are buffered and flushed in bulk.
+
+    ``save_prediction`` assigns ``_id`` client-side, queues the document
+    and returns immediately. A flusher thread writes the queue with
+    ``insert_many(ordered=False)`` whenever ``batch_size`` documents are
+    waiting or ``flush_interval`` seconds have passed. Location updates
+    go through the same queue so they land after their insert, and
+    features reach the feature store only once their insert has landed.
+
+    When the queue is full, callers wait up to ``block_timeout`` seconds
+    (backpressure) and then spill to an append-only journal, which is
+    replayed once the queue drains and again on the next start. Once an
+    insert is in the journal, later updates of that report are journaled
+    behind it too, so they cannot run first and match nothing.
+    Everything still queued is flushed by ``close()`` (run at exit).
+    """
+    
+    def __init__(self, connection_string: str, database_name: str, location_service,
+                 feature_store=None, blob_store=None, thumbnailer=None, max_queue: int = 1000,
+                 batch_size: int = 100, flush_interval: float = 0.5, block_timeout: float = 0.5,
+                 journal_path: str = None):
+        super().__init__(connection_string, database_name, location_service, feature_store, blob_store, thumbnailer)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.journal_path = journal_path
+        self.logger = logging.getLogger("WriteBehindRepository")
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._journal_lock = threading.Lock()
+        self._spilled_ids = set()  # reports whose insert waits in the journal (guarded by _journal_lock)
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "inserted": 0, "updated": 0, "batches": 0, "spilled": 0, "replayed": 0, "errors": 0}
+        self._closed = False
+        self._stopping = False
+        
+        if journal_path:
+            os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+        
+        self._flusher = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    # ---- request path ----
+    
+    def save_prediction(self, file_bytes: bytes, filename: str, 
+                       prediction: str, confidence: float, 
+                       user_data: Dict[str, Any], features=None,
+                       client_ip: str = None, model_version: str = None) -> Dict[str, Any]:
+        """Queue the report; the returned id is final even before the insert"""
+        doc, location_pending = self._build_document(
+            file_bytes, filename, prediction, confidence, user_data, features, client_ip, model_version
+        )
+        self._enqueue((INSERT, doc))
+        
+        if location_pending:
+            self._resolve_location_later(doc["_id"], client_ip)
+        
+        return {
+            "inserted_id": doc["_id"],
+            "location_info": doc["location_info"],
+            "file_path": doc["file_path"]
+        }
+    
+    def _insert_documents(self, docs: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Queue the batch; the flusher folds it into its next insert_many"""
+        for doc in docs:
+            self._enqueue((INSERT, doc))
+        return {}
+    
+    def _set_location(self, report_id, location_info: Dict[str, Any]):
+        self._enqueue((UPDATE, {"_id": report_id}, {"$set": {"location_info": location_info}}))
+    
+    def _set_locations(self, report_ids: List[Any], location_info: Dict[str, Any]):
+        for report_id in report_ids:
+            self._set_location(report_id, location_info)
+    
+    def _mark_image_missing(self, report_id):
+        """Queued behind the report's insert, like location updates"""
+        self._enqueue((UPDATE, {"_id": report_id}, IMAGE_MISSING_UPDATE))
+    
+    def review_many(self, decisions: List[Dict[str, Any]], reviewer: str = None) -> List[Dict[str, Any]]:
+        """Write queued reports first so freshly uploaded ones can be reviewed"""
+        self.flush(timeout=5)
+        return super().review_many(decisions, reviewer)
+    
+    def _enqueue(self, item):
+        if item[0] == UPDATE and self._follows_spilled_insert(item):
+            self._spill([item])
+            return
+        if self._closed:
+            # After shutdown nothing drains the queue; write through instead
+            self._write([item])
+            return
+        try:
+            if self.journal_path:
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put(item)
+        except queue.Full:
+            self._spill([item])
+            return
+        with self._stats_lock:
+            self._stats["queued"] += 1
+    
+    # ---- journal ----
+    
+    def _follows_spilled_insert(self, item: tuple) -> bool:
+        with self._journal_lock:
+            return item[1].get("_id") in self._spilled_ids
+    
+    def _spill(self, items: List[tuple]):
+        """Append items to the local journal (one extended-JSON line each)"""
+        if not self.journal_path:
+            self.logger.error(f"Dropping {len(items)} report writes: no journal configured")
+            self._take_features([item[1]["_id"] for item in items if item[0] == INSERT])
+            with self._stats_lock:
+                self._stats["errors"] += len(items)
+            return
+        with self._journal_lock:
+            with open(self.journal_path, "a") as f:
+                for item in items:
+                    f.write(json_util.dumps(list(item)) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._spilled_ids.update(item[1]["_id"] for item in items if item[0] == INSERT)
+        with self._stats_lock:
+            self._stats["spilled"] += len(items)
+    
+    def _replay_journal(self):
+        """Write spilled items back once the queue has room"""
+        if not self.journal_path:
+            return
+        replay_path = f"{self.journal_path}.replaying"
+        with self._journal_lock:
+            # A replay cut short (crash, or failed writes) left its file behind; finish it first
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.journal_path):
+                    return
+                os.replace(self.journal_path, replay_path)
+        with open(replay_path, "r") as f:
+            items = [tuple(json_util.loads(line)) for line in f if line.strip()]
+        with self._journal_lock:
+            # Updates from now on can be queued; a write that fails below spills (and marks) its insert again
+            self._spilled_ids.difference_update(item[1]["_id"] for item in items if item[0] == INSERT)
+        # Journal order puts every update after its insert; _write applies a batch's inserts first
+        for start in range(0, len(items), self.batch_size):
+            self._write(items[start:start + self.batch_size])
+        os.remove(replay_path)
+        with self._stats_lock:
+            self._stats["replayed"] += len(items)
+    
+    # ---- flusher ----
+    
+    def _collect(self) -> List[tuple]:
+        """Wait for a full batch or the flush interval, whichever comes first"""
+        items = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size and not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.task_done()
+                self._stopping = True
+                break
+            items.append(item)
+        return items
+    
+    def _run(self):
+        try:
+            self._replay_journal()
+        except Exception as e:
+            self.logger.error(f"Journal replay failed: {e}")
+        
+        while True:
+            items = self._collect()
+            if items:
+                with metrics.timer("write_behind_flush"):
+                    self._write(items)
+                for _ in items:
+                    self._queue.task_done()
+            elif self._stopping:
+                return
+            elif self._queue.empty():
+                try:
+                    self._replay_journal()
+                except Exception as e:
+                    self.logger.error(f"Journal replay failed: {e}")
+    
+    def _write(self, items: List[tuple]):
+        """Inserts first (unordered bulk), then the updates that depend on them.
+
+        Only what did not land is spilled: a failed update batch never sends
+        inserts that already landed back to the journal.
+        """
+        docs = [item[1] for item in items if item[0] == INSERT]
+        pending_updates = [item for item in items if item[0] == UPDATE]
+        inserted = 0
+        if docs:
+            try:
+                inserted = len(self.collection.insert_many(docs, ordered=False).inserted_ids)
+                landed = docs
+            except BulkWriteError as e:
+                # Duplicate keys mean a replayed document already landed (and was counted)
+                write_errors = e.details.get("writeErrors", [])
+                errors = [err for err in write_errors if err.get("code") != 11000]
+                inserted = e.details.get("nInserted", 0)
+                rejected = {err["index"] for err in write_errors}
+                landed = [doc for i, doc in enumerate(docs) if i not in rejected]
+                if errors:
+                    failed = {err["index"] for err in errors}
+                    # Their updates would match nothing now; journal them behind the inserts
+                    failed_ids = {docs[i]["_id"] for i in failed}
+                    deferred = [item for item in pending_updates if item[1].get("_id") in failed_ids]
+                    self._write_failed(f"{len(failed)} inserts were rejected", len(failed))
+                    self._spill([(INSERT, docs[i]) for i in sorted(failed)] + deferred)
+                    pending_updates = [item for item in pending_updates if item[1].get("_id") not in failed_ids]
+            except PyMongoError as e:
+                # Which inserts landed is unknown; replaying them skips the duplicates
+                self._write_failed(f"insert of {len(docs)} reports failed ({e})", len(items))
+                self._spill(items)
+                return
+            self._store_features([doc["_id"] for doc in landed])
+            try:
+                self.rollups.apply(insert_deltas(landed))
+            except Exception as e:
+                self.logger.error(f"Rollups of {len(landed)} reports not applied (a rebuild repairs them): {e}")
+        
+        updated = 0
+        if pending_updates:
+            try:
+                self.collection.bulk_write([UpdateOne(item[1], item[2]) for item in pending_updates], ordered=False)
+                updated = len(pending_updates)
+            except PyMongoError as e:
+                # Every update is a $set, so re-applying the ones that did succeed is harmless
+                self._write_failed(f"{len(pending_updates)} updates failed ({e})", len(pending_updates))
+                self._spill(pending_updates)
+        with self._stats_lock:
+            self._stats["inserted"] += inserted
+            self._stats["updated"] += updated
+            self._stats["batches"] += 1
+    
+    def _write_failed(self, what: str, spilled: int):
+        self.logger.error(f"Write-behind flush: {what}, spilling {spilled} items")
+        with self._stats_lock:
+            self._stats["errors"] += 1
+    
+    # ---- lifecycle ----
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything queued so far has been written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def close(self, timeout: float = 30):
+        """Drain the queue and stop the flusher"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._flusher.join(timeout)
+        
+        # Anything that slipped in behind the stop signal
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        leftover = [item for item in leftover if item is not None]
+        if leftover:
+            self._write(leftover)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {**self._stats, "queue_depth": self._queue.qsize()}
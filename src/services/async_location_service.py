@@ -0,0 +1,98 @@
+# async_location_service.py - Single Responsibility: Resolve locations on the event loop
+import asyncio
+from typing import Dict, Optional
+import httpx
+from .location_service import LocationService, EMPTY_LOCATION
+from ..metrics import metrics
+
+
+class AsyncLocationService(LocationService):
+    """LocationService whose cache misses are geocoded with httpx on the event loop.
+
+    Caching, TTLs and per-key de-duplication are inherited. Once ``bind()``
+    has been called from the running loop, background refreshes become
+    coroutines on that loop instead of blocking a resolver thread per
+    lookup; until then (or from other processes) the thread path is used.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_geocoders = [self._ipinfo, self._ip_api]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Resolve on ``loop`` from now on (call from the ASGI startup hook)"""
+        self._loop = loop
+        self._client = httpx.AsyncClient(timeout=self.provider_timeout)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._loop = self._client = None
+
+    async def _ipinfo(self, query: str) -> Optional[Dict[str, any]]:
+        url = "https://ipinfo.io/json" if query == "me" else f"https://ipinfo.io/{query}/json"
+        data = (await self._client.get(url)).json()
+        if "loc" not in data:
+            return None
+        latitude, longitude = (float(part) for part in data["loc"].split(","))
+        return {"latitude": latitude, "longitude": longitude, "city": data.get("city"), "country": data.get("country")}
+
+    async def _ip_api(self, query: str) -> Optional[Dict[str, any]]:
+        url = "http://ip-api.com/json/" if query == "me" else f"http://ip-api.com/json/{query}"
+        data = (await self._client.get(url)).json()
+        if data.get("status") != "success":
+            return None
+        return {"latitude": data["lat"], "longitude": data["lon"], "city": data.get("city"),
+                "country": data.get("countryCode")}
+
+    async def _resolve_on_loop(self, client_ip: str = None) -> Dict[str, any]:
+        """Try each async geocoder in turn within the overall time budget"""
+        query = self._query_for(client_ip)
+        deadline = self._loop.time() + self.budget_seconds
+        for geocoder_func in self.async_geocoders:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                with metrics.timer("geocoder_attempt"):
+                    location_info = await asyncio.wait_for(
+                        geocoder_func(query), timeout=min(self.provider_timeout, remaining)
+                    )
+                if location_info:
+                    self.logger.info(f"Location found: {location_info['city']}, {location_info['country']}")
+                    return location_info
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._stats["provider_timeouts"] += 1
+                self.logger.warning("Geocoder attempt timed out")
+            except Exception as e:
+                self.logger.warning(f"Geocoder attempt failed: {e}")
+        return dict(EMPTY_LOCATION)
+
+    async def _refresh_on_loop(self, cache_key: str, client_ip: str = None):
+        with metrics.timer("geocode"):
+            location_info = await self._resolve_on_loop(client_ip)
+        return self._complete(cache_key, location_info)
+
+    def _schedule_refresh(self, cache_key: str, client_ip: str = None):
+        if self._loop is None or self._loop.is_closed():
+            return super()._schedule_refresh(cache_key, client_ip)
+        # Safe from the loop itself and from executor threads alike
+        asyncio.run_coroutine_threadsafe(self._refresh_on_loop(cache_key, client_ip), self._loop)
+
+    async def get_location_async(self, client_ip: str = None) -> Dict[str, any]:
+        """Cached location, or wait (without blocking the loop) for one resolution"""
+        cached = self.peek_location(client_ip)
+        if cached is not None:
+            return cached
+        future = asyncio.get_running_loop().create_future()
+
+        def deliver(location_info):
+            future.get_loop().call_soon_threadsafe(
+                lambda: future.done() or future.set_result(dict(location_info))
+            )
+
+        self.resolve_async(client_ip, callback=deliver)
+        return await future
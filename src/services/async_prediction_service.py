@@ -0,0 +1,135 @@
+# async_prediction_service.py - Single Responsibility: Prediction workflow for the ASGI app
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Any, List
+from .prediction_service import PredictionService
+from ..metrics import metrics
+
+
+class InferenceBusyError(Exception):
+    """Raised when the inference executor already has its maximum of pending work"""
+
+
+class AsyncPredictionService(PredictionService):
+    """PredictionService whose workflow is a coroutine.
+
+    Decoding and the forward pass are CPU-bound, so they run on a bounded
+    thread pool (where they still share the BatchScheduler with every other
+    request); at most ``max_pending`` calls may wait for that pool before
+    new requests are refused with ``InferenceBusyError``. Saving goes
+    through the async repository, so the event loop never blocks on Mongo.
+    """
+
+    def __init__(self, predictor, repository, async_repository, cache=None,
+                 inference_threads: int = 32, max_pending: int = 256):
+        super().__init__(predictor, repository, cache)
+        self.async_repository = async_repository
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=inference_threads, thread_name_prefix="asgi-inference")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    async def _run_inference(self, fn, *args):
+        """Run ``fn`` on the inference pool, refusing work beyond ``max_pending``"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise InferenceBusyError(f"{self.max_pending} inference calls are already pending")
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @staticmethod
+    async def _read(file) -> SimpleNamespace:
+        """Buffer an UploadFile once"""
+        with metrics.timer("upload_read"):
+            file_bytes = await file.read()
+        file_ext = os.path.splitext(file.filename or "")[1]
+        return SimpleNamespace(original=file.filename, filename=f"{uuid.uuid4().hex}{file_ext}", file_bytes=file_bytes)
+
+    async def process_prediction(self, file, user_data: Dict[str, Any], client_ip: str = None) -> Dict[str, Any]:
+        """Process a prediction request (``file`` is a Starlette UploadFile)"""
+        upload = await self._read(file)
+
+        with metrics.timer("predict"):
+            prediction_result = await self._run_inference(self._predict, upload.filename, upload.file_bytes)
+        features = prediction_result.pop("features", None)
+
+        with metrics.timer("save"):
+            save_result = await self.async_repository.save_prediction(
+                file_bytes=upload.file_bytes,
+                filename=upload.filename,
+                prediction=prediction_result["prediction"],
+                confidence=prediction_result["confidence"],
+                user_data=user_data,
+                features=features,
+                client_ip=client_ip,
+                model_version=prediction_result.get("model_version")
+            )
+
+        return {
+            **prediction_result,
+            "id": str(save_result["inserted_id"]),
+            "location_info": save_result["location_info"]
+        }
+
+    async def process_batch(self, files: List[Any], user_data: Dict[str, Any], client_ip: str = None) -> List[Dict[str, Any]]:
+        """Coroutine version of PredictionService.process_batch"""
+        uploads = [await self._read(file) for file in files]
+
+        results: List[Any] = [None] * len(uploads)
+        to_predict = []
+        for i, upload in enumerate(uploads):
+            upload.cache_key = self._cache_key(upload.file_bytes) if self.cache is not None else None
+            cached = self._cached(upload.filename, upload.cache_key) if upload.cache_key else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                to_predict.append(i)
+
+        with metrics.timer("predict_many"):
+            predicted = await self._run_inference(
+                self.predictor.predict_many, [(uploads[i].file_bytes, uploads[i].filename) for i in to_predict]
+            )
+        for i, prediction_result in zip(to_predict, predicted):
+            if isinstance(prediction_result, Exception):
+                results[i] = {"error": str(prediction_result)}
+            else:
+                if uploads[i].cache_key:
+                    self._remember(uploads[i].cache_key, prediction_result)
+                results[i] = prediction_result
+
+        scored = [i for i, result in enumerate(results) if "error" not in result]
+        entries = [{
+            "file_bytes": uploads[i].file_bytes,
+            "filename": uploads[i].filename,
+            "prediction": results[i]["prediction"],
+            "confidence": results[i]["confidence"],
+            "features": results[i].pop("features", None),
+            "model_version": results[i].get("model_version")
+        } for i in scored]
+        with metrics.timer("save_many"):
+            saved = await self.async_repository.save_predictions(entries, user_data, client_ip) if entries else []
+        for i, save_result in zip(scored, saved):
+            if "error" in save_result:
+                results[i] = {"error": f"Save failed: {save_result['error']}"}
+            else:
+                results[i] = {
+                    **results[i],
+                    "id": str(save_result["inserted_id"]),
+                    "location_info": save_result["location_info"]
+                }
+
+        return [{"upload": upload.original, **result} for upload, result in zip(uploads, results)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending, "rejected": self._rejected}
@@ -1,6 +1,19 @@
 # file_manager.py - Single Responsibility: Handle file operations
 import os
+import shutil
 from ..interfaces import IFileManager
+from ..metrics import metrics
+
+
+def link_or_copy(source: str, destination: str):
+    """Hardlink when possible (same filesystem), otherwise fall back to a copy"""
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
 
 class FileManager(IFileManager):
     """Service for file management operations"""
@@ -17,7 +30,7 @@ class FileManager(IFileManager):
     
     def read_file_bytes(self, file_path: str) -> bytes:
         """Read file as bytes"""
-        with open(file_path, 'rb') as f:
+        with metrics.timer("read_file_bytes"), open(file_path, 'rb') as f:
             return f.read()
     
     def file_exists(self, file_path: str) -> bool:
@@ -26,5 +39,8 @@ class FileManager(IFileManager):
     
     def move_file(self, source: str, destination: str):
         """Move file from source to destination"""
-        import shutil
         shutil.move(source, destination)
+    
+    def link_file(self, source: str, destination: str):
+        """Expose a stored file in another folder without duplicating its bytes"""
+        link_or_copy(source, destination)
@@ -0,0 +1,365 @@
+# job_queue.py - Single Responsibility: Run uploads as durable background jobs
+import ipaddress
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, List
+from urllib.parse import urlsplit
+
+import requests
+
+# Job states; "done" and "failed" are terminal
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Fields returned by GET /jobs/<id>
+PUBLIC_FIELDS = ("id", "status", "filename", "created_at", "started_at", "finished_at", "result", "error")
+
+
+class QueueFullError(Exception):
+    """Raised when the pending-job limit is reached"""
+
+
+class CallbackNotAllowedError(Exception):
+    """Raised for a callback URL outside the allowed hosts or on a non-public address"""
+
+
+def check_callback_url(url: str, allowed_hosts: List[str]):
+    """Refuse URLs that would let a client make the server call internal addresses.
+
+    The host must be in ``allowed_hosts`` ("*" allows any) and every address
+    it resolves to must be globally routable, which excludes private,
+    loopback, link-local (cloud metadata) and reserved ranges.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise CallbackNotAllowedError("callbackUrl must be an http(s) URL")
+    if not allowed_hosts:
+        raise CallbackNotAllowedError("Callbacks are disabled on this server")
+    if "*" not in allowed_hosts and host not in allowed_hosts:
+        raise CallbackNotAllowedError(f"callbackUrl host {host} is not allowed")
+    try:
+        addresses = {info[4][0].split("%")[0] for info in socket.getaddrinfo(host, parts.port or None)}
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise CallbackNotAllowedError(f"callbackUrl host {host} does not resolve: {e}")
+    if any(not ipaddress.ip_address(address).is_global for address in addresses):
+        raise CallbackNotAllowedError(f"callbackUrl host {host} is not a public address")
+
+
+class SpooledUpload:
+    """File-like stand-in for a request upload, read back from the spool"""
+
+    def __init__(self, filename: str, path: str):
+        self.filename = filename
+        self.path = path
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class JobQueue:
+    """Durable local queue for prediction jobs.
+
+    ``submit`` writes the upload and its metadata to ``spool_dir`` before
+    returning a job id, so queued jobs survive a restart (they are re-queued
+    on ``start``). Worker threads call ``process_fn(upload, user_data,
+    client_ip)``; the result is written next to the job, the upload is
+    deleted and an optional callback URL is POSTed the public job view.
+    Callbacks are limited to ``callback_hosts`` and public addresses (see
+    ``check_callback_url``) and are delivered on their own threads, so a
+    slow or dead endpoint never holds up a job worker.
+
+    Memory is bounded: at most ``max_pending`` jobs may wait, and finished
+    jobs are kept for ``retention_seconds`` up to ``max_retained`` entries
+    (oldest evicted first, together with their spool files). Eviction runs
+    on every submit and every finished job.
+    """
+
+    def __init__(self, process_fn: Callable, spool_dir: str, workers: int = 2, max_pending: int = 1000,
+                 retention_seconds: float = 3600, max_retained: int = 10000, callback_timeout: float = 5.0,
+                 callback_hosts: List[str] = None, callback_workers: int = 2):
+        self.process_fn = process_fn
+        self.spool_dir = spool_dir
+        self.workers = max(1, int(workers))
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.max_retained = max_retained
+        self.callback_timeout = callback_timeout
+        self.callback_hosts = list(callback_hosts or [])
+        self.logger = logging.getLogger("JobQueue")
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._finished: "OrderedDict[str, float]" = OrderedDict()  # job id -> finished_at, oldest first
+        self._pending = 0  # queued jobs plus submits holding a slot while they spool
+        self._events: Dict[str, threading.Event] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._threads: List[threading.Thread] = []
+        self._callbacks = ThreadPoolExecutor(max_workers=max(1, int(callback_workers)),
+                                             thread_name_prefix="job-callback")
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "recovered": 0,
+                       "callbacks_failed": 0}
+        os.makedirs(spool_dir, exist_ok=True)
+
+    # ----- spool files -----
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _upload_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.upload")
+
+    def _write_meta(self, job: Dict[str, Any]):
+        """Atomically persist the job record"""
+        path = self._meta_path(job["id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp_path, path)
+
+    def _remove_files(self, job_id: str):
+        for path in (self._meta_path(job_id), self._upload_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # ----- lifecycle -----
+
+    def start(self):
+        """Recover spooled jobs and start the workers (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            evicted = self._recover()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._remove_evicted(evicted)
+
+    def _recover(self) -> List[str]:
+        """Reload jobs left by a previous process: unfinished ones run again (caller holds the lock).
+
+        Returns the ids evicted meanwhile, whose files the caller removes.
+        """
+        records = []
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name)) as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Skipping unreadable job file {name}: {e}")
+
+        for job in sorted(records, key=lambda job: job["created_at"]):
+            if job["status"] in (QUEUED, RUNNING):
+                if not os.path.exists(self._upload_path(job["id"])):
+                    self._remove_files(job["id"])
+                    continue
+                job["status"] = QUEUED
+                self._jobs[job["id"]] = job
+                self._events[job["id"]] = threading.Event()
+                self._queue.put(job["id"])
+                self._pending += 1
+                self._stats["recovered"] += 1
+            else:
+                self._jobs[job["id"]] = job
+        finished = [job for job in self._jobs.values() if job["status"] in (DONE, FAILED)]
+        for job in sorted(finished, key=lambda job: job["finished_at"] or 0):
+            self._finished[job["id"]] = job["finished_at"] or 0
+        if self._stats["recovered"]:
+            self.logger.info(f"Re-queued {self._stats['recovered']} unfinished jobs")
+        return self._evict()
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call ``listener(job)`` after every job finishes"""
+        self._listeners.append(listener)
+
+    # ----- API -----
+
+    def submit(self, file, user_data: Dict[str, Any], client_ip: str = None,
+               callback_url: str = None) -> Dict[str, Any]:
+        """Spool an upload and queue it; returns the public job view.
+
+        Raises CallbackNotAllowedError for a callback URL that fails ``check_callback_url``.
+        """
+        if callback_url:
+            check_callback_url(callback_url, self.callback_hosts)
+        self.start()
+        with self._lock:
+            evicted = self._evict()
+            # Check and reserve together, so concurrent submits cannot both take the last slot
+            full = self._pending >= self.max_pending
+            if full:
+                self._stats["rejected"] += 1
+            else:
+                self._pending += 1
+        self._remove_evicted(evicted)
+        if full:
+            raise QueueFullError(f"{self.max_pending} jobs are already pending")
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": QUEUED,
+            "filename": file.filename,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "user_data": user_data,
+            "client_ip": client_ip,
+            "callback_url": callback_url
+        }
+        try:
+            # Upload first, then the record: a record always has its upload
+            with open(self._upload_path(job_id), "wb") as f:
+                f.write(file.read())
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_meta(job)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            self._remove_files(job_id)
+            raise
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._events[job_id] = threading.Event()
+            self._stats["submitted"] += 1
+        self._queue.put(job_id)
+        return self._public(job)
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Public view of a job; with ``wait`` > 0 block until it finishes or the wait ends"""
+        with self._lock:
+            event = self._events.get(job_id)
+        if wait > 0 and event is not None:
+            event.wait(wait)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job is not None else None
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {field: job.get(field) for field in PUBLIC_FIELDS}
+
+    # ----- workers -----
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._execute(job_id)
+            except Exception as e:
+                self.logger.error(f"Job {job_id} crashed the worker loop: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job_id: str):
+        with self._lock:
+            self._pending -= 1
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+        self._write_meta(job)
+
+        upload = SpooledUpload(job["filename"], self._upload_path(job_id))
+        try:
+            result = self.process_fn(upload, job["user_data"], job["client_ip"])
+            status, error = DONE, None
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {e}")
+            result, status, error = None, FAILED, str(e)
+
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            self._finished[job_id] = job["finished_at"]
+            self._stats["completed" if status == DONE else "failed"] += 1
+        self._write_meta(job)
+        try:
+            os.remove(self._upload_path(job_id))
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            event = self._events.pop(job_id, None)
+            evicted = self._evict()
+        self._remove_evicted(evicted)
+        if event is not None:
+            event.set()
+
+        for listener in self._listeners:
+            try:
+                listener(job)
+            except Exception as e:
+                self.logger.error(f"Job listener failed: {e}")
+        if job.get("callback_url"):
+            self._callbacks.submit(self._callback, job)
+
+    def _callback(self, job: Dict[str, Any], attempts: int = 3):
+        """POST the finished job to its callback URL, retrying with backoff (callback thread)"""
+        try:
+            # Again at delivery: the name may resolve elsewhere by now
+            check_callback_url(job["callback_url"], self.callback_hosts)
+        except CallbackNotAllowedError as e:
+            self.logger.warning(f"Callback for job {job['id']} refused: {e}")
+            attempts = 0
+        for attempt in range(attempts):
+            try:
+                # No redirects: a public endpoint could otherwise bounce the POST to an internal one
+                response = requests.post(job["callback_url"], json=self._public(job),
+                                         timeout=self.callback_timeout, allow_redirects=False)
+                if response.status_code < 500:
+                    return
+            except requests.RequestException as e:
+                self.logger.warning(f"Callback for job {job['id']} failed: {e}")
+            if attempt + 1 < attempts:
+                time.sleep(2 ** attempt)
+        with self._lock:
+            self._stats["callbacks_failed"] += 1
+
+    def _evict(self) -> List[str]:
+        """Drop finished jobs past the retention age or count (caller holds the lock).
+
+        Returns the evicted ids; the caller removes their files once it has
+        released the lock.
+        """
+        cutoff = time.time() - self.retention_seconds
+        evicted = []
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.max_retained and finished_at >= cutoff:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+            evicted.append(job_id)
+        return evicted
+
+    def _remove_evicted(self, job_ids: List[str]):
+        for job_id in job_ids:
+            self._remove_files(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and job counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["retained"] = len(self._jobs)
+        stats["pending"] = self._queue.qsize()
+        stats["workers"] = self.workers
+        return stats
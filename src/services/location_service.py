@@ -1,45 +1,205 @@
 # location_service.py - Single Responsibility: Handle location detection
-from typing import Dict, List, Callable
+import inspect
+import ipaddress
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Callable, Optional, Sequence, Union
 import geocoder
 from ..interfaces import ILocationService
+from ..metrics import metrics
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+EMPTY_LOCATION = {
+    'latitude': None,
+    'longitude': None,
+    'city': None,
+    'country': None
+}
+
+def parse_networks(specs: Sequence[str]) -> List[Network]:
+    """``["10.0.0.1", "172.16.0.0/12"]`` -> networks (for TRUSTED_PROXIES)"""
+    return [ipaddress.ip_network(spec.strip(), strict=False) for spec in specs if spec.strip()]
+
+
+def _in_networks(address: Optional[str], networks: Sequence[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address((address or "").strip())
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(peer: Optional[str], forwarded_for: Optional[str],
+                   trusted_proxies: Sequence[Network]) -> Optional[str]:
+    """The address a request came from.
+
+    X-Forwarded-For is client-controlled, so it is only believed when the
+    direct peer is a trusted proxy. The header is then read from the
+    right, skipping our own proxies, so a value the client prepended
+    itself is never used.
+    """
+    if not forwarded_for or not _in_networks(peer, trusted_proxies):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _in_networks(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
 
 class LocationService(ILocationService):
-    """Service for detecting user location"""
+    """Service for detecting user location.
+
+    Results are cached per address actually geocoded: the client's public
+    IP, or "me" (the server's own location) for private and unknown
+    clients. Stale entries are served immediately and refreshed in the
+    background; each geocoder gets a strict timeout within an overall
+    budget so a dead provider can't hold a request thread.
+    """
     
-    def __init__(self):
+    def __init__(self, ttl_seconds: float = 6 * 3600, negative_ttl_seconds: float = 300,
+                 provider_timeout: float = 1.5, budget_seconds: float = 3.0, max_entries: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.provider_timeout = provider_timeout
+        self.budget_seconds = budget_seconds
+        self.max_entries = max_entries
+        self.logger = logging.getLogger("LocationService")
+        
         self.geocoders: List[Callable] = [
-            lambda: geocoder.ip('me'),
-            lambda: geocoder.freegeoip('me'),
-            lambda: geocoder.ipinfo('me')
+            lambda query: geocoder.ip(query, timeout=self.provider_timeout),
+            lambda query: geocoder.freegeoip(query, timeout=self.provider_timeout),
+            lambda query: geocoder.ipinfo(query, timeout=self.provider_timeout)
         ]
+        
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._providers = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geocoder")
+        self._resolvers = ThreadPoolExecutor(max_workers=2, thread_name_prefix="location-resolver")
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "resolutions": 0, "provider_timeouts": 0}
     
-    def get_location(self) -> Dict[str, any]:
-        """Get location using multiple geocoding services as fallback"""
-        location_info = {
-            'latitude': None,
-            'longitude': None,
-            'city': None,
-            'country': None
-        }
+    @classmethod
+    def cache_key(cls, client_ip: str = None) -> str:
+        """Keyed by what is geocoded, so one client's result is never served for another"""
+        return f"ip:{cls._query_for(client_ip)}"
+    
+    @staticmethod
+    def _query_for(client_ip: str = None) -> str:
+        """Geocode the client's public IP; fall back to the server's own"""
+        try:
+            if client_ip and ipaddress.ip_address(client_ip).is_global:
+                return client_ip
+        except ValueError:
+            pass
+        return 'me'
+    
+    def _resolve(self, client_ip: str = None) -> Dict[str, any]:
+        """Try each geocoder in turn within the overall time budget"""
+        query = self._query_for(client_ip)
+        deadline = time.monotonic() + self.budget_seconds
         
-        for geocoder_func in self.geocoders:
+        for geocoder_func in list(self.geocoders):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                g = geocoder_func()
+                future = self._providers.submit(geocoder_func, query)
+                with metrics.timer("geocoder_attempt"):
+                    g = future.result(timeout=min(self.provider_timeout, remaining))
                 if g.ok and g.latlng:
-                    location_info = {
+                    self.logger.info(f"Location found: {g.city}, {g.country}")
+                    return {
                         'latitude': g.latlng[0],
                         'longitude': g.latlng[1],
                         'city': g.city,
                         'country': g.country
                     }
-                    print(f"Location found: {g.city}, {g.country}")
-                    break
+            except FutureTimeout:
+                with self._lock:
+                    self._stats["provider_timeouts"] += 1
+                self.logger.warning("Geocoder attempt timed out")
             except Exception as e:
-                print(f"Geocoder attempt failed: {e}")
-                continue
+                self.logger.warning(f"Geocoder attempt failed: {e}")
         
+        return dict(EMPTY_LOCATION)
+    
+    def _store(self, cache_key: str, location_info: Dict[str, any]):
+        ttl = self.ttl_seconds if location_info.get('latitude') is not None else self.negative_ttl_seconds
+        with self._lock:
+            self._cache[cache_key] = (time.monotonic(), ttl, location_info)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+    
+    def _refresh(self, cache_key: str, client_ip: str = None):
+        """Resolve once per key and notify everyone who asked meanwhile"""
+        with metrics.timer("geocode"):
+            location_info = self._resolve(client_ip)
+        return self._complete(cache_key, location_info)
+    
+    def _complete(self, cache_key: str, location_info: Dict[str, any]):
+        """Cache a resolved location and fire the callbacks waiting on it"""
+        self._store(cache_key, location_info)
+        with self._lock:
+            self._stats["resolutions"] += 1
+            callbacks = self._in_flight.pop(cache_key, [])
+        for callback in callbacks:
+            try:
+                callback(location_info)
+            except Exception as e:
+                self.logger.error(f"Location callback failed: {e}")
         return location_info
     
+    def resolve_async(self, client_ip: str = None, callback: Callable = None):
+        """Resolve in the background; callback(location_info) when done"""
+        cache_key = self.cache_key(client_ip)
+        with self._lock:
+            waiting = self._in_flight.get(cache_key)
+            if waiting is not None:
+                if callback:
+                    waiting.append(callback)
+                return
+            self._in_flight[cache_key] = [callback] if callback else []
+        self._schedule_refresh(cache_key, client_ip)
+    
+    def _schedule_refresh(self, cache_key: str, client_ip: str = None):
+        self._resolvers.submit(self._refresh, cache_key, client_ip)
+    
+    def peek_location(self, client_ip: str = None) -> Optional[Dict[str, any]]:
+        """Non-blocking cache lookup; stale entries trigger a background refresh"""
+        cache_key = self.cache_key(client_ip)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            stored_at, ttl, location_info = entry
+            stale = time.monotonic() - stored_at > ttl
+            self._stats["stale_hits" if stale else "hits"] += 1
+        if stale:
+            self.resolve_async(client_ip)
+        return dict(location_info)
+    
+    def get_location(self, client_ip: str = None) -> Dict[str, any]:
+        """Get location using multiple geocoding services as fallback"""
+        cached = self.peek_location(client_ip)
+        if cached is not None:
+            return cached
+        return dict(self._refresh(self.cache_key(client_ip), client_ip))
+    
     def add_geocoder(self, geocoder_func: Callable):
         """Open/Closed: Add new geocoders without modifying existing code"""
+        if not inspect.signature(geocoder_func).parameters:
+            # Older zero-argument geocoders always locate 'me'
+            original = geocoder_func
+            geocoder_func = lambda query: original()
         self.geocoders.append(geocoder_func)
+    
+    def stats(self) -> Dict[str, any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._cache), "in_flight": len(self._in_flight)}
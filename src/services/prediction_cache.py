@@ -0,0 +1,107 @@
+# prediction_cache.py - Single Responsibility: Remember results for repeat uploads
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class PredictionCache:
+    """Bounded LRU + TTL cache of prediction results keyed by content hash.
+
+    Entries live in memory; when ``disk_dir`` is set they are also written
+    as small JSON files so they survive restarts and are shared between
+    workers on the same host. Keys should include the model version.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value or None (expired entries count as misses)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._insert(key, entry)
+        return entry[1]
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a JSON-serialisable value"""
+        entry = (time.time(), value)
+        with self._lock:
+            self._insert(key, entry)
+        self._write_disk(key, entry)
+
+    def _insert(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        safe_key = key.replace(":", "_")
+        return os.path.join(self.disk_dir, f"{safe_key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - data["stored_at"] > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data["stored_at"], data["value"]
+
+    def _write_disk(self, key: str, entry: tuple):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"stored_at": entry[0], "value": entry[1]}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # The disk tier is best effort
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["disk_tier"] = bool(self.disk_dir)
+        return stats
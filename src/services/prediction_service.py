@@ -1,48 +1,157 @@
 # prediction_service.py - Single Responsibility: Handle prediction logic
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import hashlib
 import uuid
 import os
+from ..metrics import metrics
+from ..config import FAST_DECODE_ENABLED
+
+# Fields of a prediction result that are safe to reuse for identical bytes
+CACHED_FIELDS = ("prediction", "confidence", "probabilities", "model_version")
 
 class PredictionService:
     """Service responsible for handling prediction workflow"""
     
-    def __init__(self, predictor, file_manager, repository):
+    def __init__(self, predictor, repository, cache=None):
         self.predictor = predictor
-        self.file_manager = file_manager
         self.repository = repository
+        self.cache = cache
+    
+    def _cache_key(self, file_bytes: bytes) -> str:
+        """Content hash scoped to the model version and decode mode that would score it"""
+        model_version = getattr(self.predictor, "model_version", "unknown")
+        decode_mode = "fast" if FAST_DECODE_ENABLED else "full"  # reduced decodes give other pixels
+        return f"{model_version}:{decode_mode}:{hashlib.sha256(file_bytes).hexdigest()}"
+    
+    def _cached(self, filename: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        """A previous result for the same bytes, or None"""
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        metrics.increment("prediction_cache_lookups", result="miss" if cached is None else "hit")
+        if cached is None:
+            return None
+        return {
+            "filename": filename,
+            **cached,
+            "timestamp": datetime.utcnow().isoformat(),
+            "cached": True
+        }
     
-    def process_prediction(self, file, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _remember(self, cache_key: str, prediction_result: Dict[str, Any]):
+        if self.cache is not None:
+            self.cache.put(cache_key, {field: prediction_result.get(field) for field in CACHED_FIELDS})
+    
+    def _predict(self, filename: str, file_bytes: bytes) -> Dict[str, Any]:
+        """Run the predictor unless identical bytes were scored recently"""
+        if self.cache is None:
+            return self.predictor.predict_bytes(file_bytes, filename)
+        
+        cache_key = self._cache_key(file_bytes)
+        cached = self._cached(filename, cache_key)
+        if cached is not None:
+            return cached
+        
+        prediction_result = self.predictor.predict_bytes(file_bytes, filename)
+        self._remember(cache_key, prediction_result)
+        return prediction_result
+    
+    def process_prediction(self, file, user_data: Dict[str, Any], client_ip: str = None) -> Dict[str, Any]:
         """Process a prediction request"""
         # Generate unique filename
         file_ext = os.path.splitext(file.filename)[1]
         unique_filename = f"{uuid.uuid4().hex}{file_ext}"
         
-        # Save file temporarily
-        temp_path = self.file_manager.save_temp_file(file, unique_filename)
-        
-        try:
-            # Run prediction
-            prediction_result = self.predictor.predict(temp_path)
-            
-            # Read file bytes for storage
-            file_bytes = self.file_manager.read_file_bytes(temp_path)
-            
-            # Save to repository
+        # Read the upload once; the same buffer is decoded, hashed and stored
+        with metrics.timer("upload_read"):
+            file_bytes = file.read()
+        
+        # Run prediction (or reuse the result for a resent photo)
+        with metrics.timer("predict"):
+            prediction_result = self._predict(unique_filename, file_bytes)
+        features = prediction_result.pop("features", None)
+        
+        # Save to repository
+        with metrics.timer("save"):
             save_result = self.repository.save_prediction(
                 file_bytes=file_bytes,
                 filename=unique_filename,
                 prediction=prediction_result["prediction"],
                 confidence=prediction_result["confidence"],
-                user_data=user_data
+                user_data=user_data,
+                features=features,
+                client_ip=client_ip,
+                model_version=prediction_result.get("model_version")
             )
-            
-            return {
-                **prediction_result,
-                "id": str(save_result["inserted_id"]),
-                "location_info": save_result["location_info"]
-            }
-            
-        finally:
-            # Clean up temp file if needed
-            pass
+        
+        return {
+            **prediction_result,
+            "id": str(save_result["inserted_id"]),
+            "location_info": save_result["location_info"]
+        }
+    
+    def process_batch(self, files: List[Any], user_data: Dict[str, Any], client_ip: str = None) -> List[Dict[str, Any]]:
+        """Predict and store many uploads from one farmer.
+        
+        Images are decoded in parallel and scored in stacked batches; all
+        reports are saved with one bulk write. Returns one entry per file,
+        in upload order, with either the result or an ``error``.
+        """
+        uploads = []
+        for file in files:
+            file_ext = os.path.splitext(file.filename)[1]
+            uploads.append({
+                "original": file.filename,
+                "filename": f"{uuid.uuid4().hex}{file_ext}",
+                "file_bytes": file.read()
+            })
+        
+        # Reuse cached results; everything else goes to the predictor together
+        results: List[Optional[Dict[str, Any]]] = [None] * len(uploads)
+        to_predict = []
+        for i, upload in enumerate(uploads):
+            cache_key = self._cache_key(upload["file_bytes"]) if self.cache is not None else None
+            upload["cache_key"] = cache_key
+            cached = self._cached(upload["filename"], cache_key) if cache_key else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                to_predict.append(i)
+        
+        with metrics.timer("predict_many"):
+            predicted = self.predictor.predict_many(
+                [(uploads[i]["file_bytes"], uploads[i]["filename"]) for i in to_predict]
+            )
+        for i, prediction_result in zip(to_predict, predicted):
+            if isinstance(prediction_result, Exception):
+                results[i] = {"error": str(prediction_result)}
+            else:
+                if uploads[i]["cache_key"]:
+                    self._remember(uploads[i]["cache_key"], prediction_result)
+                results[i] = prediction_result
+        
+        # One bulk write for every successful prediction
+        scored = [i for i, result in enumerate(results) if "error" not in result]
+        entries = []
+        for i in scored:
+            entries.append({
+                "file_bytes": uploads[i]["file_bytes"],
+                "filename": uploads[i]["filename"],
+                "prediction": results[i]["prediction"],
+                "confidence": results[i]["confidence"],
+                "features": results[i].pop("features", None),
+                "model_version": results[i].get("model_version")
+            })
+        with metrics.timer("save_many"):
+            saved = self.repository.save_predictions(entries, user_data, client_ip) if entries else []
+        for i, save_result in zip(scored, saved):
+            if "error" in save_result:
+                results[i] = {"error": f"Save failed: {save_result['error']}"}
+            else:
+                results[i] = {
+                    **results[i],
+                    "id": str(save_result["inserted_id"]),
+                    "location_info": save_result["location_info"]
+                }
+        
+        return [{"upload": upload["original"], **result} for upload, result in zip(uploads, results)]
@@ -0,0 +1,166 @@
+# review_file_mover.py - Single Responsibility: File reviewed images off the request thread
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from ..interfaces import IFileManager
+
+
+class ReviewFileMover:
+    """Files reviewed images into the approved/rejected folders in the background.
+
+    Approved images go to ``approved_folder/<label>/<stored_filename>`` and
+    rejected ones to ``rejected_folder/<stored_filename>``. Images live in
+    the shared blob store, so they are linked rather than moved; a link
+    left by an earlier review of the same report is removed. Failures
+    (e.g. the blob writer has not finished yet) are retried with
+    exponential backoff up to ``retries`` times.
+
+    Every submission gets a sequence number. A filing (first try or retry)
+    is skipped once a newer review of the same report has been submitted,
+    so a delayed retry cannot put the image back in a stale folder.
+    """
+
+    def __init__(self, file_manager: IFileManager, approved_folder: str, rejected_folder: str,
+                 labels: List[str], workers: int = 1, retries: int = 5, retry_delay: float = 1.0):
+        self.file_manager = file_manager
+        self.approved_folder = approved_folder
+        self.rejected_folder = rejected_folder
+        self.labels = labels
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.logger = logging.getLogger("ReviewFileMover")
+
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._retrying = 0
+        self._sequence = itertools.count()
+        self._latest: Dict[str, List[int]] = {}  # filename -> [newest sequence, items still queued or retrying]
+        self._stats = {"queued": 0, "filed": 0, "retries": 0, "failed": 0, "superseded": 0}
+        self._failures: deque = deque(maxlen=20)
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"review-mover-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def destinations(self, filename: str) -> Dict[Optional[str], str]:
+        """Every place a review can put this report's image, keyed by label (None = rejected)"""
+        places = {label: os.path.join(self.approved_folder, label, filename) for label in self.labels}
+        places[None] = os.path.join(self.rejected_folder, filename)
+        return places
+
+    def submit(self, filename: str, source: str, status: str, label: str = None):
+        """Queue one reviewed image; returns immediately"""
+        self.start()
+        with self._lock:
+            self._stats["queued"] += 1
+            sequence = next(self._sequence)
+            latest = self._latest.setdefault(filename, [sequence, 0])
+            latest[0] = sequence
+            latest[1] += 1
+        self._queue.put({"filename": filename, "source": source, "status": status, "label": label,
+                         "attempt": 0, "sequence": sequence})
+
+    def submit_reviewed(self, outcomes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Queue the image of every successfully reviewed report; returns client-facing outcomes"""
+        public = []
+        for outcome in outcomes:
+            outcome = dict(outcome)
+            source = outcome.pop("file_path", None)
+            if "error" in outcome:
+                public.append(outcome)
+                continue
+            if source is None:
+                outcome["file"] = "missing"  # the upload's image write failed
+            else:
+                self.submit(outcome["filename"], source, outcome["status"], outcome["label"])
+                outcome["file"] = "queued"
+            public.append(outcome)
+        return public
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if self._superseded(item):
+                    self._done(item, "superseded")
+                else:
+                    self._file(item)
+                    self._done(item, "filed")
+            except Exception as e:
+                self._retry(item, e)
+            finally:
+                self._queue.task_done()
+
+    def _superseded(self, item: Dict[str, Any]) -> bool:
+        with self._lock:
+            return self._latest[item["filename"]][0] != item["sequence"]
+
+    def _done(self, item: Dict[str, Any], outcome: str):
+        """Count the item's final outcome and stop tracking the report once nothing of it is left"""
+        with self._lock:
+            self._stats[outcome] += 1
+            latest = self._latest[item["filename"]]
+            latest[1] -= 1
+            if latest[1] == 0:
+                del self._latest[item["filename"]]
+
+    def _file(self, item: Dict[str, Any]):
+        places = self.destinations(item["filename"])
+        target = places.pop(item["label"] if item["status"] == "approved" else None)
+        if not item["source"] or not self.file_manager.file_exists(item["source"]):
+            raise FileNotFoundError(f"Image {item['source']} is not stored (yet)")
+        self.file_manager.link_file(item["source"], target)
+        for stale in places.values():
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    def _retry(self, item: Dict[str, Any], error: Exception):
+        item["attempt"] += 1
+        if item["attempt"] > self.retries:
+            self.logger.error(f"Giving up filing {item['filename']}: {error}")
+            with self._lock:
+                self._failures.append({"filename": item["filename"], "error": str(error), "at": time.time()})
+            self._done(item, "failed")
+            return
+        delay = self.retry_delay * 2 ** (item["attempt"] - 1)
+        self.logger.warning(f"Filing {item['filename']} failed ({error}); retry {item['attempt']} in {delay:.1f}s")
+        with self._lock:
+            self._stats["retries"] += 1
+            self._retrying += 1
+        timer = threading.Timer(delay, self._requeue, args=(item,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, item: Dict[str, Any]):
+        self._queue.put(item)
+        with self._lock:
+            self._retrying -= 1
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until nothing is queued or waiting to be retried"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                idle = self._retrying == 0 and self._queue.unfinished_tasks == 0
+            if idle:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "pending": self._queue.qsize(), "retrying": self._retrying,
+                    "recent_failures": list(self._failures)}
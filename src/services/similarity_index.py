@@ -0,0 +1,292 @@
+# similarity_index.py - Single Responsibility: Nearest-neighbour search over stored VGG19 features
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..repositories.feature_store import FeatureStore
+from ..metrics import metrics
+
+
+class IndexNotReadyError(Exception):
+    """Raised while the index is still being built from the feature store"""
+
+
+class SimilarityIndex:
+    """In-process cosine k-NN index over every report's VGG19 features.
+
+    Vectors are L2-normalised and kept as one float16 matrix, so a search
+    is a batched matrix product plus ``argpartition``. Two optional
+    reductions for large archives:
+
+    * ``pca_dim``: project onto the top principal components (fitted on a
+      sample of the archive) before normalising, e.g. 4608 -> 256 dims.
+    * ``ivf_lists``: spherical k-means coarse quantiser; a search only
+      scores the rows of the ``n_probe`` closest lists (approximate).
+
+    Both are trained from the feature store at ``start()`` and retrained in
+    the background each time the archive doubles; until there are enough
+    rows to train on, search is exact over the raw features. New
+    predictions are added incrementally through the feature store listener.
+    """
+
+    def __init__(self, feature_store: FeatureStore, pca_dim: int = 0, ivf_lists: int = 0, n_probe: int = 8,
+                 train_sample: int = 20000, chunk_rows: int = 65536, seed: int = 0):
+        self.feature_store = feature_store
+        self.pca_dim = pca_dim
+        self.ivf_lists = ivf_lists
+        self.n_probe = n_probe
+        self.train_sample = train_sample
+        self.chunk_rows = chunk_rows
+        self.logger = logging.getLogger("SimilarityIndex")
+        self._rng = np.random.default_rng(seed)
+
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._rebuilding = False
+        self._state: Optional[Dict[str, Any]] = None
+        self._stats = {"adds": 0, "searches": 0, "builds": 0, "last_build_seconds": None}
+
+    # ----- building -----
+
+    def start(self):
+        """Build the index in the background (search raises IndexNotReadyError until done)"""
+        self.feature_store.add_listener(self.add)
+        self._rebuild_in_background()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self.rebuild, name="similarity-index", daemon=True).start()
+
+    def rebuild(self):
+        """Retrain the reductions and re-project every stored vector"""
+        started = time.monotonic()
+        try:
+            self.feature_store.refresh()  # rows appended by other processes
+            ids = self.feature_store.ids()
+            matrix = self.feature_store.matrix()[:len(ids)]
+            mean, components = self._fit_pca(matrix)
+            state = self._empty_state(mean, components)
+            for start in range(0, len(ids), self.chunk_rows):
+                block = self._project(matrix[start:start + self.chunk_rows], mean, components)
+                self._append(state, ids[start:start + self.chunk_rows], block)
+            self._fit_ivf(state)
+            state["retrain_at"] = max(2 * state["count"], self._min_train_rows()) if self.pca_dim or self.ivf_lists else None
+
+            with self._lock:
+                # Catch up with predictions stored while this build ran
+                all_ids = self.feature_store.ids()
+                for report_id in all_ids[len(ids):]:
+                    self._add_to(state, report_id, self.feature_store.get(report_id))
+                self._state = state
+                self._stats["builds"] += 1
+                self._stats["last_build_seconds"] = round(time.monotonic() - started, 3)
+            self._ready.set()
+            self.logger.info(f"Similarity index built over {state['count']} reports "
+                             f"({state['vectors'].shape[1]} dims) in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            self.logger.error(f"Similarity index build failed: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _fit_pca(self, matrix: np.ndarray):
+        if not self.pca_dim or matrix.shape[0] < 2 * self.pca_dim or matrix.shape[1] <= self.pca_dim:
+            return None, None
+        sample = self._sample_rows(matrix.shape[0])
+        data = matrix[sample].astype(np.float32)
+        mean = data.mean(axis=0)
+        _, _, vt = np.linalg.svd(data - mean, full_matrices=False)
+        return mean, np.ascontiguousarray(vt[:self.pca_dim].T)
+
+    def _fit_ivf(self, state: Dict[str, Any], iterations: int = 10):
+        count = state["count"]
+        # Roughly 40 training points per list keeps the centroids meaningful
+        if not self.ivf_lists or count < 40 * self.ivf_lists:
+            return
+        vectors = state["vectors"]
+        data = vectors[self._sample_rows(count)].astype(np.float32)
+        centroids = data[self._rng.choice(len(data), self.ivf_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(self.ivf_lists):
+                members = data[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        lists: List[List[int]] = [[] for _ in range(self.ivf_lists)]
+        for start in range(0, count, self.chunk_rows):
+            block = vectors[start:min(count, start + self.chunk_rows)].astype(np.float32)
+            for offset, c in enumerate(np.argmax(block @ centroids.T, axis=1)):
+                lists[c].append(start + offset)
+        state["centroids"] = centroids
+        state["lists"] = lists
+
+    def _min_train_rows(self) -> int:
+        return max(2 * self.pca_dim, 40 * self.ivf_lists)
+
+    def _sample_rows(self, count: int) -> np.ndarray:
+        if count <= self.train_sample:
+            return np.arange(count)
+        return np.sort(self._rng.choice(count, self.train_sample, replace=False))
+
+    @staticmethod
+    def _empty_state(mean, components) -> Dict[str, Any]:
+        return {"ids": [], "rows": {}, "count": 0, "vectors": None, "mean": mean, "components": components,
+                "centroids": None, "lists": None, "retrain_at": None}
+
+    @staticmethod
+    def _project(block, mean=None, components=None) -> np.ndarray:
+        """float32 (n, dim) -> reduced, L2-normalised float32 rows"""
+        block = np.asarray(block, dtype=np.float32).reshape(len(block), -1)
+        if components is not None:
+            block = (block - mean) @ components
+        return block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+
+    @staticmethod
+    def _append(state: Dict[str, Any], ids: List[str], block: np.ndarray):
+        count, vectors = state["count"], state["vectors"]
+        if vectors is None:
+            vectors = np.empty((max(1024, len(ids)), block.shape[1]), dtype=np.float16)
+        elif count + len(ids) > vectors.shape[0]:
+            grown = np.empty((max(2 * vectors.shape[0], count + len(ids)), vectors.shape[1]), dtype=np.float16)
+            grown[:count] = vectors[:count]
+            vectors = grown
+        vectors[count:count + len(ids)] = block
+        for offset, report_id in enumerate(ids):
+            state["rows"][report_id] = count + offset
+        state["ids"].extend(ids)
+        state["vectors"] = vectors
+        state["count"] = count + len(ids)
+
+    def _add_to(self, state: Dict[str, Any], report_id: str, features):
+        if features is None or report_id in state["rows"]:
+            return
+        vector = self._project(np.asarray(features)[None], state["mean"], state["components"])
+        self._append(state, [report_id], vector)
+        if state["centroids"] is not None:
+            state["lists"][int(np.argmax(state["centroids"] @ vector[0]))].append(state["count"] - 1)
+
+    def add(self, report_id: str, features):
+        """Index one new report (feature store listener; cheap, runs on the caller's thread)"""
+        with self._lock:
+            if self._state is None:
+                return  # the running build catches up from the feature store
+            try:
+                self._add_to(self._state, report_id, features)
+            except ValueError as e:
+                # e.g. a vector from a different backbone; the next rebuild sorts it out
+                self.logger.warning(f"Could not index {report_id}: {e}")
+                return
+            self._stats["adds"] += 1
+            retrain_at = self._state["retrain_at"]
+            grew = retrain_at is not None and self._state["count"] >= retrain_at
+        if grew:
+            self._rebuild_in_background()
+
+    # ----- search -----
+
+    def _search_rows(self, state: Dict[str, Any], queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (rows, scores) per query row, best first"""
+        count, vectors = state["count"], state["vectors"]
+        if state["centroids"] is not None:
+            return [self._search_lists(state, query, k) for query in queries]
+
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, self.chunk_rows):
+            block = vectors[start:min(count, start + self.chunk_rows)].astype(np.float32)
+            scores = queries @ block.T
+            rows = np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+            best_rows, best_scores = self._top_k(np.hstack([best_rows, rows]), np.hstack([best_scores, scores]), k)
+        return list(zip(best_rows, best_scores))
+
+    def _search_lists(self, state: Dict[str, Any], query: np.ndarray, k: int):
+        probes = np.argsort(-(state["centroids"] @ query))[:self.n_probe]
+        rows = np.concatenate([np.asarray(state["lists"][c], dtype=np.int64) for c in probes])
+        rows = rows[rows < state["count"]]
+        scores = state["vectors"][rows].astype(np.float32) @ query
+        top_rows, top_scores = self._top_k(rows[None], scores[None], k)
+        return top_rows[0], top_scores[0]
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int):
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            rows, scores = np.take_along_axis(rows, keep, 1), np.take_along_axis(scores, keep, 1)
+        order = np.argsort(-scores, axis=1)
+        return np.take_along_axis(rows, order, 1), np.take_along_axis(scores, order, 1)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        if not self._ready.is_set():
+            raise IndexNotReadyError("Similarity index is still being built")
+        with self._lock:
+            return dict(self._state)
+
+    def search(self, features_batch, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Nearest stored reports for each raw feature vector in the batch"""
+        state = self._snapshot()
+        queries = self._project(features_batch, state["mean"], state["components"])
+        with metrics.timer("similarity_search"):
+            results = self._search_rows(state, queries, k)
+        self._stats["searches"] += len(queries)
+        return [[(state["ids"][row], min(float(score), 1.0)) for row, score in zip(rows, scores)] for rows, scores in results]
+
+    def similar(self, report_id: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """Nearest other reports to a stored report, or None if it has no features indexed"""
+        state = self._snapshot()
+        row = state["rows"].get(report_id)
+        if row is None:
+            return None
+        query = state["vectors"][row].astype(np.float32)[None]
+        with metrics.timer("similarity_search"):
+            [(rows, scores)] = self._search_rows(state, query, k + 1)
+        self._stats["searches"] += 1
+        return [(state["ids"][r], min(float(s), 1.0)) for r, s in zip(rows, scores) if r != row][:k]
+
+    @property
+    def mode(self) -> str:
+        state = self._state or {}
+        parts = ["ivf" if state.get("centroids") is not None else "exact"]
+        if state.get("components") is not None:
+            parts.append(f"pca{state['components'].shape[1]}")
+        return "+".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state or {}
+            return {
+                **self._stats,
+                "ready": self._ready.is_set(),
+                "rebuilding": self._rebuilding,
+                "mode": self.mode,
+                "size": state.get("count", 0),
+                "dims": None if state.get("vectors") is None else state["vectors"].shape[1],
+                "memory_bytes": 0 if state.get("vectors") is None else state["vectors"].nbytes
+            }
+
+
+def describe_neighbours(neighbours: List[Tuple[str, float]], reports: Dict[str, Dict[str, Any]],
+                        duplicate_threshold: float, approved_only: bool = False) -> List[Dict[str, Any]]:
+    """Client-facing neighbours: ``(classificationId, similarity)`` pairs joined with their reports"""
+    results = []
+    for classification_id, similarity in neighbours:
+        doc = reports.get(classification_id)
+        if doc is None or (approved_only and doc.get("status") != "approved"):
+            continue  # not written to Mongo yet, deleted, or filtered out
+        results.append({
+            "id": str(doc["_id"]),
+            "classificationId": classification_id,
+            "similarity": round(similarity, 4),
+            "near_duplicate": similarity >= duplicate_threshold,
+            "status": doc.get("status"),
+            "approved_class": doc.get("approved_class"),
+            "prediction": doc.get("prediction"),
+            "stored_filename": doc.get("stored_filename"),
+            "barangay": doc.get("barangay")
+        })
+    return results
@@ -0,0 +1,96 @@
+# thumbnailer.py - Single Responsibility: Small previews of stored images for the review UI
+import logging
+import os
+import threading
+from typing import List, Optional
+import cv2
+import numpy as np
+from ..repositories.blob_store import BlobStore
+from ..predict import decode_flag
+from ..metrics import metrics
+
+MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class Thumbnailer:
+    """Generates each thumbnail once and caches it next to its blob.
+
+    A thumbnail of ``<blob>`` at width 256 is ``<blob>~w256.webp``;
+    BlobStore.remove deletes it together with the blob. Only ``sizes``
+    (longest edge, in pixels) and the formats in MIME_TYPES are served, so
+    clients cannot fill the disk with arbitrary variants.
+    """
+
+    def __init__(self, blob_store: BlobStore, sizes: List[int], default_size: int,
+                 image_format: str = "webp", quality: int = 75):
+        self.blob_store = blob_store
+        self.sizes = sorted(sizes)
+        self.default_size = default_size
+        self.image_format = image_format
+        self.quality = quality
+        self.logger = logging.getLogger("Thumbnailer")
+
+    def variant(self, size: Optional[str], image_format: Optional[str]):
+        """Validate ``?size=&format=`` query values; (None, None) means the original"""
+        if not size or size == "original":
+            return None, None
+        size = self.default_size if size == "thumb" else int(size) if size.isdigit() else None
+        if size not in self.sizes and size != self.default_size:
+            raise ValueError(f"size must be 'thumb', 'original' or one of {self.sizes}")
+        image_format = (image_format or self.image_format).lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in MIME_TYPES:
+            raise ValueError(f"format must be one of {sorted(MIME_TYPES)}")
+        return size, image_format
+
+    def path_for(self, source_path: str, size: int, image_format: str) -> str:
+        return self.blob_store.derived_path(source_path, f"w{size}.{image_format}")
+
+    def _encode(self, file_bytes: bytes, size: int, image_format: str) -> bytes:
+        # libjpeg can skip most of the work when the thumbnail is much smaller
+        img = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), decode_flag(file_bytes, (size, size)))
+        if img is None:
+            raise ValueError("Could not decode image")
+        height, width = img.shape[:2]
+        scale = size / max(height, width)
+        if scale < 1:
+            img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA)
+        params = [cv2.IMWRITE_WEBP_QUALITY if image_format == "webp" else cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        ok, buffer = cv2.imencode(f".{image_format}", img, params)
+        if not ok:
+            raise ValueError(f"Could not encode {image_format} thumbnail")
+        return buffer.tobytes()
+
+    def create(self, source_path: str, size: int, image_format: str, file_bytes: bytes = None) -> str:
+        """Write the thumbnail (atomically) and return its path"""
+        path = self.path_for(source_path, size, image_format)
+        if file_bytes is None:
+            with open(source_path, "rb") as f:
+                file_bytes = f.read()
+        with metrics.timer("thumbnail"):
+            data = self._encode(file_bytes, size, image_format)
+        tmp_path = f"{path}.part{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def get(self, source_path: str, size: int = None, image_format: str = None) -> Optional[str]:
+        """Path of the cached thumbnail, generating it on first use; None if the image is missing"""
+        size = size or self.default_size
+        image_format = image_format or self.image_format
+        path = self.path_for(source_path, size, image_format)
+        if os.path.exists(path):
+            return path
+        if not source_path or not os.path.exists(source_path):
+            return None
+        return self.create(source_path, size, image_format)
+
+    def create_default(self, source_path: str, file_bytes: bytes):
+        """Ingest hook: pre-generate the grid thumbnail from bytes already in memory"""
+        try:
+            self.create(source_path, self.default_size, self.image_format, file_bytes)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Thumbnail for {source_path} not generated: {e}")
@@ -0,0 +1,41 @@
+# conftest.py - Stubs and fixtures shared by the repository and service tests
+import mongomock
+import pytest
+from src.interfaces import ILocationService
+from src.repositories import mongo_repository
+
+
+class KnownLocationService(ILocationService):
+    """Every client resolves to the same place, straight from the cache"""
+
+    def get_location(self, client_ip=None):
+        return {"latitude": 15.5, "longitude": 120.6, "city": "Tarlac", "country": "PH"}
+
+    def peek_location(self, client_ip=None):
+        return self.get_location(client_ip)
+
+    def resolve_async(self, client_ip=None, callback=None):
+        callback(self.get_location(client_ip))
+
+
+class NoLocationService(KnownLocationService):
+    """Every client resolves to an empty location"""
+
+    def get_location(self, client_ip=None):
+        return {"latitude": None, "longitude": None, "city": None, "country": None}
+
+
+@pytest.fixture
+def known_location():
+    return KnownLocationService()
+
+
+@pytest.fixture
+def no_location():
+    return NoLocationService()
+
+
+@pytest.fixture
+def mongomock_client(monkeypatch):
+    """Repositories built during the test talk to an in-memory mongomock server"""
+    monkeypatch.setattr(mongo_repository, "MongoClient", mongomock.MongoClient)
@@ -0,0 +1,69 @@
+# test_batch_scheduler.py - Concurrent requests share one model call; errors stay with their caller
+import numpy as np
+from src.inference.batch_scheduler import BatchScheduler
+
+
+def image(value, size=4):
+    return np.full((size, size, 3), value, dtype=np.float32)
+
+
+class RecordingModel:
+    """Returns (per-row mean, batch size) and rejects images whose pixels are negative"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, images):
+        if (images < 0).any():
+            raise ValueError("negative pixels")
+        self.batch_sizes.append(len(images))
+        return images.mean(axis=(1, 2, 3)), np.full(len(images), len(images))
+
+
+def predict_concurrently(scheduler, images):
+    """Submit every image before the scheduler may start a batch; returns (results, errors) per image"""
+    results, errors = [None] * len(images), [None] * len(images)
+    futures = [scheduler.submit(img) for img in images]
+    for i, future in enumerate(futures):
+        try:
+            results[i] = future.result(5)
+        except Exception as e:
+            errors[i] = e
+    return results, errors
+
+
+def test_concurrent_requests_share_one_batch_and_get_their_own_rows():
+    model = RecordingModel()
+    scheduler = BatchScheduler(model, max_batch_size=8, max_wait_ms=200)
+    results, errors = predict_concurrently(scheduler, [image(i) for i in range(5)])
+    scheduler.stop()
+
+    assert errors == [None] * 5
+    assert [float(mean) for mean, _ in results] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert model.batch_sizes == [5]
+    assert scheduler.stats()["batch_size_histogram"] == {5: 1}
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = RecordingModel()
+    scheduler = BatchScheduler(model, max_batch_size=2, max_wait_ms=200)
+    predict_concurrently(scheduler, [image(i) for i in range(5)])
+    scheduler.stop()
+
+    assert sorted(model.batch_sizes) == [1, 2, 2]
+
+
+def test_an_error_in_one_image_only_reaches_its_caller():
+    model = RecordingModel()
+    scheduler = BatchScheduler(model, max_batch_size=8, max_wait_ms=200)
+    images = [image(1), image(-1), image(3), image(2, size=5)]  # a bad value and a wrong shape
+    results, errors = predict_concurrently(scheduler, images)
+
+    assert isinstance(errors[1], ValueError) and results[1] is None
+    assert errors[3] is None and float(results[3][0]) == 2.0
+    assert [float(results[i][0]) for i in (0, 2)] == [1.0, 3.0]
+    assert scheduler.stats()["errors"] == 1
+
+    # The worker survived and keeps serving
+    assert float(scheduler.predict(image(7))[0]) == 7.0
+    scheduler.stop()
@@ -0,0 +1,48 @@
+# test_feature_store.py - Feature rows stay matched to their report ids across writer processes
+import multiprocessing
+import numpy as np
+from src.repositories.feature_store import FeatureStore
+
+
+def vector(i, dim=8):
+    return np.full(dim, i, dtype=np.float16)
+
+
+def append_range(directory, start, count):
+    store = FeatureStore(directory, initial_capacity=2)
+    for i in range(start, start + count):
+        store.append(f"report-{i}", vector(i))
+
+
+def assert_rows_match(store):
+    ids = store.ids()
+    matrix = store.matrix()
+    for row, report_id in enumerate(ids):
+        assert (matrix[row] == int(report_id.split("-")[1])).all(), report_id
+
+
+def test_two_stores_on_one_directory_never_share_a_row(tmp_path):
+    first = FeatureStore(str(tmp_path), initial_capacity=2)
+    second = FeatureStore(str(tmp_path), initial_capacity=2)
+    first.append("report-1", vector(1))
+    second.append("report-2", vector(2))     # must see row 0 is taken
+    first.append("report-3", vector(3))      # after second regrew the matrix
+
+    first.refresh()
+    assert first.ids() == ["report-1", "report-2", "report-3"]
+    assert_rows_match(first)
+    assert_rows_match(FeatureStore(str(tmp_path)))
+
+
+def test_concurrent_writer_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=append_range, args=(str(tmp_path), start, 40)) for start in (0, 100, 200)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    store = FeatureStore(str(tmp_path))
+    assert len(store) == 120 and len(set(store.ids())) == 120
+    assert_rows_match(store)
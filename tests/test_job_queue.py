@@ -0,0 +1,81 @@
+# test_job_queue.py - Durable job spool: restart recovery, pending limit and eviction of finished jobs
+import io
+import os
+import threading
+import time
+from src.services.job_queue import JobQueue, QueueFullError, DONE
+
+
+class Upload(io.BytesIO):
+    def __init__(self, file_bytes=b"leaf", filename="leaf.jpg"):
+        super().__init__(file_bytes)
+        self.filename = filename
+
+
+def spooled(job_queue):
+    return sorted(name for name in os.listdir(job_queue.spool_dir) if not name.endswith(".tmp"))
+
+
+def test_pending_limit_holds_under_concurrent_submits(tmp_path):
+    release = threading.Event()
+    job_queue = JobQueue(lambda upload, user_data, client_ip: release.wait(10), str(tmp_path),
+                         workers=1, max_pending=3)
+    first = job_queue.submit(Upload(), {})
+    while job_queue.get(first["id"])["status"] != "running":
+        time.sleep(0.01)  # the worker holds the first job; everything after it waits
+
+    outcomes = []
+
+    def submit():
+        try:
+            outcomes.append(job_queue.submit(Upload(), {}))
+        except QueueFullError:
+            outcomes.append(None)
+
+    threads = [threading.Thread(target=submit) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    assert sum(outcome is not None for outcome in outcomes) == 3
+    assert job_queue.stats()["rejected"] == 7
+
+
+def test_finished_jobs_are_evicted_on_submit_with_their_files(tmp_path):
+    running = threading.Event()
+    running.set()
+    job_queue = JobQueue(lambda upload, user_data, client_ip: running.wait(10), str(tmp_path), max_retained=1)
+    first = job_queue.submit(Upload(), {})
+    assert job_queue.get(first["id"], wait=5)["status"] == DONE
+
+    running.clear()                    # the next job stays running, so only the submit can evict
+    job_queue.retention_seconds = -1   # everything finished is now past retention
+    job_queue.submit(Upload(), {})
+
+    assert job_queue.get(first["id"]) is None
+    assert f"{first['id']}.json" not in spooled(job_queue)
+    running.set()
+
+
+def test_spooled_jobs_run_after_a_restart(tmp_path):
+    stuck = threading.Event()
+    crashed = JobQueue(lambda upload, user_data, client_ip: stuck.wait(10), str(tmp_path), workers=1)
+    running = crashed.submit(Upload(b"first"), {"barangay": "Poblacion"})
+    queued = crashed.submit(Upload(b"second"), {"barangay": "Maliwalo"})
+    while crashed.get(running["id"])["status"] != "running":
+        time.sleep(0.01)
+
+    # A new process on the same spool; the first one never finishes either job
+    seen = []
+    restarted = JobQueue(lambda upload, user_data, client_ip: seen.append((upload.read(), user_data)) or {"ok": True},
+                         str(tmp_path), workers=1)
+    restarted.start()
+    finished = [restarted.get(job["id"], wait=5) for job in (running, queued)]
+    stuck.set()
+
+    assert [job["status"] for job in finished] == [DONE, DONE]
+    assert sorted(seen, key=lambda item: item[0]) == [(b"first", {"barangay": "Poblacion"}),
+                                                     (b"second", {"barangay": "Maliwalo"})]
+    assert restarted.stats()["recovered"] == 2
@@ -0,0 +1,134 @@
+# test_location_service.py - LocationService caching, time budget and client address handling
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from src.services.location_service import LocationService, client_address, parse_networks
+
+
+def fix(latitude, city="Tarlac", country="PH"):
+    return SimpleNamespace(ok=True, latlng=[latitude, 120.0], city=city, country=country)
+
+
+def service(*geocoders, **kwargs):
+    """LocationService that only knows the stub geocoders"""
+    location_service = LocationService(**kwargs)
+    location_service.geocoders = []
+    for geocoder_func in geocoders:
+        location_service.add_geocoder(geocoder_func)
+    return location_service
+
+
+def test_results_are_cached_per_client_ip():
+    queries = []
+
+    def geocode(query):
+        queries.append(query)
+        return fix(len(queries))
+
+    location_service = service(geocode)
+    first = location_service.get_location("8.8.8.8")
+    other = location_service.get_location("1.1.1.1")
+    again = location_service.get_location("8.8.8.8")
+
+    assert queries == ["8.8.8.8", "1.1.1.1"]
+    assert first == again != other
+
+
+def test_private_and_missing_addresses_share_the_server_location():
+    queries = []
+    location_service = service(lambda query: queries.append(query) or fix(10.0))
+
+    location_service.get_location("192.168.1.20")
+    location_service.get_location(None)
+
+    assert queries == ["me"]
+    assert location_service.peek_location("8.8.8.8") is None
+
+
+def test_slow_geocoder_is_skipped_within_the_budget():
+    def slow(query):
+        time.sleep(1.0)
+        return fix(1.0, city="Late")
+
+    location_service = service(slow, lambda query: fix(2.0, city="Fast"),
+                               provider_timeout=0.1, budget_seconds=1.0)
+    started = time.monotonic()
+    location = location_service.get_location("8.8.8.8")
+
+    assert location["city"] == "Fast"
+    assert time.monotonic() - started < 0.5
+    assert location_service.stats()["provider_timeouts"] == 1
+
+
+def test_failed_lookup_is_cached_briefly_as_empty():
+    location_service = service(lambda query: SimpleNamespace(ok=False, latlng=None),
+                               negative_ttl_seconds=300)
+
+    assert location_service.get_location("8.8.8.8")["latitude"] is None
+    assert location_service.peek_location("8.8.8.8") == {"latitude": None, "longitude": None,
+                                                         "city": None, "country": None}
+
+
+def test_resolve_async_geocodes_once_for_concurrent_callers():
+    release = threading.Event()
+    calls = []
+
+    def geocode(query):
+        calls.append(query)
+        release.wait(2)
+        return fix(5.0)
+
+    location_service = service(geocode)
+    delivered = []
+    done = threading.Event()
+
+    def callback(info):
+        delivered.append(info)
+        if len(delivered) == 3:
+            done.set()
+
+    for _ in range(3):
+        location_service.resolve_async("8.8.8.8", callback=callback)
+    release.set()
+
+    assert done.wait(2)
+    assert calls == ["8.8.8.8"]
+    assert all(info["latitude"] == 5.0 for info in delivered)
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background():
+    results = iter([fix(1.0), fix(2.0)])
+    location_service = service(lambda query: next(results), ttl_seconds=0.05)
+
+    assert location_service.get_location("8.8.8.8")["latitude"] == 1.0
+    time.sleep(0.1)
+    assert location_service.peek_location("8.8.8.8")["latitude"] == 1.0  # stale, refresh scheduled
+
+    deadline = time.monotonic() + 2
+    while location_service.peek_location("8.8.8.8")["latitude"] != 2.0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_zero_argument_geocoders_still_work():
+    location_service = service(lambda: fix(3.0))
+    assert location_service.get_location("8.8.8.8")["latitude"] == 3.0
+
+
+PROXIES = parse_networks(["10.0.0.0/8"])
+
+
+@pytest.mark.parametrize("peer, forwarded_for, expected", [
+    ("203.0.113.9", "1.2.3.4", "203.0.113.9"),            # not from our proxy: header ignored
+    ("10.0.0.5", "198.51.100.7", "198.51.100.7"),
+    ("10.0.0.5", "1.2.3.4, 198.51.100.7", "198.51.100.7"),  # client-prepended hop is skipped
+    ("10.0.0.5", "198.51.100.7, 10.0.0.9", "198.51.100.7"),  # chained proxies
+    ("10.0.0.5", None, "10.0.0.5"),
+])
+def test_forwarded_for_is_only_trusted_from_configured_proxies(peer, forwarded_for, expected):
+    assert client_address(peer, forwarded_for, PROXIES) == expected
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    assert client_address("10.0.0.5", "198.51.100.7", []) == "10.0.0.5"
@@ -0,0 +1,87 @@
+# test_model_loader.py - Background load and hot swap of the served model
+import os
+import threading
+import time
+import numpy as np
+from src.inference.model_loader import ModelLoader
+from src.inference.versioning import model_version
+
+
+class FakeBackend:
+    """Answers with the model file's content; ``gate`` holds a batch mid-flight"""
+
+    def __init__(self, model_path):
+        with open(model_path) as f:
+            self.weights = f.read()
+        self.gate = None
+
+    def warm_up(self):
+        pass
+
+    def predict_batch(self, images):
+        if self.gate is not None:
+            self.gate.wait(5)
+        return np.zeros((len(images), 2)), np.full((len(images), 1), self.weights == "v2", dtype=float)
+
+
+def deploy(model_path, weights):
+    """Write the new file next to the served one and rename it into place"""
+    with open(f"{model_path}.new", "w") as f:
+        f.write(weights)
+    os.replace(f"{model_path}.new", model_path)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_reload_swaps_the_model_while_running_batches_finish_on_the_old_one(tmp_path):
+    model_path = str(tmp_path / "model.keras")
+    deploy(model_path, "v1")
+    loader = ModelLoader(lambda: FakeBackend(model_path), model_path)
+    old = loader.wait(5)
+    old_version = loader.version
+    assert old_version == model_version(model_path)
+
+    old.gate = threading.Event()
+    in_flight = []
+    batch = threading.Thread(target=lambda: in_flight.append(loader.predict_batch(np.zeros((2, 4)))))
+    batch.start()
+
+    deploy(model_path, "v2")
+    assert loader.reload()
+    wait_for(lambda: loader.version != old_version)
+    old.gate.set()
+    batch.join(5)
+
+    _, preds, versions = in_flight[0]
+    assert versions == [old_version] * 2 and not preds.any()
+    _, preds, versions = loader.predict_batch(np.zeros((1, 4)))
+    assert versions == [model_version(model_path)] and preds.all()
+    wait_for(lambda: not loader.reload_status()["reloading"])
+    assert [entry["version"] for entry in loader.reload_status()["history"]] == [old_version, versions[0]]
+
+
+def test_failed_reload_keeps_serving_the_current_model(tmp_path):
+    model_path = str(tmp_path / "model.keras")
+    deploy(model_path, "v1")
+    builds = []
+
+    def factory():
+        builds.append(1)
+        if len(builds) > 1:
+            raise OSError("truncated model file")
+        return FakeBackend(model_path)
+
+    loader = ModelLoader(factory, model_path)
+    loader.wait(5)
+    version = loader.version
+    assert loader.reload()
+    wait_for(lambda: not loader.reload_status()["reloading"])
+
+    assert loader.version == version
+    assert "truncated" in loader.reload_status()["last_reload_error"]
+    assert loader.predict_batch(np.zeros((1, 4)))[2] == [version]
@@ -0,0 +1,101 @@
+# test_mongo_repository.py - Report inserts and their background image writes against mongomock
+import os
+import numpy as np
+import pytest
+from pymongo.errors import PyMongoError
+from src.repositories import mongo_repository
+from src.repositories.blob_store import BlobStore
+from src.repositories.feature_store import FeatureStore
+
+
+@pytest.fixture
+def repository(tmp_path, mongomock_client, known_location):
+    repository = mongo_repository.MongoRepository("mongodb://stand-in", "test", known_location,
+                                                  blob_store=BlobStore(str(tmp_path / "blobs")))
+    yield repository
+    repository._writer.shutdown(wait=True)
+
+
+def save(repository, file_bytes=b"leaf"):
+    return repository.save_prediction(file_bytes, "leaf.jpg", "snail", 0.9, {"barangay": "Poblacion"})
+
+
+def full_disk(digest, file_bytes):
+    raise OSError("No space left on device")
+
+
+def test_image_is_written_once_per_content(repository):
+    first, second = save(repository), save(repository)
+    repository._writer.shutdown(wait=True)
+
+    assert first["file_path"] == second["file_path"]
+    assert repository.get_image(str(first["inserted_id"]))["path"] == first["file_path"]
+    assert repository.blobs.find_one({})["refs"] == 2
+
+
+def test_blob_is_removed_with_its_last_reference(repository):
+    first, second = save(repository), save(repository)
+    repository._writer.shutdown(wait=True)
+    path = first["file_path"]
+
+    assert repository.delete_file(str(first["inserted_id"]))
+    assert os.path.exists(path) and repository.blobs.find_one({})["refs"] == 1
+
+    assert repository.delete_file(str(second["inserted_id"]))
+    assert not os.path.exists(path)
+    assert repository.blobs.count_documents({}) == 0
+
+
+def test_failed_image_write_is_recorded_on_the_report(repository, monkeypatch):
+    monkeypatch.setattr(repository.blob_store, "write", full_disk)
+    result = save(repository)
+    repository._writer.shutdown(wait=True)
+
+    doc = repository.collection.find_one({"_id": result["inserted_id"]})
+    assert doc["image_missing"] and "file_path" not in doc
+    assert repository.get_image(str(result["inserted_id"])) is None
+    assert repository.blobs.count_documents({}) == 0
+    assert repository.delete_file(str(result["inserted_id"]))
+
+
+def test_write_failing_before_the_insert_is_applied_after_it(repository, monkeypatch):
+    monkeypatch.setattr(repository.blob_store, "write", full_disk)
+    insert_one = repository.collection.insert_one
+
+    def insert_after_the_write(doc, *args, **kwargs):
+        repository._writer.shutdown(wait=True)  # the write has failed and found no report yet
+        return insert_one(doc, *args, **kwargs)
+
+    monkeypatch.setattr(repository.collection, "insert_one", insert_after_the_write)
+    result = save(repository)
+
+    assert repository.collection.find_one({"_id": result["inserted_id"]})["image_missing"]
+    assert not repository._image_failures
+
+
+def test_features_are_stored_only_for_inserted_reports(repository, tmp_path, monkeypatch):
+    repository.feature_store = FeatureStore(str(tmp_path / "features"))
+    features = np.ones(8, dtype=np.float32)
+    saved = repository.save_prediction(b"leaf", "leaf.jpg", "snail", 0.9, {}, features=features)
+
+    def refused(doc, *args, **kwargs):
+        raise PyMongoError("not primary")
+
+    monkeypatch.setattr(repository.collection, "insert_one", refused)
+    with pytest.raises(PyMongoError):
+        repository.save_prediction(b"other", "leaf.jpg", "snail", 0.9, {}, features=features)
+
+    classification_id = repository.collection.find_one({"_id": saved["inserted_id"]})["classificationId"]
+    assert repository.feature_store.ids() == [classification_id]
+    assert not repository._pending_features
+
+
+def test_database_error_in_the_image_write_is_recorded(repository, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise PyMongoError("connection reset")
+
+    monkeypatch.setattr(repository.blobs, "update_one", unreachable)
+    result = save(repository)
+    repository._writer.shutdown(wait=True)
+
+    assert repository.collection.find_one({"_id": result["inserted_id"]})["image_missing"]
@@ -0,0 +1,87 @@
+# test_notifier.py - NotificationDispatcher digests, rate limits and per-sink redelivery
+from src.notifier import MemorySink, NotificationDispatcher, Notifier
+
+
+class FlakySink(MemorySink):
+    """MemorySink that raises while ``failing`` is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def send(self, digest):
+        if self.failing:
+            raise ConnectionError("sink down")
+        super().send(digest)
+
+
+def dispatcher(*sinks, **kwargs):
+    """Dispatcher flushed by the test itself rather than its background thread"""
+    digest_dispatcher = NotificationDispatcher(list(sinks), group_by="barangay", digest_seconds=3600, **kwargs)
+    digest_dispatcher.start = lambda: None
+    return digest_dispatcher
+
+
+def test_events_are_coalesced_into_one_digest_per_group():
+    sink = MemorySink()
+    notifier = Notifier(dispatcher(sink))
+    notifier.notify_admin("a", barangay="San Miguel", prediction="Rust")
+    notifier.notify_admin("b", barangay="San Miguel", prediction="Rust")
+    notifier.notify_admin("c", barangay="Maliwalo", prediction="Healthy")
+    notifier.dispatcher.flush()
+
+    digests = {digest["group"]: digest for digest in sink.digests}
+    assert set(digests) == {"San Miguel", "Maliwalo"}
+    assert digests["San Miguel"]["count"] == 2
+    assert digests["San Miguel"]["by_prediction"] == {"Rust": 2}
+    assert digests["San Miguel"]["examples"] == ["a", "b"]
+
+
+def test_failed_sink_gets_the_group_again_without_repeating_healthy_sinks():
+    healthy, flaky = MemorySink(), FlakySink()
+    digest_dispatcher = dispatcher(healthy, flaky)
+    digest_dispatcher.publish({"message": "a", "barangay": "San Miguel"})
+    digest_dispatcher.flush()
+    assert len(healthy.digests) == 1 and flaky.digests == []
+
+    flaky.failing = False
+    digest_dispatcher.publish({"message": "b", "barangay": "San Miguel"})
+    digest_dispatcher.flush()
+
+    assert [digest["count"] for digest in healthy.digests] == [1, 1]
+    assert [digest["count"] for digest in flaky.digests] == [2]
+    assert flaky.digests[0]["examples"] == ["a", "b"]
+    assert digest_dispatcher.stats()["pending_groups"] == 0
+
+
+def test_rate_limited_groups_are_sent_in_a_later_window():
+    first, second = MemorySink(), MemorySink()
+    digest_dispatcher = dispatcher(first, second, max_per_minute=1)
+    digest_dispatcher.publish({"message": "a", "barangay": "San Miguel"})
+    digest_dispatcher.publish({"message": "b", "barangay": "Maliwalo"})
+    digest_dispatcher.flush()
+
+    assert [digest["group"] for digest in first.digests] == ["San Miguel"]
+    assert digest_dispatcher.stats()["rate_limited"] == 2
+    assert digest_dispatcher.stats()["pending_groups"] == 1
+
+    digest_dispatcher._sent = {id(sink): [] for sink in (first, second)}
+    digest_dispatcher.flush()
+
+    assert [digest["group"] for digest in first.digests] == ["San Miguel", "Maliwalo"]
+    assert [digest["group"] for digest in second.digests] == ["San Miguel", "Maliwalo"]
+    assert digest_dispatcher.stats()["pending_groups"] == 0
+
+
+def test_failed_delivery_does_not_use_up_a_rate_slot():
+    flaky = FlakySink()
+    digest_dispatcher = dispatcher(flaky, max_per_minute=1)
+    digest_dispatcher.publish({"message": "a", "barangay": "San Miguel"})
+    digest_dispatcher.flush()
+    assert digest_dispatcher.stats()["delivery_errors"] == 1
+
+    flaky.failing = False
+    digest_dispatcher.flush()
+
+    assert [digest["count"] for digest in flaky.digests] == [1]
+    assert digest_dispatcher.stats()["rate_limited"] == 0
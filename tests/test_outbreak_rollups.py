@@ -0,0 +1,53 @@
+# test_outbreak_rollups.py - Rebuilding the counters from raw reports against mongomock
+from datetime import datetime
+import mongomock
+import pytest
+from src.repositories.outbreak_rollups import (
+    OutbreakRollups, RollupsChangedError, PREDICTED, insert_deltas, review_deltas
+)
+
+
+def report(prediction="snail", status="pending", barangay="Poblacion"):
+    return {"timestamp": datetime(2026, 6, 1, 8), "barangay": barangay, "crop": "rice",
+            "prediction": prediction, "status": status}
+
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient()["test"]
+
+
+def test_rebuild_matches_incremental_counts(database):
+    rollups = OutbreakRollups(database["report_rollups"])
+    docs = [report(), report(), report("blast", barangay="Maliwalo")]
+    database["reports"].insert_many(docs)
+    rollups.apply(insert_deltas(docs))
+    expected = rollups.summary("2026-06-01", "2026-06-01", ["barangay", "label"])
+
+    database["report_rollups"].update_many({}, {"$inc": {"reports": 5}})  # drift
+    assert rollups.rebuild(database["reports"]) == 2
+    assert rollups.summary("2026-06-01", "2026-06-01", ["barangay", "label"]) == expected
+
+
+def test_rebuild_aborts_when_counters_move_underneath_it(database, monkeypatch):
+    rollups = OutbreakRollups(database["report_rollups"])
+    docs = [report()]
+    database["reports"].insert_many(docs)
+    rollups.apply(insert_deltas(docs))
+
+    reports = database["reports"]
+    aggregate = reports.aggregate
+
+    def review_during_aggregation(*args, **kwargs):
+        # A reviewer approves the report while the rebuild is reading
+        monkeypatch.setattr(reports, "aggregate", aggregate)
+        rollups.apply(review_deltas([(docs[0], "approved", "snail")]))
+        return aggregate(*args, **kwargs)
+
+    monkeypatch.setattr(reports, "aggregate", review_during_aggregation)
+    with pytest.raises(RollupsChangedError):
+        rollups.rebuild(reports)
+
+    live = database["report_rollups"].find_one({"basis": PREDICTED})
+    assert live["approved"] == 1 and live["pending"] == 0
+    assert "report_rollups_rebuild" not in database.list_collection_names()
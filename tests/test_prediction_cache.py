@@ -0,0 +1,47 @@
+# test_prediction_cache.py - LRU bound and TTL expiry of cached predictions, in memory and on disk
+from types import SimpleNamespace
+import pytest
+from src.services import prediction_cache as prediction_cache_module
+from src.services.prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock the cache reads, moved by the test"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(prediction_cache_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", {"prediction": "snail"})
+    cache.put("b", {"prediction": "rust"})
+    assert cache.get("a") is not None     # "b" is now the least recently used
+    cache.put("c", {"prediction": "healthy"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"prediction": "snail"} and cache.get("c") == {"prediction": "healthy"}
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(ttl_seconds=60)
+    cache.put("a", {"prediction": "snail"})
+    clock.value += 60
+    assert cache.get("a") == {"prediction": "snail"}
+    clock.value += 1
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_tier_survives_a_restart_until_the_ttl(tmp_path, clock):
+    PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path)).put("model:full:abc", {"prediction": "snail"})
+
+    restarted = PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path))
+    assert restarted.get("model:full:abc") == {"prediction": "snail"}
+    assert restarted.stats()["disk_hits"] == 1
+
+    clock.value += 61
+    assert PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path)).get("model:full:abc") is None
+    assert list(tmp_path.iterdir()) == []
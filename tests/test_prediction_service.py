@@ -0,0 +1,100 @@
+# test_prediction_service.py - Prediction cache reuse and what gets stored for each report
+import io
+from bson import ObjectId
+import numpy as np
+import pytest
+from src.repositories import mongo_repository
+from src.repositories.blob_store import BlobStore
+from src.repositories.feature_store import FeatureStore
+from src.services import prediction_service as prediction_module
+from src.services.prediction_cache import PredictionCache
+from src.services.prediction_service import PredictionService
+from src.services.similarity_index import SimilarityIndex
+
+
+class StubPredictor:
+    """Features are derived from the bytes so different images land apart"""
+    model_version = "stub-1"
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict_bytes(self, file_bytes, filename):
+        self.calls += 1
+        seed = sum(file_bytes)
+        return {"prediction": "snail", "confidence": 0.9, "probabilities": {"snail": 0.9},
+                "model_version": self.model_version,
+                "features": np.random.default_rng(seed).random(16, dtype=np.float32)}
+
+
+class Upload(io.BytesIO):
+    def __init__(self, file_bytes, filename="leaf.jpg"):
+        super().__init__(file_bytes)
+        self.filename = filename
+
+
+@pytest.fixture
+def service(tmp_path, mongomock_client, known_location):
+    feature_store = FeatureStore(str(tmp_path / "features"), initial_capacity=4)
+    repository = mongo_repository.MongoRepository("mongodb://stand-in", "test", known_location,
+                                                  feature_store=feature_store,
+                                                  blob_store=BlobStore(str(tmp_path / "blobs")))
+    index = SimilarityIndex(feature_store)
+    index.rebuild()
+    feature_store.add_listener(index.add)
+    yield PredictionService(StubPredictor(), repository, PredictionCache()), index
+    repository._writer.shutdown(wait=True)
+
+
+def classification_id(prediction_service, result):
+    doc = prediction_service.repository.collection.find_one({"_id": ObjectId(result["id"])})
+    return doc["classificationId"]
+
+
+def test_cache_hit_reuses_the_features_of_the_earlier_upload(service):
+    prediction_service, index = service
+    first = prediction_service.process_prediction(Upload(b"same photo"), {"barangay": "Poblacion"})
+    prediction_service.process_prediction(Upload(b"other photo"), {"barangay": "Poblacion"})
+    again = prediction_service.process_prediction(Upload(b"same photo"), {"barangay": "Poblacion"})
+
+    assert again["cached"] and prediction_service.predictor.calls == 2
+    first_id, again_id = classification_id(prediction_service, first), classification_id(prediction_service, again)
+    neighbours = index.similar(again_id, k=2)
+    assert neighbours[0][0] == first_id
+    assert neighbours[0][1] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_cache_hit_without_an_earlier_feature_row_stores_none(service):
+    prediction_service, index = service
+    prediction_service.repository.feature_store = None
+    prediction_service.process_prediction(Upload(b"same photo"), {})
+    prediction_service.repository.feature_store = index.feature_store
+    again = prediction_service.process_prediction(Upload(b"same photo"), {})
+
+    assert again["cached"]
+    assert index.similar(classification_id(prediction_service, again)) is None
+
+
+def test_cache_key_depends_on_the_decode_mode(service, monkeypatch):
+    prediction_service, _ = service
+    monkeypatch.setattr(prediction_module, "FAST_DECODE_ENABLED", False)
+    full = prediction_service._cache_key(b"same photo")
+    monkeypatch.setattr(prediction_module, "FAST_DECODE_ENABLED", True)
+    assert prediction_service._cache_key(b"same photo") != full
+
+
+def test_cache_hit_looks_up_features_without_a_query(service, monkeypatch):
+    prediction_service, index = service
+    first = prediction_service.process_prediction(Upload(b"same photo"), {})
+
+    def no_query(*args, **kwargs):
+        raise AssertionError("cache hit queried the reports collection")
+
+    monkeypatch.setattr(prediction_service.repository.collection, "find", no_query)
+    monkeypatch.setattr(prediction_service.repository.collection, "find_one", no_query)
+    again = prediction_service.process_prediction(Upload(b"same photo"), {})
+    monkeypatch.undo()
+
+    first_row = index.feature_store.get(classification_id(prediction_service, first))
+    assert again["cached"]
+    assert (index.feature_store.get(classification_id(prediction_service, again)) == first_row).all()
@@ -0,0 +1,65 @@
+# test_query_plans.py - Every repository query is index-backed (no COLLSCAN, no in-memory SORT)
+"""
+The index-coverage check runs everywhere. mongomock has no query planner,
+so the explain() check needs a real server and is skipped unless
+MONGO_TEST_URI points at one (a throwaway database is created and dropped):
+    MONGO_TEST_URI=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py
+"""
+import os
+import uuid
+import pytest
+from src.repositories.mongo_repository import MongoRepository, REPORT_INDEXES, _plan_stages
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
+
+
+def serves(index_keys, query, sort) -> bool:
+    """True if the index answers ``query`` in ``sort`` order without a blocking sort"""
+    fields = [field for field, _ in index_keys]
+    if fields[0] not in query:
+        return False
+    if not sort:
+        return True
+    sort_fields = [field for field, _ in sort]
+    prefix = fields[:fields.index(sort_fields[0])] if sort_fields[0] in fields else None
+    return prefix is not None and all(field in query for field in prefix) \
+        and fields[len(prefix):len(prefix) + len(sort_fields)] == sort_fields
+
+
+@pytest.mark.parametrize("name", sorted(MongoRepository.planned_queries()))
+def test_every_query_has_an_index(name):
+    query, sort = MongoRepository.planned_queries()[name]
+    assert any(serves(keys, query, sort) for keys, _ in REPORT_INDEXES), f"{name} has no supporting index"
+
+
+def test_an_index_without_the_sort_key_needs_a_blocking_sort():
+    sort = [("_id", 1)]
+    assert not serves([("status", 1)], {"status": "pending"}, sort)
+    assert not serves([("location_info.city", 1), ("_id", 1)], {"location_info.country": "PH"}, sort)
+    assert serves([("status", 1), ("_id", 1)], {"status": "pending"}, sort)
+
+
+def test_plan_stages_flatten_nested_plans():
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {
+        "stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]}}}
+    assert _plan_stages(plan) == ["LIMIT", "FETCH", "OR", "IXSCAN", "COLLSCAN"]
+
+
+@pytest.mark.skipif(not MONGO_TEST_URI, reason="MONGO_TEST_URI is not set (mongomock cannot explain queries)")
+def test_query_plans_use_indexes(no_location):
+    database_name = f"harvest_plans_{uuid.uuid4().hex[:8]}"
+    repository = MongoRepository(MONGO_TEST_URI, database_name, no_location)
+    try:
+        # A few documents so the planner has real index entries to choose between
+        repository.collection.insert_many([
+            {"status": status, "stored_filename": f"{i}.jpg", "classificationId": str(i), "blob_hash": str(i),
+             "location_info": {"city": "Tarlac", "country": "PH"}}
+            for i, status in enumerate(["pending", "approved", "rejected"] * 10)
+        ])
+        plans = repository.explain_queries()
+    finally:
+        repository.client.drop_database(database_name)
+        repository.client.close()
+
+    slow = {name: stages for name, stages in plans.items() if "COLLSCAN" in stages or "SORT" in stages}
+    assert not slow, f"Collection scans or in-memory sorts: {slow}"
@@ -0,0 +1,16 @@
+# test_worker_pool.py - Core partitioning and which backends may run in several workers
+import pytest
+from src.inference.worker_pool import InferenceWorkerPool, partition_cores
+
+
+def test_cores_are_split_into_contiguous_slices():
+    assert partition_cores([0, 1, 2, 3, 4], 2) == [[0, 1, 2], [3, 4]]
+    assert partition_cores([0, 1], 3) == [[0], [1], [0]]
+
+
+def test_several_workers_with_private_weights_are_refused():
+    with pytest.raises(ValueError, match="own copy"):
+        InferenceWorkerPool(2, "fused")
+    InferenceWorkerPool(2, "fused", private_weights=True)
+    InferenceWorkerPool(2, "tflite")
+    InferenceWorkerPool(1, "keras")
@@ -0,0 +1,188 @@
+# test_write_behind_repository.py - Write-behind persistence against mongomock
+import os
+import threading
+import time
+import pytest
+from bson import json_util
+from pymongo.errors import PyMongoError
+from src.interfaces import ILocationService
+from src.repositories.blob_store import BlobStore
+from src.repositories.write_behind_repository import WriteBehindRepository
+
+LOCATION = {"latitude": 15.5, "longitude": 120.6, "city": "Tarlac", "country": "PH"}
+
+
+class DeferredLocationService(ILocationService):
+    """Cache always misses; callbacks are kept so the test decides when a location arrives"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def get_location(self, client_ip=None):
+        return dict(LOCATION)
+
+    def peek_location(self, client_ip=None):
+        return None
+
+    def resolve_async(self, client_ip=None, callback=None):
+        self.callbacks.append(callback)
+
+
+@pytest.fixture
+def make_repository(tmp_path, mongomock_client):
+    repositories = []
+
+    def make(**kwargs):
+        options = dict(batch_size=100, flush_interval=0.05, journal_path=str(tmp_path / "journal"))
+        options.update(kwargs)
+        repository = WriteBehindRepository("mongodb://stand-in", "test", DeferredLocationService(),
+                                           blob_store=BlobStore(str(tmp_path / "blobs")), **options)
+        repositories.append(repository)
+        return repository
+
+    yield make
+    for repository in repositories:
+        repository.close()
+
+
+def save(repository, i):
+    return repository.save_prediction(f"image {i}".encode(), f"{i}.jpg", "snail", 0.9,
+                                      {"barangay": "Poblacion", "crop": "rice"})
+
+
+def test_ids_are_final_before_the_insert(make_repository):
+    repository = make_repository(flush_interval=5)
+    saved = [save(repository, i) for i in range(3)]
+
+    assert repository.collection.count_documents({}) == 0
+    assert repository.flush(timeout=10)
+    stored = {doc["_id"] for doc in repository.collection.find()}
+    assert stored == {result["inserted_id"] for result in saved}
+
+
+def test_flushes_when_a_batch_is_full(make_repository):
+    repository = make_repository(batch_size=5, flush_interval=30)
+    for i in range(5):
+        save(repository, i)
+
+    deadline = time.monotonic() + 5
+    while repository.collection.count_documents({}) < 5:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert repository.stats()["batches"] == 1
+
+
+def test_location_update_lands_after_its_insert(make_repository):
+    repository = make_repository()
+    result = save(repository, 0)
+    repository.location_service.callbacks[0](dict(LOCATION))
+
+    assert repository.flush(timeout=10)
+    assert repository.collection.find_one({"_id": result["inserted_id"]})["location_info"] == LOCATION
+
+
+def test_update_of_a_spilled_insert_is_journaled_behind_it(make_repository):
+    repository = make_repository(max_queue=1, batch_size=1, flush_interval=0.01, block_timeout=0.01)
+    entered = [threading.Event(), threading.Event()]
+    released = [threading.Event(), threading.Event()]
+    insert_many = repository.collection.insert_many
+
+    def gated_insert_many(docs, **kwargs):
+        call = min(gated_insert_many.calls, 1)
+        gated_insert_many.calls += 1
+        entered[call].set()
+        released[call].wait(10)
+        return insert_many(docs, **kwargs)
+
+    gated_insert_many.calls = 0
+    repository.collection.insert_many = gated_insert_many
+
+    first = save(repository, 0)
+    assert entered[0].wait(5)          # flusher holds report 0
+    save(repository, 1)                # fills the queue
+    spilled = save(repository, 2)      # goes to the journal
+    assert repository.stats()["spilled"] == 1
+
+    released[0].set()
+    assert entered[1].wait(5)          # flusher holds report 1; the queue has room again
+    repository.location_service.callbacks[2](dict(LOCATION))
+    assert repository.stats()["spilled"] == 2
+    released[1].set()
+
+    deadline = time.monotonic() + 10
+    while repository.collection.count_documents({}) < 3 or repository.stats()["replayed"] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert repository.collection.find_one({"_id": spilled["inserted_id"]})["location_info"] == LOCATION
+    assert repository.collection.find_one({"_id": first["inserted_id"]}) is not None
+
+
+def test_failed_image_write_is_recorded_after_the_insert(make_repository, monkeypatch):
+    repository = make_repository()
+
+    def full_disk(digest, file_bytes):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(repository.blob_store, "write", full_disk)
+    result = save(repository, 0)
+    repository._writer.shutdown(wait=True)     # the failure is queued behind the insert
+    assert repository.flush(timeout=10)
+
+    doc = repository.collection.find_one({"_id": result["inserted_id"]})
+    assert doc["image_missing"] and "file_path" not in doc and "blob_hash" not in doc
+    assert repository.blobs.count_documents({}) == 0
+
+
+def test_close_drains_the_queue(make_repository):
+    repository = make_repository(flush_interval=30, batch_size=1000)
+    saved = [save(repository, i) for i in range(20)]
+    repository.close()
+
+    assert repository.collection.count_documents({}) == len(saved)
+
+
+def test_failed_updates_do_not_spill_the_inserts_that_landed(make_repository, monkeypatch):
+    repository = make_repository(flush_interval=30, batch_size=1000)
+    doc, _ = repository._build_document(b"new", "new.jpg", "snail", 0.5, {"barangay": "Poblacion", "crop": "rice"})
+
+    def unreachable(requests, **kwargs):
+        raise PyMongoError("connection reset")
+
+    monkeypatch.setattr(repository.collection, "bulk_write", unreachable)
+    repository._write([("insert", doc), ("update", {"_id": doc["_id"]}, {"$set": {"location_info": LOCATION}})])
+
+    assert repository.collection.find_one({"_id": doc["_id"]}) is not None
+    assert repository.rollups.collection.count_documents({}) > 0
+    with open(repository.journal_path) as f:
+        assert [json_util.loads(line)[0] for line in f] == ["update"]
+    assert doc["_id"] not in repository._spilled_ids
+
+
+def test_journal_left_by_a_previous_process_is_replayed(make_repository):
+    repository = make_repository(flush_interval=30, batch_size=1000)
+    doc, _ = repository._build_document(b"old", "old.jpg", "snail", 0.5, {})
+    repository._spill([("insert", doc)])
+    repository.close()
+
+    restarted = make_repository()
+    deadline = time.monotonic() + 5
+    while restarted.collection.count_documents({"_id": doc["_id"]}) == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+
+def test_replay_cut_short_is_finished_on_restart(make_repository):
+    repository = make_repository(flush_interval=30, batch_size=1000)
+    doc, _ = repository._build_document(b"old", "old.jpg", "snail", 0.5, {})
+    repository._spill([("insert", doc)])
+    repository.close()
+    os.replace(repository.journal_path, f"{repository.journal_path}.replaying")
+
+    restarted = make_repository()
+    deadline = time.monotonic() + 5
+    while restarted.stats()["replayed"] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert restarted.collection.count_documents({"_id": doc["_id"]}) == 1
+    assert not os.path.exists(f"{restarted.journal_path}.replaying")